@@ -0,0 +1,66 @@
+"""
+Benchmark de arranque: cuánto tarda `import web_app.main` en un proceso nuevo
+(lo que paga cada worker antes de aceptar conexiones) y qué módulos pesados carga.
+
+Uso:
+    python benchmarks/bench_startup.py --runs 5 --max-seconds 1.0 [--out resultados.json]
+Sale con código 1 si la mediana supera --max-seconds o si se importó algún módulo pesado.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+HEAVY = ["pandas", "numpy", "joblib", "statsmodels", "scipy", "pyarrow"]
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import web_app.main
+dt = time.perf_counter() - t0
+print(json.dumps({"seconds": dt, "heavy": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY,)
+
+
+def run_once() -> dict:
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--max-seconds", type=float, default=1.0)
+    ap.add_argument("--out", type=Path, default=None)
+    args = ap.parse_args(argv)
+
+    runs = [run_once() for _ in range(args.runs)]
+    secs = [r["seconds"] for r in runs]
+    heavy = sorted({m for r in runs for m in r["heavy"]})
+    result = {
+        "benchmark": "startup_import",
+        "runs": args.runs,
+        "median_s": statistics.median(secs),
+        "min_s": min(secs),
+        "max_s": max(secs),
+        "heavy_modules_loaded": heavy,
+    }
+    print(json.dumps(result, indent=2))
+    if args.out:
+        args.out.write_text(json.dumps(result, indent=2))
+
+    if heavy:
+        print(f"[FAIL] módulos pesados importados al arrancar: {heavy}")
+        return 1
+    if result["median_s"] > args.max_seconds:
+        print(f"[FAIL] mediana {result['median_s']:.3f}s > {args.max_seconds}s")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""
+Suite de benchmarks contra un PostgreSQL local.
+
+Mide (mediana de --repeat corridas):
+- read_any_table (xlsx y csv) sobre el archivo sintético
+- bulk_upsert_historical: carga inicial y re-carga (conflictos -> UPDATE), por lotes de --chunk-rows
+- _extract_forecast y ModelRegistry.load_all sobre pickles ARIMA sintéticos (si hay statsmodels)
+- consultas de visualize: serie diaria (caché fría / caliente), serie mensual y lote de series
+
+Uso:
+    python benchmarks/bench_suite.py --database-url postgresql+psycopg://.../bench_db \\
+        [--medicines 20 --years 3] [--out resultados.json] [--baseline base.json --threshold 0.25]
+Usar una base descartable: se insertan medicamentos 'BENCH MEDICAMENTO nnnnn'. La URL es
+obligatoria (--database-url o BENCH_DATABASE_URL); nunca se usa el DATABASE_URL de .env.
+Sale con código 1 si alguna métrica empeora más de --threshold respecto del baseline.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+def timed(fn, repeat: int) -> dict:
+    secs, out = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        secs.append(time.perf_counter() - t0)
+    return {"median_s": statistics.median(secs), "min_s": min(secs), "runs": repeat, "_last": out}
+
+
+def compare(metrics: dict, baseline: dict, threshold: float) -> list[str]:
+    """Métricas cuya mediana supera baseline * (1 + threshold)."""
+    worse = []
+    for name, m in metrics.items():
+        b = baseline.get("metrics", {}).get(name)
+        if not b or not b.get("median_s"):
+            continue
+        ratio = m["median_s"] / b["median_s"]
+        if ratio > 1 + threshold:
+            worse.append(f"{name}: {m['median_s']:.4f}s vs {b['median_s']:.4f}s (x{ratio:.2f})")
+    return worse
+
+
+def run(args, work: Path) -> dict:
+    import synthetic
+    from web_app.db import SessionLocal, engine
+    from web_app.schema_setup import setup_schema
+    from web_app.utils.file_parsers import read_any_table
+    from web_app.services.historical_service import (
+        bulk_upsert_historical, fetch_series_batch, get_monthly_series,
+    )
+    from web_app.services.series_cache import series_cache
+    from web_app.services.version_service import get_versions
+    from web_app.models.medicine import Medicine
+
+    metrics: dict[str, dict] = {}
+
+    def record(name, fn, repeat=args.repeat):
+        r = timed(fn, repeat)
+        out = r.pop("_last")
+        metrics[name] = r
+        print(f"  {name:<34} {r['median_s'] * 1000:10.1f} ms")
+        return out
+
+    df = synthetic.make_table(args.medicines, args.years, seed=args.seed)
+    xlsx = synthetic.write_table(df, work / "historicos.xlsx")
+    csv = synthetic.write_table(df, work / "historicos.csv")
+    print(f"[INFO] {len(df)} filas sintéticas ({args.medicines} medicamentos × {args.years} años)")
+
+    record("read_any_table.xlsx", lambda: read_any_table(str(xlsx)), repeat=1)
+    raw = record("read_any_table.csv", lambda: read_any_table(str(csv)))
+
+    setup_schema(engine)
+    chunks = [raw.iloc[i:i + args.chunk_rows] for i in range(0, len(raw), args.chunk_rows)]
+
+    def upsert_all():
+        db = SessionLocal()
+        try:
+            return sum(bulk_upsert_historical(db, c, "bench.csv")["inserted"] for c in chunks)
+        finally:
+            db.close()
+
+    record("bulk_upsert_historical.insert", upsert_all, repeat=1)
+    record("bulk_upsert_historical.update", upsert_all)
+    metrics["bulk_upsert_historical.update"]["rows_per_s"] = len(raw) / metrics["bulk_upsert_historical.update"]["median_s"]
+
+    db = SessionLocal()
+    try:
+        names = [m[1] for m in synthetic.medicines(args.medicines)]
+        ids = [i for (i,) in db.query(Medicine.id).filter(Medicine.name.in_(names))]
+        versions = get_versions(db, ids)
+
+        def series_cold():
+            series_cache.invalidate(ids)
+            return [len(series_cache.get(db, i, versions.get(i, 0))) for i in ids]
+
+        def series_warm():
+            return [len(series_cache.get(db, i, versions.get(i, 0))) for i in ids]
+
+        record("visualize.historical.cold", series_cold)
+        record("visualize.historical.warm", series_warm)
+        record("visualize.monthly", lambda: [len(get_monthly_series(db, i)) for i in ids])
+        record("visualize.batch.day", lambda: fetch_series_batch(db, ids, [], bucket="day"))
+        record("visualize.batch.month", lambda: fetch_series_batch(db, ids, [], bucket="month"))
+    finally:
+        db.close()
+
+    try:
+        import statsmodels  # noqa: F401
+    except ImportError:
+        print("[WARN] statsmodels no instalado: se omiten _extract_forecast y load_all")
+        return metrics
+
+    from web_app.models_loader import ModelRegistry
+    from web_app.services.prediction_service import _extract_forecast
+
+    models_dir = work / "modelos"
+    synthetic.make_arima_pickles(models_dir, args.models, seed=args.seed)
+    registry = ModelRegistry(models_dir)
+    record("ModelRegistry.load_all", registry.load_all)
+    models = [registry._models[k] for k in registry.keys()]
+    record("_extract_forecast.12", lambda: [_extract_forecast(m, 12) for m in models])
+    return metrics
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"))
+    ap.add_argument("--medicines", type=int, default=20)
+    ap.add_argument("--years", type=int, default=3)
+    ap.add_argument("--models", type=int, default=10)
+    ap.add_argument("--chunk-rows", type=int, default=4000,
+                    help="filas por llamada a bulk_upsert_historical (un INSERT multi-VALUES por lote)")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", type=Path, default=None)
+    ap.add_argument("--baseline", type=Path, default=None)
+    ap.add_argument("--threshold", type=float, default=0.25, help="regresión tolerada (0.25 = +25%%)")
+    args = ap.parse_args(argv)
+    if not args.database_url:
+        ap.error("falta --database-url (o BENCH_DATABASE_URL): usar una base descartable, "
+                 "nunca la de .env (se insertan medicamentos e históricos BENCH)")
+
+    # el engine se crea al importar web_app.db: la URL tiene que estar antes
+    os.environ["DATABASE_URL"] = args.database_url
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+    with tempfile.TemporaryDirectory(prefix="bench_") as tmp:
+        metrics = run(args, Path(tmp))
+
+    result = {
+        "benchmark": "suite",
+        "params": {k: getattr(args, k) for k in ("medicines", "years", "models", "chunk_rows", "repeat", "seed")},
+        "python": sys.version.split()[0],
+        "metrics": metrics,
+    }
+    if args.out:
+        args.out.write_text(json.dumps(result, indent=2))
+    else:
+        print(json.dumps(result, indent=2))
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        if baseline.get("params") != result["params"]:
+            print("[WARN] el baseline se midió con otros parámetros; la comparación es orientativa")
+        worse = compare(metrics, baseline, args.threshold)
+        for w in worse:
+            print(f"[FAIL] {w}")
+        if worse:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,317 @@
+"""
+Prueba de carga: levanta la API (uvicorn) contra un PostgreSQL local, la siembra con
+seed_admin.py + datos sintéticos y la recorre con escenarios mixtos a concurrencia creciente.
+
+Escenarios (pesos con --mix):
+- login      POST /auth/login
+- visualize  GET  /visualize/historical paginado (página al azar)
+- monthly    GET  /visualize/monthly
+- predict    POST /predict (requiere statsmodels para los .pkl sintéticos)
+- upload     POST /historical/upload (CSV chico de un mes)
+
+Uso:
+    python benchmarks/load_test.py --database-url postgresql+psycopg://.../bench_db \\
+        --stages 5,10,20,40 --stage-seconds 20 [--slo visualize=p95:300] [--out carga.json]
+Reporta por etapa y endpoint p50/p95/p99, req/s y tasa de error contra los SLO;
+sale con código 1 si alguna etapa los viola.
+--database-url (o BENCH_DATABASE_URL) es obligatorio salvo con --base-url: nunca se usa el
+DATABASE_URL de .env. Los .pkl sintéticos van a un directorio temporal (MODELOS_DIR del servidor).
+Requiere httpx y uvicorn (y pandas para los datos sintéticos).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(HERE))
+
+ADMIN = ("admin@example.com", "admin123")  # el de seed_admin.py
+
+# SLO por endpoint: percentil -> ms, y error máximo (fracción)
+DEFAULT_SLOS = {
+    "login": {"p95": 800, "errors": 0.01},
+    "visualize": {"p95": 300, "errors": 0.01},
+    "monthly": {"p95": 300, "errors": 0.01},
+    "predict": {"p95": 1500, "errors": 0.01},
+    "upload": {"p95": 5000, "errors": 0.02},
+}
+DEFAULT_MIX = "login:1,visualize:10,monthly:4,predict:2,upload:1"
+
+
+def parse_kv(spec: str) -> dict[str, float]:
+    out = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        k, v = part.split(":")
+        out[k] = float(v)
+    return out
+
+
+def parse_slos(items: list[str]) -> dict:
+    """--slo visualize=p95:300,errors:0.005 (se combina con los valores por defecto)."""
+    slos = {k: dict(v) for k, v in DEFAULT_SLOS.items()}
+    for item in items or []:
+        name, spec = item.split("=", 1)
+        slos.setdefault(name, {}).update(parse_kv(spec))
+    return slos
+
+
+def percentile(sorted_vals: list[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = min(len(sorted_vals) - 1, max(0, int(round(q / 100 * (len(sorted_vals) - 1)))))
+    return sorted_vals[k]
+
+
+# ---------------------------
+# Preparación
+# ---------------------------
+def seed(env: dict, args, models_dir: Path) -> dict:
+    """seed_admin + .pkl sintéticos en models_dir; devuelve medicamentos y .pkl creados."""
+    import synthetic
+
+    subprocess.run([sys.executable, "seed_admin.py"], cwd=ROOT, env=env, check=True)
+    meds = synthetic.medicines(args.medicines)
+    created = []
+    try:
+        created = synthetic.make_arima_pickles(models_dir, min(args.medicines, args.models), seed=args.seed)
+    except ImportError:
+        print("[WARN] statsmodels/joblib no instalados: se omite el escenario predict")
+    return {"medicines": meds, "pickles": created}
+
+
+def synthetic_csvs(args) -> tuple[bytes, bytes]:
+    """(histórico completo para la carga inicial, un mes para el escenario upload)."""
+    import synthetic
+    df = synthetic.make_table(args.medicines, args.years, seed=args.seed)
+    full = df.to_csv(index=False).encode()
+    month = df[df["Fecha"].str.startswith(df["Fecha"].iloc[-1][:7])]
+    return full, month.to_csv(index=False).encode()
+
+
+def start_server(env: dict, args) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "uvicorn", "web_app.main:app", "--host", "127.0.0.1",
+           "--port", str(args.port), "--workers", str(args.server_workers), "--log-level", "warning"]
+    return subprocess.Popen(cmd, cwd=ROOT, env=env)
+
+
+async def wait_ready(client, timeout: float) -> None:
+    t0 = time.monotonic()
+    while time.monotonic() - t0 < timeout:
+        try:
+            r = await client.get("/ready")
+            if r.status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"la API no quedó lista en {timeout}s")
+
+
+# ---------------------------
+# Escenarios
+# ---------------------------
+class Scenarios:
+    def __init__(self, client, token: str, meds, has_models: bool, upload_csv: bytes, page: int):
+        self.client, self.meds, self.page = client, meds, page
+        self.auth = {"Authorization": f"Bearer {token}"}
+        self.upload_csv = upload_csv
+        self.has_models = has_models
+
+    def _med(self) -> dict:
+        _, n, c, f, u = random.choice(self.meds)
+        return {"name": n, "concentration": c, "dosage_form": f, "unit_measure": u}
+
+    async def login(self):
+        return await self.client.post("/auth/login", json={"email": ADMIN[0], "password": ADMIN[1]})
+
+    async def visualize(self):
+        params = {**self._med(), "limit": self.page, "skip": self.page * random.randint(0, 5)}
+        return await self.client.get("/visualize/historical", params=params, headers=self.auth)
+
+    async def monthly(self):
+        return await self.client.get("/visualize/monthly", params=self._med(), headers=self.auth)
+
+    async def predict(self):
+        return await self.client.post("/predict", json={**self._med(), "periods": 6}, headers=self.auth)
+
+    async def upload(self):
+        files = {"file": (f"carga_{random.randint(0, 1_000_000)}.csv", io.BytesIO(self.upload_csv), "text/csv")}
+        return await self.client.post("/historical/upload", files=files, headers=self.auth)
+
+
+async def user_loop(sc: Scenarios, names: list[str], weights: list[float], until: float,
+                    think: float, samples: dict) -> None:
+    while time.monotonic() < until:
+        name = random.choices(names, weights)[0]
+        t0 = time.perf_counter()
+        try:
+            r = await getattr(sc, name)()
+            ok = r.status_code < 400
+            status = r.status_code
+        except Exception:
+            ok, status = False, "exc"
+        samples[name].append((time.perf_counter() - t0, ok, status))
+        if think:
+            await asyncio.sleep(random.uniform(0, 2 * think))
+
+
+def summarize(samples: dict, seconds: float, slos: dict) -> tuple[dict, list[str]]:
+    out, violations = {}, []
+    for name, rows in samples.items():
+        lat = sorted(r[0] * 1000 for r in rows)
+        errors = sum(1 for r in rows if not r[1])
+        codes = defaultdict(int)
+        for r in rows:
+            codes[str(r[2])] += 1
+        m = {
+            "requests": len(rows), "rps": len(rows) / seconds,
+            "error_rate": errors / len(rows) if rows else 0.0,
+            "p50_ms": percentile(lat, 50), "p95_ms": percentile(lat, 95), "p99_ms": percentile(lat, 99),
+            "status": dict(codes),
+        }
+        for key, limit in slos.get(name, {}).items():
+            value = m["error_rate"] if key == "errors" else m.get(f"{key}_ms")
+            if value is not None and value > limit:
+                violations.append(f"{name}: {key}={value:.3f} > {limit}")
+        out[name] = m
+    return out, violations
+
+
+async def drive(args, meds, has_models: bool, slos: dict) -> dict:
+    import httpx
+
+    base = args.base_url or f"http://127.0.0.1:{args.port}"
+    limits = httpx.Limits(max_connections=max(args.stages) * 2, max_keepalive_connections=max(args.stages))
+    async with httpx.AsyncClient(base_url=base, timeout=args.timeout, limits=limits) as client:
+        await wait_ready(client, args.ready_timeout)
+        r = await client.post("/auth/login", json={"email": ADMIN[0], "password": ADMIN[1]})
+        r.raise_for_status()
+        token = r.json()["access_token"]
+
+        full_csv, month_csv = synthetic_csvs(args)
+        if not args.skip_load:
+            print("[INFO] cargando histórico sintético vía /historical/upload ...")
+            t0 = time.perf_counter()
+            r = await client.post("/historical/upload", headers={"Authorization": f"Bearer {token}"},
+                                  files={"file": ("bench_historico.csv", io.BytesIO(full_csv), "text/csv")},
+                                  timeout=600)
+            r.raise_for_status()
+            print(f"[INFO] carga inicial: {time.perf_counter() - t0:.1f}s")
+        if has_models:
+            await client.post("/predict/models/reload", headers={"Authorization": f"Bearer {token}"})
+
+        mix = parse_kv(args.mix)
+        if not has_models:
+            mix.pop("predict", None)
+        names, weights = list(mix), list(mix.values())
+        sc = Scenarios(client, token, meds, has_models, month_csv, args.page)
+
+        stages = []
+        for users in args.stages:
+            samples: dict[str, list] = defaultdict(list)
+            until = time.monotonic() + args.stage_seconds
+            t0 = time.perf_counter()
+            await asyncio.gather(*(user_loop(sc, names, weights, until, args.think_ms / 1000, samples)
+                                   for _ in range(users)))
+            secs = time.perf_counter() - t0
+            endpoints, violations = summarize(samples, secs, slos)
+            total = sum(m["requests"] for m in endpoints.values())
+            stages.append({"users": users, "seconds": secs, "rps": total / secs,
+                           "endpoints": endpoints, "violations": violations})
+            flag = "OK " if not violations else "SLO"
+            print(f"[{flag}] {users:>4} usuarios  {total / secs:8.1f} req/s")
+            for name, m in sorted(endpoints.items()):
+                print(f"        {name:<10} n={m['requests']:<6} p50={m['p50_ms']:7.1f} p95={m['p95_ms']:7.1f} "
+                      f"p99={m['p99_ms']:7.1f} ms  err={m['error_rate'] * 100:5.2f}%")
+            for v in violations:
+                print(f"        [FAIL] {v}")
+        return {"base_url": base, "stages": stages}
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"))
+    ap.add_argument("--base-url", default=None, help="usar una API ya levantada (no se siembra ni se arranca)")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--server-workers", type=int, default=1)
+    ap.add_argument("--stages", type=lambda s: [int(x) for x in s.split(",")], default=[5, 10, 20, 40])
+    ap.add_argument("--stage-seconds", type=float, default=20)
+    ap.add_argument("--think-ms", type=float, default=0, help="pausa media entre requests de un usuario")
+    ap.add_argument("--mix", default=DEFAULT_MIX)
+    ap.add_argument("--slo", action="append", help="endpoint=p95:300,errors:0.01 (repetible)")
+    ap.add_argument("--medicines", type=int, default=10)
+    ap.add_argument("--years", type=int, default=1)
+    ap.add_argument("--models", type=int, default=10)
+    ap.add_argument("--page", type=int, default=50)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--timeout", type=float, default=30)
+    ap.add_argument("--ready-timeout", type=float, default=120)
+    ap.add_argument("--skip-load", action="store_true", help="no subir el histórico sintético")
+    ap.add_argument("--out", type=Path, default=None)
+    args = ap.parse_args(argv)
+    if not args.base_url and not args.database_url:
+        ap.error("falta --database-url (o BENCH_DATABASE_URL): usar una base descartable, "
+                 "nunca la de .env (se siembra y se escribe en ella)")
+
+    import synthetic
+
+    random.seed(args.seed)
+    slos = parse_slos(args.slo)
+    env = dict(os.environ)
+    if args.database_url:
+        env["DATABASE_URL"] = args.database_url
+    # el throttling de login está pensado para personas, no para un generador de carga
+    env.setdefault("LOGIN_MAX_PER_IP", "1000000")
+    env.setdefault("LOGIN_MAX_FAILS_PER_ACCOUNT", "1000000")
+
+    server, models_dir = None, None
+    try:
+        if args.base_url:
+            meds, has_models = synthetic.medicines(args.medicines), True
+        else:
+            # los .pkl sintéticos nunca tocan modelos/ del repo
+            models_dir = Path(tempfile.mkdtemp(prefix="bench_modelos_"))
+            env["MODELOS_DIR"] = str(models_dir)
+            seeded = seed(env, args, models_dir)
+            meds, has_models = seeded["medicines"], bool(seeded["pickles"])
+            server = start_server(env, args)
+        result = asyncio.run(drive(args, meds, has_models, slos))
+    finally:
+        if server is not None:
+            server.send_signal(signal.SIGINT)
+            try:
+                server.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        if models_dir is not None:
+            shutil.rmtree(models_dir, ignore_errors=True)
+
+    passing = [s["users"] for s in result["stages"] if not s["violations"]]
+    result.update({
+        "slos": slos, "mix": args.mix, "server_workers": args.server_workers,
+        "max_users_within_slo": max(passing) if passing else 0,
+    })
+    print(f"Capacidad dentro de SLO: {result['max_users_within_slo']} usuarios concurrentes")
+    if args.out:
+        args.out.write_text(json.dumps(result, indent=2))
+    return 1 if any(s["violations"] for s in result["stages"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Datos sintéticos para los benchmarks.
+- make_table: medicamentos × años de filas diarias con los encabezados exactos del Excel
+  de farmacia (los que mapea historical_service._norm_headers) y los números en formato
+  local ('1.234,56'), igual que llegan en los archivos reales.
+- make_arima_pickles: un ARIMA(1,1,1) de statsmodels por medicamento, guardado con joblib
+  bajo el nombre que espera ModelRegistry (build_model_basename).
+"""
+
+from __future__ import annotations
+
+from datetime import date
+from pathlib import Path
+
+EXCEL_HEADERS = [
+    "Código", "Medicamento e Insumo", "Concentración", "Forma Farmacéutica", "Unidad de Medida",
+    "Fecha", "Salidas - Cantidad",
+    "Saldo Gestión Anterior - Cantidad", "Saldo Gestión Anterior - Valor (Bs.)",
+    "Ingresos - Cantidad", "Ingresos - Valor (Bs.)", "Salidas - Valor (Bs.)",
+    "Saldos Totales - Cantidad", "Saldos Totales - Valor (Bs.)",
+]
+
+FORMS = [("COMPRIMIDO", "COMPR"), ("JARABE", "FRASCO"), ("AMPOLLA", "AMP"), ("CAPSULA", "CAPS")]
+
+
+def medicines(n: int) -> list[tuple[str, str, str, str, str]]:
+    """(código, nombre, concentración, forma, unidad) deterministas."""
+    out = []
+    for i in range(n):
+        form, unit = FORMS[i % len(FORMS)]
+        out.append((f"B{i:05d}", f"BENCH MEDICAMENTO {i:05d}", f"{(i % 9 + 1) * 50} mg", form, unit))
+    return out
+
+
+def _fmt(x: float, decimals: int = 2) -> str:
+    """1234.5 -> '1.234,50' (miles con punto, decimal con coma)."""
+    s = f"{x:,.{decimals}f}"
+    return s.replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+def make_table(n_medicines: int, years: int, start_year: int = 2020, seed: int = 0):
+    """DataFrame con una fila por (medicamento, día)."""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    days = pd.date_range(date(start_year, 1, 1), date(start_year + years - 1, 12, 31), freq="D")
+    n = len(days)
+    t = np.arange(n)
+    frames = []
+    for code, name, conc, form, unit in medicines(n_medicines):
+        base = rng.uniform(5, 200)
+        season = 1 + 0.3 * np.sin(2 * np.pi * t / 365.25 + rng.uniform(0, 2 * np.pi))
+        out_q = np.maximum(0, rng.poisson(base * season)).astype(float)
+        in_q = np.where(rng.random(n) < 1 / 30, out_q.sum() / n * 30, 0.0).round()
+        price = rng.uniform(0.5, 40)
+        balance = np.maximum(0, base * 60 + np.cumsum(in_q - out_q))
+        frames.append(pd.DataFrame({
+            "Código": code, "Medicamento e Insumo": name, "Concentración": conc,
+            "Forma Farmacéutica": form, "Unidad de Medida": unit,
+            "Fecha": days.strftime("%Y-%m-%d"),
+            "Salidas - Cantidad": [_fmt(v, 0) for v in out_q],
+            "Saldo Gestión Anterior - Cantidad": _fmt(base * 60, 0),
+            "Saldo Gestión Anterior - Valor (Bs.)": _fmt(base * 60 * price),
+            "Ingresos - Cantidad": [_fmt(v, 0) for v in in_q],
+            "Ingresos - Valor (Bs.)": [_fmt(v * price) for v in in_q],
+            "Salidas - Valor (Bs.)": [_fmt(v * price) for v in out_q],
+            "Saldos Totales - Cantidad": [_fmt(v, 0) for v in balance],
+            "Saldos Totales - Valor (Bs.)": [_fmt(v * price) for v in balance],
+        }, columns=EXCEL_HEADERS))
+    return pd.concat(frames, ignore_index=True)
+
+
+def write_table(df, path: Path) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix.lower() == ".xlsx":
+        df.to_excel(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+
+def make_arima_pickles(folder: Path, n_medicines: int, months: int = 60, seed: int = 0) -> list[Path]:
+    """Ajusta y guarda un ARIMA(1,1,1) mensual por medicamento (requiere statsmodels y joblib)."""
+    import joblib
+    import numpy as np
+    import pandas as pd
+    from statsmodels.tsa.arima.model import ARIMA
+
+    from web_app.models_loader import build_model_basename
+
+    folder.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    idx = pd.date_range("2019-01-01", periods=months, freq="MS")
+    paths = []
+    for _, name, conc, form, unit in medicines(n_medicines):
+        y = pd.Series(1000 + np.cumsum(rng.normal(0, 50, months)), index=idx)
+        res = ARIMA(y, order=(1, 1, 1)).fit()
+        p = folder / f"{build_model_basename(name, conc, form, unit)}.pkl"
+        joblib.dump(res, p)
+        paths.append(p)
+    return paths
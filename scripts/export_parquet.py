@@ -0,0 +1,35 @@
+"""
+Exporta historicos / predicciones / medicamentos a Parquet (incremental por versión de datos).
+
+Uso:
+    python scripts/export_parquet.py [--full]
+Usa DATABASE_URL y ARCHIVE_DIR de web_app.config (variables de entorno / .env).
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from web_app.db import SessionLocal  # noqa: E402
+from web_app.services.archive_service import export_parquet  # noqa: E402
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--full", action="store_true", help="reexporta todo ignorando el estado previo")
+    args = ap.parse_args()
+
+    db = SessionLocal()
+    try:
+        summary = export_parquet(db, full=args.full)
+    finally:
+        db.close()
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
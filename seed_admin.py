@@ -1,12 +1,13 @@
 # seed_admin.py (en la raíz, al lado de web_app/)
-from web_app.db import SessionLocal, Base, engine
+from web_app.db import SessionLocal, engine
 from web_app.models.user import User, Role
+from web_app.schema_setup import setup_schema
 from passlib.context import CryptContext
 
 pwd_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def run():
-    Base.metadata.create_all(bind=engine)
+    setup_schema(engine)
     db = SessionLocal()
     try:
         if db.query(User).filter(User.email == "admin@example.com").first():
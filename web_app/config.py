@@ -14,9 +14,82 @@ class Settings(BaseModel):
     # Cadena de conexión para SQLAlchemy con el driver psycopg (PostgreSQL)
     DATABASE_URL: str = os.getenv("DATABASE_URL", "")
 
+    # Pool de conexiones (sync = escrituras/ingesta, async = routers de lectura)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_ASYNC_POOL_SIZE: int = int(os.getenv("DB_ASYNC_POOL_SIZE", "10"))
+    DB_ASYNC_MAX_OVERFLOW: int = int(os.getenv("DB_ASYNC_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))        # segundos esperando conexión
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))          # segundos de vida por conexión
+    DB_STATEMENT_TIMEOUT_MS: int = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))  # 0 = sin límite
+
+    # Particionado por año de historicos/predicciones (solo al crear las tablas)
+    DB_PARTITIONING: bool = os.getenv("DB_PARTITIONING", "0").lower() in ("1", "true", "yes")
+    DB_PARTITION_FIRST_YEAR: int = int(os.getenv("DB_PARTITION_FIRST_YEAR", "2015"))
+
     # Config JWT (autenticación)
     SECRET_KEY: str = os.getenv("SECRET_KEY", "cambiame")
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "120"))
+    # Segundos que un usuario resuelto desde el token queda en caché (0 = sin caché)
+    USER_CACHE_TTL_SECONDS: float = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+
+    # Hash de contraseñas (bcrypt) en pool dedicado + límites de login
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+    LOGIN_MAX_PER_IP: int = int(os.getenv("LOGIN_MAX_PER_IP", "30"))              # fallos por IP por ventana
+    LOGIN_MAX_FAILS_PER_ACCOUNT: int = int(os.getenv("LOGIN_MAX_FAILS_PER_ACCOUNT", "5"))  # fallos por ventana
+    LOGIN_WINDOW_SECONDS: float = float(os.getenv("LOGIN_WINDOW_SECONDS", "300"))
+    # IPs de proxies inversos propios (coma): detrás de ellos la IP real sale de X-Forwarded-For
+    LOGIN_TRUSTED_PROXIES: str = os.getenv("LOGIN_TRUSTED_PROXIES", "")
+
+    # Caché de series en memoria (bytes máximos por proceso)
+    SERIES_CACHE_MAX_BYTES: int = int(os.getenv("SERIES_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+    # Caché de respuestas de /visualize por ETag (0 = desactivada)
+    VISUALIZE_RESPONSE_CACHE_ENTRIES: int = int(os.getenv("VISUALIZE_RESPONSE_CACHE_ENTRIES", "0"))
+
+    # Reportes cacheados: hilos de generación, antigüedad máxima y presupuesto de disco
+    REPORT_WORKERS: int = int(os.getenv("REPORT_WORKERS", "2"))
+    REPORT_MAX_AGE_HOURS: float = float(os.getenv("REPORT_MAX_AGE_HOURS", "72"))
+    REPORT_DISK_BUDGET_MB: int = int(os.getenv("REPORT_DISK_BUDGET_MB", "2048"))
+    # trabajos pending/running sin latido hace más que esto se dan por perdidos (reinicio/caída
+    # del worker); el proceso dueño renueva el latido cada REPORT_HEARTBEAT_SECONDS
+    REPORT_STALE_MINUTES: float = float(os.getenv("REPORT_STALE_MINUTES", "30"))
+    REPORT_HEARTBEAT_SECONDS: float = float(os.getenv("REPORT_HEARTBEAT_SECONDS", "30"))
+
+    # Carpeta de los .pkl (por defecto modelos/ en la raíz del repo)
+    MODELOS_DIR: str = os.getenv("MODELOS_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "modelos"))
+
+    # Archivo Parquet para analítica (fuera de la BD transaccional)
+    ARCHIVE_DIR: str = os.getenv("ARCHIVE_DIR", "storage/archive")
+
+    # /metrics (formato Prometheus) y middleware de latencia por ruta
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+
+    # Perfilado por request (X-Profile: 1, solo ADMIN) y log de consultas lentas
+    PROFILING_ENABLED: bool = os.getenv("PROFILING_ENABLED", "1").lower() in ("1", "true", "yes")
+    PROFILE_SAMPLE_INTERVAL_MS: float = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+    PROFILE_KEEP: int = int(os.getenv("PROFILE_KEEP", "50"))
+    SLOW_QUERY_MS: float = float(os.getenv("SLOW_QUERY_MS", "500"))
+
+    # Pronósticos precalculados: horizonte estándar (meses), bandas (%) y corrida nocturna (hora UTC)
+    FORECAST_HORIZON: int = int(os.getenv("FORECAST_HORIZON", "12"))
+    FORECAST_LEVELS: str = os.getenv("FORECAST_LEVELS", "80,95")
+    FORECAST_NIGHTLY_HOUR: int = int(os.getenv("FORECAST_NIGHTLY_HOUR", "2"))
+    # además de modelo/datos cambiados, se rehacen los calculados hace más de esto (y los de meses anteriores)
+    FORECAST_MAX_AGE_HOURS: float = float(os.getenv("FORECAST_MAX_AGE_HOURS", "168"))
+    FORECAST_SCHEDULER_ENABLED: bool = os.getenv("FORECAST_SCHEDULER_ENABLED", "1").lower() in ("1", "true", "yes")
+
+    # Simulación de quiebre de stock: caminos por medicamento y presupuesto de elementos B*N*H por
+    # llamada, repartido entre los hilos (cada bloque usa ~5 arreglos float64 de ese tamaño)
+    STOCKOUT_PATHS: int = int(os.getenv("STOCKOUT_PATHS", "5000"))
+    STOCKOUT_BLOCK_ELEMENTS: int = int(os.getenv("STOCKOUT_BLOCK_ELEMENTS", "4000000"))
+
+    # Planificación de compras: meses de historia para medicamentos sin pronóstico
+    PLANNING_HISTORY_MONTHS: int = int(os.getenv("PLANNING_HISTORY_MONTHS", "12"))
+
+    # Búsqueda de medicamentos: cada cuánto se revisa si el catálogo cambió en otro proceso
+    SEARCH_INDEX_CHECK_SECONDS: float = float(os.getenv("SEARCH_INDEX_CHECK_SECONDS", "30"))
 
 settings = Settings()
\ No newline at end of file
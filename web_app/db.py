@@ -1,16 +1,54 @@
 """
 Define la conexión a la BD, el creador de sesiones y la clase Base para los modelos.
+- engine / SessionLocal / get_db: camino síncrono (escrituras, ingesta, predicción).
+- async_engine / AsyncSessionLocal / get_async_db: camino async (routers de lectura).
+Tamaños de pool, timeouts y statement_timeout se configuran en Settings.
+El camino async necesita psycopg 3 y greenlet: pip install "sqlalchemy[asyncio]" "psycopg[binary]".
+Los pools miden la espera de checkout (ver metrics.py); las consultas pasan por los
+hooks de profiling.py (consultas lentas y perfil por request).
 """
 
 from sqlalchemy import create_engine 
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 from .config import settings
+from .metrics import TimedAsyncQueuePool, TimedQueuePool
+from .profiling import install_sql_hooks
+
+try:  # sin greenlet create_async_engine funciona pero la primera consulta async falla
+    import greenlet  # noqa: F401
+except ImportError as e:
+    raise ImportError('Falta greenlet para el motor async: pip install "sqlalchemy[asyncio]"') from e
+
+def _engine_kwargs(pool_size: int, max_overflow: int, poolclass) -> dict:
+    kw = dict(
+        poolclass=poolclass,
+        pool_pre_ping=True,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+    )
+    if settings.DB_STATEMENT_TIMEOUT_MS > 0:
+        # se aplica por conexión: ninguna consulta puede pasar de este tiempo
+        kw["connect_args"] = {"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"}
+    return kw
 
 # Crea el motor usando la URL de conexión 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+engine = create_engine(settings.DATABASE_URL,
+                       **_engine_kwargs(settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW, TimedQueuePool))
+
+# Motor async (psycopg 3 soporta async con la misma URL postgresql+psycopg://)
+async_engine = create_async_engine(settings.DATABASE_URL,
+                                   **_engine_kwargs(settings.DB_ASYNC_POOL_SIZE, settings.DB_ASYNC_MAX_OVERFLOW,
+                                                                   TimedAsyncQueuePool))
 
-# Crea el motor usando la URL de conexión
+install_sql_hooks(engine)
+install_sql_hooks(async_engine.sync_engine)
+
+# Crea el creador de sesiones
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
 
 class Base(DeclarativeBase): 
     # clase base para todas las tablas (modelos)
@@ -25,3 +63,8 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    # dependencia async: db: AsyncSession = Depends(get_async_db)
+    # Los servicios síncronos se reutilizan con: await db.run_sync(servicio, *args)
+    async with AsyncSessionLocal() as db:
+        yield db
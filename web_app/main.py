@@ -2,8 +2,10 @@
 Punto de entrada de la API:
 - Crea la app de FastAPI
 - Habilita CORS (para que tu frontend pueda llamar a la API)
-- Importa modelos y crea las tablas si no existen
+- Importa modelos y crea las tablas si no existen (schema_setup, con particionado opcional)
 - Registra los routers (módulos)
+Arranque rápido: el esquema y los .pkl se preparan en segundo plano desde el lifespan;
+/ready indica cuándo terminó. pandas/numpy/joblib se importan recién al usarse.
 """
 
 
@@ -17,10 +19,11 @@ import pandas as pd
 
 from .schemas import PredictQuery, PredictResponse, ForecastPoint
 from .models_loader import ModelRegistry
+from .config import settings
 
 # --- Config básica ---
 BASE_DIR = Path(__file__).resolve().parents[1]
-MODELOS_DIR = BASE_DIR / "modelos"
+MODELOS_DIR = Path(settings.MODELOS_DIR)
 
 app = FastAPI(title="ARIMA Forecast API", version="1.0.0")
 app.add_middleware(
@@ -91,18 +94,72 @@ def predict(med: str, body: PredictQuery):
         raise HTTPException(status_code=500, detail=f"Error al pronosticar: {e}")
 """
 
+import threading
+import time
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .db import Base, engine
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from .config import settings
+from .db import engine, async_engine
+from . import metrics
+from .profiling import ProfilingMiddleware
+from .security import hash_stats
+from .services.series_cache import series_cache
+from .services.user_cache import user_cache
+from .utils.http_cache import response_cache
+from .schema_setup import setup_schema
 # importa modelos antes de create_all
 from .models.user import User
 from .models.medicine import Medicine
 from .models.historical import Historical
+from .models.historical_monthly import HistoricalMonthly
 from .models.prediction import Prediction
 from .models.report import Report
-from .routers import auth, historical, visualize, predict
+from .models.data_version import DataVersion
+from .models.forecast_store import StoredForecast
+from .services.forecast_store import forecast_scheduler
+from .routers import auth, historical, visualize, predict, resports, profiles
+
+# estado de las tareas de arranque (ver /ready)
+startup_state: dict = {"schema": "pending", "models": "pending", "forecasts": "pending", "errors": {}, "seconds": {}}
 
-app = FastAPI(title="Medicamentos API (ARIMA PKL por 4 atributos)", version="1.0.0")
+def _run_startup_task(name: str, fn) -> None:
+    t0 = time.perf_counter()
+    try:
+        fn()
+        startup_state[name] = "ok"
+    except Exception as e:
+        startup_state[name] = "error"
+        startup_state["errors"][name] = str(e)
+        print(f"[WARN] arranque '{name}' falló: {e}")
+    finally:
+        startup_state["seconds"][name] = round(time.perf_counter() - t0, 3)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # no bloquea el boot del worker: esquema y modelos en paralelo, en segundo plano
+    threads = []
+    for name, fn in (("schema", lambda: setup_schema(engine)), ("models", predict.registry.load_all)):
+        t = threading.Thread(target=_run_startup_task, args=(name, fn), name=f"startup-{name}", daemon=True)
+        t.start(); threads.append(t)
+
+    def start_forecasts():
+        # necesita la tabla y los modelos: espera a las dos tareas anteriores
+        for t in threads:
+            t.join()
+        if startup_state["schema"] != "ok" or startup_state["models"] != "ok":
+            raise RuntimeError("esquema o modelos no disponibles")
+        forecast_scheduler.start(predict.registry)
+        forecast_scheduler.request(None)
+
+    threading.Thread(target=_run_startup_task, args=("forecasts", start_forecasts),
+                     name="startup-forecasts", daemon=True).start()
+    yield
+
+app = FastAPI(title="Medicamentos API (ARIMA PKL por 4 atributos)", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -111,13 +168,48 @@ app.add_middleware(
     allow_headers=["*"], 
     allow_credentials=True,
 )
-
-Base.metadata.create_all(bind=engine)
+# comprime respuestas grandes (series, exportaciones) si el cliente acepta gzip
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+if settings.METRICS_ENABLED:
+    # el más externo: mide también compresión y CORS
+    app.add_middleware(metrics.MetricsMiddleware)
+
+# métricas que ya viven en otros módulos: se leen solo al hacer scrape
+_CACHES = {"series": series_cache, "user": user_cache, "response": response_cache}
+metrics.register_callback("cache_hits_total", "Aciertos por caché", ("cache",),
+                          lambda: {(n,): c.hits for n, c in _CACHES.items()}, kind="counter")
+metrics.register_callback("cache_misses_total", "Fallos por caché", ("cache",),
+                          lambda: {(n,): c.misses for n, c in _CACHES.items()}, kind="counter")
+metrics.register_callback("cache_hit_ratio", "hits / (hits + misses) desde el arranque", ("cache",),
+                          lambda: {(n,): c.hits / (c.hits + c.misses) for n, c in _CACHES.items() if c.hits + c.misses})
+metrics.register_callback("model_registry_models", "Modelos .pkl cargados en memoria", (),
+                          lambda: {(): len(predict.registry.keys())})
+metrics.register_callback("db_pool_checked_out", "Conexiones prestadas del pool", ("pool",),
+                          lambda: {("sync",): engine.pool.checkedout(), ("async",): async_engine.pool.checkedout()})
+metrics.register_callback("password_hash_total", "Hashes/verificaciones bcrypt", ("result",),
+                          lambda: {("done",): hash_stats.count, ("rejected",): hash_stats.rejected}, kind="counter")
+metrics.register_callback("startup_task_seconds", "Duración de las tareas de arranque", ("task",),
+                          lambda: {(k,): v for k, v in startup_state["seconds"].items()})
 
 @app.get("/")
 def root(): return {"ok": True, "msg": "API viva. Visita /docs"}
 
+@app.get("/ready")
+def ready():
+    ok = startup_state["schema"] == "ok" and startup_state["models"] == "ok"
+    return JSONResponse({"ready": ok, **startup_state}, status_code=200 if ok else 503)
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    if not settings.METRICS_ENABLED:
+        return PlainTextResponse("metrics disabled\n", status_code=404)
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 app.include_router(auth.router)
 app.include_router(historical.router)
 app.include_router(visualize.router)
-app.include_router(predict.router)
\ No newline at end of file
+app.include_router(predict.router)
+app.include_router(resports.router)
+app.include_router(profiles.router)
\ No newline at end of file
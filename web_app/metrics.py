@@ -0,0 +1,208 @@
+"""
+Métricas en formato de exposición de Prometheus (texto 0.0.4), sin dependencias.
+- Counter / Gauge / Histogram con etiquetas; cada observación es un bisect y una suma
+  bajo un lock (negligible frente a un request).
+- Gauge con callback para valores que ya existen en otro lado (tamaño del registro de
+  modelos, contadores de las cachés, estado del pool): se leen solo al hacer scrape.
+- MetricsMiddleware (ASGI puro) mide latencia por (método, ruta plantilla, status).
+- TimedQueuePool mide la espera para obtener una conexión del pool.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (10, 100, 500, 1000, 5000, 10_000, 50_000, 100_000, 500_000)
+
+
+def _esc(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_esc(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labels: tuple = ()):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, doc, labels=()):
+        super().__init__(name, doc, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, *labels) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_fmt_labels(self.labels, k)} {_num(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """Valor fijado con set() o calculado por `fn` al hacer scrape (fn -> {labels: valor})."""
+    kind = "gauge"
+
+    def __init__(self, name, doc, labels=(), fn=None, kind: str = "gauge"):
+        super().__init__(name, doc, labels)
+        self._values: dict[tuple, float] = {}
+        self._fn = fn
+        self.kind = kind
+
+    def set(self, value: float, *labels) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self) -> list[str]:
+        if self._fn is not None:
+            try:
+                items = list(self._fn().items())
+            except Exception:
+                items = []
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return self.header() + [f"{self.name}{_fmt_labels(self.labels, k)} {_num(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, doc, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(buckets)
+        # labels -> [conteos por bucket (+Inf al final), suma]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            s[0][i] += 1
+            s[1] += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = [(k, list(c), total) for k, (c, total) in self._series.items()]
+        out = self.header()
+        for k, counts, total in items:
+            acc = 0
+            for le, c in zip(self.buckets + (float("inf"),), counts):
+                acc += c
+                le_label = 'le="%s"' % _num(le)
+                out.append(f"{self.name}_bucket{_fmt_labels(self.labels, k, le_label)} {acc}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labels, k)} {_num(total)}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labels, k)} {acc}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+
+    def add(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+http_latency = REGISTRY.add(Histogram(
+    "http_request_duration_seconds", "Latencia de requests HTTP", ("method", "route", "status")))
+registry_load_seconds = REGISTRY.add(Histogram(
+    "model_registry_load_seconds", "Duración de ModelRegistry.load_all"))
+forecast_seconds = REGISTRY.add(Histogram(
+    "forecast_compute_seconds", "Tiempo de cálculo del pronóstico por modelo", ("model",)))
+ingest_rows = REGISTRY.add(Counter(
+    "ingest_rows_total", "Filas de historicos procesadas por bulk_upsert_historical"))
+ingest_batch_rows = REGISTRY.add(Histogram(
+    "ingest_batch_rows", "Filas por lote de ingesta", buckets=SIZE_BUCKETS))
+ingest_seconds = REGISTRY.add(Histogram(
+    "ingest_batch_seconds", "Duración de un lote de ingesta"))
+ingest_rows_per_second = REGISTRY.add(Gauge(
+    "ingest_last_rows_per_second", "Throughput del último lote de ingesta"))
+pool_checkout_seconds = REGISTRY.add(Histogram(
+    "db_pool_checkout_seconds", "Espera para obtener una conexión del pool", ("pool",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)))
+
+
+def register_callback(name: str, doc: str, labels: tuple, fn, kind: str = "gauge") -> None:
+    """Métrica leída en el scrape; kind='counter' para contadores mantenidos por otro módulo."""
+    REGISTRY.add(Gauge(name, doc, labels, fn=fn, kind=kind))
+
+
+class MetricsMiddleware:
+    """Latencia por ruta plantilla (/visualize/historical, no la URL concreta) y status."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path_format", None) or getattr(route, "path", None) or "unmatched"
+            http_latency.observe(time.perf_counter() - t0, scope["method"], path, str(status[0]))
+
+
+def _timed_get(pool_name: str, do_get):
+    t0 = time.perf_counter()
+    try:
+        return do_get()
+    finally:
+        pool_checkout_seconds.observe(time.perf_counter() - t0, pool_name)
+
+
+class TimedQueuePool(QueuePool):
+    def _do_get(self):
+        return _timed_get("sync", super()._do_get)
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        return _timed_get("async", super()._do_get)
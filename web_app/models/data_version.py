@@ -0,0 +1,23 @@
+"""
+Versión de datos por medicamento. La ingesta incrementa version y la escritura de
+predicciones version_predicciones (por separado: un /predict no invalida cachés que solo
+dependen de historicos, como los pronósticos precalculados). Los endpoints de
+visualización las usan para ETag/Last-Modified y cachés.
+"""
+
+from datetime import datetime
+from sqlalchemy import BigInteger, DateTime, ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column
+from ..db import Base
+
+class DataVersion(Base):
+    __tablename__ = "versiones_datos"
+
+    medicine_id: Mapped[int] = mapped_column(
+        "medicamento_id",
+        ForeignKey("medicamentos.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    version: Mapped[int] = mapped_column("version", BigInteger, nullable=False, default=1)
+    prediction_version: Mapped[int | None] = mapped_column("version_predicciones", BigInteger, nullable=True, default=0)
+    updated_at: Mapped[datetime] = mapped_column("actualizado_en", DateTime, default=datetime.utcnow)
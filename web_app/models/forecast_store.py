@@ -0,0 +1,32 @@
+"""
+Pronósticos precalculados: uno por medicamento, para el horizonte estándar y las
+bandas de confianza configuradas. Se recalculan cuando cambia la versión del modelo
+(.pkl) o la de los datos del medicamento (ver services/forecast_store.py).
+"""
+
+from datetime import date, datetime
+from sqlalchemy import BigInteger, Date, DateTime, Float, ForeignKey, Integer, JSON, String
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Mapped, mapped_column
+from ..db import Base
+
+class StoredForecast(Base):
+    __tablename__ = "pronosticos_precalculados"
+
+    medicine_id: Mapped[int] = mapped_column(
+        "medicamento_id",
+        ForeignKey("medicamentos.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    model_name: Mapped[str] = mapped_column("modelo", String(200))
+    model_version: Mapped[str] = mapped_column("version_modelo", String(40))  # mtime+tamaño del .pkl
+    data_version: Mapped[int] = mapped_column("version_datos", BigInteger, default=0)
+    horizon: Mapped[int] = mapped_column("horizonte", Integer)
+
+    # arreglos paralelos (una fila por medicamento en vez de una por fecha)
+    dates: Mapped[list[date]] = mapped_column("fechas", ARRAY(Date))
+    mean: Mapped[list[float]] = mapped_column("media", ARRAY(Float))
+    bands: Mapped[dict | None] = mapped_column("bandas", JSON)  # {"80": [inferior, superior], "95": [...]}
+
+    computed_at: Mapped[datetime] = mapped_column("calculado_en", DateTime, default=datetime.utcnow)
+    compute_ms: Mapped[float | None] = mapped_column("calculo_ms", Float)
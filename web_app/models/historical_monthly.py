@@ -0,0 +1,33 @@
+"""
+Resumen mensual (freq="MS") de historicos por medicamento.
+Se mantiene de forma incremental desde la ingesta: solo se recalculan los
+pares (medicamento, mes) afectados por cada carga.
+"""
+
+from datetime import date, datetime
+from sqlalchemy import Date, DateTime, Float, ForeignKey, Integer
+from sqlalchemy.orm import Mapped, mapped_column
+from ..db import Base
+
+class HistoricalMonthly(Base):
+    __tablename__ = "historicos_mensuales"
+
+    # PK compuesta (medicamento_id, mes): leer la serie completa es un range scan del índice
+    medicine_id: Mapped[int] = mapped_column(
+        "medicamento_id",
+        ForeignKey("medicamentos.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    month: Mapped[date] = mapped_column("mes", Date, primary_key=True)  # primer día del mes
+
+    outflow_qty: Mapped[float] = mapped_column("salidas_cantidad", Float, nullable=False, default=0.0)
+    inflow_qty: Mapped[float | None] = mapped_column("ingresos_cantidad", Float, nullable=True)
+    outflow_value_bs: Mapped[float | None] = mapped_column("salidas_valor_bs", Float, nullable=True)
+
+    # Saldos de cierre: valor de la última fecha del mes con dato
+    closing_balance_qty: Mapped[float | None] = mapped_column("saldo_cierre_cantidad", Float, nullable=True)
+    closing_balance_value_bs: Mapped[float | None] = mapped_column("saldo_cierre_valor_bs", Float, nullable=True)
+
+    n_rows: Mapped[int] = mapped_column("n_registros", Integer, nullable=False, default=0)
+    last_date: Mapped[date | None] = mapped_column("ultima_fecha", Date, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column("actualizado_en", DateTime, default=datetime.utcnow)
@@ -2,7 +2,8 @@
 Tabla donde se guardan predicciones generadas por el microservicio.
 """
 
-from sqlalchemy import String, Date, Float, JSON, ForeignKey
+from datetime import datetime
+from sqlalchemy import String, Date, DateTime, Float, Integer, JSON, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column
 from ..db import Base
 
@@ -10,9 +11,17 @@ class Prediction(Base):
     __tablename__ = "predicciones"
 
     id: Mapped[int] = mapped_column("id", primary_key=True)
-    medicine_id: Mapped[int] = mapped_column("medicamento_id", ForeignKey("medicamentos.id"), index=True)
-    horizon_date: Mapped[Date] = mapped_column("fecha_objetivo", Date, index=True)
-    predicted_qty: Mapped[float] = mapped_column("cantidad_prevista", Float)
-    model_name: Mapped[str] = mapped_column("modelo", String(200))  # nombre exacto del .pkl
-    params: Mapped[dict | None] = mapped_column("parametros", JSON)
-    created_by: Mapped[int | None] = mapped_column("creado_por", ForeignKey("usuarios.id"))
+    medicine_id: Mapped[int] = mapped_column("medicamento_id", ForeignKey("medicamentos.id"), nullable=False, index=True)
+    horizon_date: Mapped[Date] = mapped_column("fecha_objetivo", Date, nullable=False, index=True)
+    predicted_qty: Mapped[float] = mapped_column("cantidad_prevista", Float, nullable=False)
+    model_name: Mapped[str] = mapped_column("modelo", String(200), nullable=False)  # nombre exacto del .pkl
+    params: Mapped[dict | None] = mapped_column("parametros", JSON, nullable=True)
+    created_by: Mapped[int | None] = mapped_column("creado_por", ForeignKey("usuarios.id"), nullable=True)
+    created_at: Mapped[datetime | None] = mapped_column("creado_en", DateTime, nullable=True, default=datetime.utcnow)
+    # horizonte: paso 1..periods dentro del pronóstico que generó la fila (nulo en filas viejas)
+    step: Mapped[int | None] = mapped_column("paso", Integer, nullable=True)
+
+    __table_args__ = (
+        # pronóstico vs real: rango de fechas objetivo por medicamento
+        Index("ix_predicciones_medicamento_fecha", "medicamento_id", "fecha_objetivo"),
+    )
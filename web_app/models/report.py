@@ -1,16 +1,38 @@
 """
 Metadatos de reportes exportados (por ejemplo, ruta del XLSX generado).
+Los reportes cacheados guardan además su clave (tipo + filtros + versión de datos),
+el estado del trabajo que los genera y datos para desalojo (tamaño, último acceso).
+Un solo reporte activo (pending/running/done) por clave de caché, también entre procesos:
+lo garantiza el índice único parcial uq_reportes_clave_activa.
 """
 
-from sqlalchemy import String, DateTime
+from sqlalchemy import String, DateTime, BigInteger, JSON, Index, text
 from sqlalchemy.orm import Mapped, mapped_column
 from datetime import datetime
 from ..db import Base
 
 class Report(Base):
     __tablename__ = "reportes"
+    __table_args__ = (
+        Index("uq_reportes_clave_activa", "clave_cache", unique=True,
+              postgresql_where=text("estado IN ('pending', 'running', 'done')")),
+    )
 
     id: Mapped[int] = mapped_column("id", primary_key=True)
     title: Mapped[str] = mapped_column("titulo", String(200))
     file_path: Mapped[str] = mapped_column("ruta_archivo", String(255))
     created_at: Mapped[datetime] = mapped_column("creado_en", DateTime, default=datetime.utcnow)
+
+    # Caché de reportes (None en exportaciones directas)
+    report_type: Mapped[str | None] = mapped_column("tipo", String(40), nullable=True)
+    params: Mapped[dict | None] = mapped_column("parametros", JSON, nullable=True)
+    filters_hash: Mapped[str | None] = mapped_column("clave_filtros", String(64), index=True, nullable=True)
+    cache_key: Mapped[str | None] = mapped_column("clave_cache", String(64), index=True, nullable=True)
+    data_version: Mapped[str | None] = mapped_column("version_datos", String(40), nullable=True)
+    status: Mapped[str] = mapped_column("estado", String(20), default="done")  # pending|running|done|error|evicted
+    error: Mapped[str | None] = mapped_column("error", String(500), nullable=True)
+    size_bytes: Mapped[int | None] = mapped_column("tamano_bytes", BigInteger, nullable=True)
+    completed_at: Mapped[datetime | None] = mapped_column("completado_en", DateTime, nullable=True)
+    last_access: Mapped[datetime | None] = mapped_column("ultimo_acceso", DateTime, nullable=True)
+    # lo renueva el proceso que tiene el trabajo encolado o en curso (ver report_cache)
+    heartbeat_at: Mapped[datetime | None] = mapped_column("latido_en", DateTime, nullable=True)
@@ -4,7 +4,7 @@ Tabla de usuarios con roles. Se usa para autenticación y autorización.
 - User: modelo/tabla users.
 """
 
-from sqlalchemy import String, Boolean, Enum as SAEnum
+from sqlalchemy import String, Boolean, Integer, Enum as SAEnum
 from sqlalchemy.orm import Mapped, mapped_column
 import enum
 from ..db import Base
@@ -24,4 +24,6 @@ class User(Base):
     full_name: Mapped[str | None] = mapped_column("nombre_completo", String(120))
     role: Mapped[Role] = mapped_column("rol", SAEnum(Role), default=Role.OPERATOR)
     is_active: Mapped[bool] = mapped_column("activo", Boolean, default=True)
+    # sube al cambiar rol o estado: revoca los tokens emitidos antes (claim "ver")
+    token_version: Mapped[int | None] = mapped_column("version_token", Integer, default=0, nullable=True)
 
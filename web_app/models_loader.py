@@ -1,6 +1,8 @@
+import time
 from pathlib import Path
 from typing import Dict, Optional, Tuple
-import joblib
+
+from .metrics import registry_load_seconds
 
 """
 class ModelRegistry:
@@ -45,23 +47,37 @@ class ModelRegistry:
     def __init__(self, modelos_dir: Path):
         self.dir = modelos_dir
         self._models: Dict[str, object] = {}
+        self._versions: Dict[str, str] = {}  # clave -> mtime/tamaño del .pkl (cambia al re-entrenar)
+        self.ready = False  # True cuando terminó la primera carga (ver /ready)
 
     def load_all(self) -> int:
-        self._models.clear()
+        import joblib  # import diferido: arrastra numpy/statsmodels al deserializar
+
+        t0 = time.perf_counter()
         self.dir.mkdir(parents=True, exist_ok=True)
-        count = 0
+        models: Dict[str, object] = {}
+        versions: Dict[str, str] = {}
         for p in self.dir.glob("*.pkl"):
             try:
+                st = p.stat()
                 m = joblib.load(p)
                 if any(hasattr(m, fn) for fn in ("get_forecast", "forecast", "predict")):
-                    self._models[p.stem] = m
-                    count += 1
+                    models[p.stem] = m
+                    versions[p.stem] = f"{st.st_mtime_ns:x}-{st.st_size:x}"
             except Exception as e:
                 print(f"[WARN] {p.name} no se cargó: {e}")
-        return count
+        # reemplazo atómico: las predicciones en curso siguen viendo el dict anterior
+        self._models, self._versions = models, versions
+        self.ready = True
+        registry_load_seconds.observe(time.perf_counter() - t0)
+        return len(models)
 
     def keys(self): return sorted(self._models.keys())
 
+    def get(self, key: str) -> Optional[object]: return self._models.get(key)
+
+    def version(self, key: str) -> Optional[str]: return self._versions.get(key)
+
     def get_by_attrs(self, name: str, concentration: str | int, dosage_form: str, unit_measure: str) -> Optional[Tuple[str, object]]:
         key = build_model_basename(name, concentration, dosage_form, unit_measure)
         m = self._models.get(key)
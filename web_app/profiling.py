@@ -0,0 +1,235 @@
+"""
+Perfilado de un request puntual (solo ADMIN) y log de consultas lentas.
+- Se activa con el header `X-Profile: 1` o `?profile=1` y un JWT con rol ADMIN.
+- Mientras dura el request, un hilo muestrea las pilas (sys._current_frames) cada
+  PROFILE_SAMPLE_INTERVAL_MS; se guardan en formato "folded" (apto para flamegraph).
+  Solo cuentan hilos con frames de web_app: con tráfico concurrente pueden
+  colarse muestras de otro request (perfilar en un worker poco cargado).
+- Los eventos de SQLAlchemy (before/after_cursor_execute; handle_error descarta el
+  inicio de una consulta que falló) cuentan consultas, tiempo
+  total de SQL y sentencias repetidas del request (un N+1 aparece como una sentencia
+  con muchas repeticiones). El perfil activo viaja en un ContextVar, que sigue al
+  request también en el threadpool y en AsyncSession.run_sync.
+- Consultas sobre SLOW_QUERY_MS se registran siempre, haya perfil o no.
+"""
+
+from __future__ import annotations
+
+import itertools
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event
+
+from .config import settings
+
+_PKG = str(Path(__file__).resolve().parent)
+_current: ContextVar["RequestProfile | None"] = ContextVar("request_profile", default=None)
+_ids = itertools.count(1)
+
+profiles: "deque[RequestProfile]" = deque(maxlen=settings.PROFILE_KEEP)
+slow_queries: deque = deque(maxlen=200)
+
+
+def _norm_sql(statement: str) -> str:
+    return " ".join(statement.split())
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str):
+        self.id = next(_ids)
+        self.method, self.path = method, path
+        self.started = datetime.utcnow()
+        self.seconds = 0.0
+        self.status: int | None = None
+        self.samples: Counter = Counter()
+        self.n_samples = 0
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.statements: dict[str, list] = {}  # sql -> [veces, segundos]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # --- SQL ---
+    def add_query(self, statement: str, dt: float) -> None:
+        key = _norm_sql(statement)
+        with self._lock:
+            self.queries += 1
+            self.sql_seconds += dt
+            s = self.statements.setdefault(key, [0, 0.0])
+            s[0] += 1
+            s[1] += dt
+
+    # --- muestreo ---
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._sample_loop, name=f"profile-{self.id}", daemon=True)
+        self._thread.start()
+
+    def stop(self, status: int | None, seconds: float) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.status, self.seconds = status, seconds
+        profiles.append(self)
+
+    def _sample_loop(self) -> None:
+        me = threading.get_ident()
+        interval = settings.PROFILE_SAMPLE_INTERVAL_MS / 1000
+        while not self._stop.wait(interval):
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = []
+                ours = False
+                f = frame
+                while f is not None:
+                    code = f.f_code
+                    if code.co_filename.startswith(_PKG) and not code.co_filename.endswith("profiling.py"):
+                        ours = True
+                    stack.append(f"{Path(code.co_filename).name}:{code.co_name}")
+                    f = f.f_back
+                if ours:
+                    self.samples[";".join(reversed(stack))] += 1
+                    self.n_samples += 1
+
+    # --- salida ---
+    def summary(self) -> dict:
+        return {
+            "id": self.id, "method": self.method, "path": self.path, "status": self.status,
+            "started": self.started.isoformat(), "ms": round(self.seconds * 1000, 1),
+            "queries": self.queries, "sql_ms": round(self.sql_seconds * 1000, 1), "samples": self.n_samples,
+        }
+
+    def report(self, top: int = 50) -> dict:
+        repeated = sorted(((sql, n, t) for sql, (n, t) in self.statements.items() if n > 1),
+                          key=lambda x: -x[1])
+        # funciones más vistas en la cima de la pila (tiempo propio)
+        leaf = Counter()
+        for stack, n in self.samples.items():
+            leaf[stack.rsplit(";", 1)[-1]] += n
+        return {
+            **self.summary(),
+            "sample_interval_ms": settings.PROFILE_SAMPLE_INTERVAL_MS,
+            "top_functions": [{"frame": f, "samples": n} for f, n in leaf.most_common(top)],
+            "folded": [f"{s} {n}" for s, n in self.samples.most_common()],
+            "repeated_statements": [{"sql": s[:500], "count": n, "ms": round(t * 1000, 1)} for s, n, t in repeated[:top]],
+            "statements": len(self.statements),
+        }
+
+
+def get_profile(profile_id: int) -> RequestProfile | None:
+    return next((p for p in profiles if p.id == profile_id), None)
+
+
+# ---------------------------
+# Hooks de SQLAlchemy
+# ---------------------------
+def _before(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_t0", []).append((statement, time.perf_counter()))
+
+
+def _after(conn, cursor, statement, parameters, context, executemany):
+    t0s = conn.info.get("query_t0")
+    if not t0s:
+        return
+    dt = time.perf_counter() - t0s.pop()[1]
+    prof = _current.get()
+    if prof is not None:
+        prof.add_query(statement, dt)
+    if dt * 1000 >= settings.SLOW_QUERY_MS:
+        sql = _norm_sql(statement)[:500]
+        slow_queries.append({"at": datetime.utcnow().isoformat(), "ms": round(dt * 1000, 1), "sql": sql,
+                             "profile_id": prof.id if prof is not None else None})
+        print(f"[WARN] consulta lenta ({dt * 1000:.0f} ms): {sql[:200]}")
+
+
+def _error(ctx):
+    # la consulta que falló no llega a after_cursor_execute: sin esto su inicio queda en la
+    # pila de la conexión (del pool) y las siguientes se miden contra el inicio equivocado
+    conn = ctx.connection
+    t0s = conn.info.get("query_t0") if conn is not None else None
+    if t0s and t0s[-1][0] == ctx.statement:
+        t0s.pop()
+
+
+def install_sql_hooks(engine) -> None:
+    """engine sync (para el async: async_engine.sync_engine)."""
+    event.listen(engine, "before_cursor_execute", _before)
+    event.listen(engine, "after_cursor_execute", _after)
+    event.listen(engine, "handle_error", _error)
+
+
+# ---------------------------
+# Middleware
+# ---------------------------
+def _wants_profile(scope) -> bool:
+    headers = dict(scope.get("headers") or ())
+    if headers.get(b"x-profile", b"").lower() in (b"1", b"true"):
+        return True
+    qs = scope.get("query_string", b"")
+    return b"profile=1" in qs.split(b"&") or b"profile=true" in qs.split(b"&")
+
+
+async def _is_admin(scope) -> bool:
+    from .db import AsyncSessionLocal
+    from .models.user import Role
+    from .security import decode_token
+    from .services.auth_service import get_user_by_email_async
+    from .services.user_cache import AuthUser, token_version, user_cache
+
+    auth = dict(scope.get("headers") or ()).get(b"authorization", b"").decode()
+    if not auth.lower().startswith("bearer "):
+        return False
+    payload = decode_token(auth[7:].strip())
+    if not payload or "sub" not in payload:
+        return False
+    # rol y estado vigentes, igual que require_roles: caché de usuarios o BD (nunca el claim del JWT,
+    # que puede ser de un admin ya degradado o desactivado)
+    sub, ver = payload["sub"], token_version(payload)
+    u = user_cache.get(sub, ver)
+    if u is None:
+        gen = user_cache.generation(sub)
+        async with AsyncSessionLocal() as db:
+            row = await get_user_by_email_async(db, sub)
+        if row is None:
+            return False
+        u = user_cache.put(AuthUser.from_model(row), gen)
+    return u.accepts(ver) and u.role == Role.ADMIN
+
+
+class ProfilingMiddleware:
+    """Perfila el request si lo pide un ADMIN; devuelve el id en el header X-Profile-Id."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope) or not await _is_admin(scope):
+            return await self.app(scope, receive, send)
+
+        prof = RequestProfile(scope["method"], scope["path"])
+        status = [None]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-profile-id", str(prof.id).encode())]
+            await send(message)
+
+        token = _current.set(prof)
+        prof.start()
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # stop() espera al hilo de muestreo: fuera del event loop
+            await run_in_threadpool(prof.stop, status[0], time.perf_counter() - t0)
+            _current.reset(token)
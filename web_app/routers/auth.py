@@ -3,57 +3,120 @@ Módulo 1: Autenticación.
 - /auth/token  (form-data: username/password)  -> devuelve JWT para Swagger Authorize
 - /auth/login: devuelve JWT si las credenciales son correctas.
 - /auth/register: crea un usuario (solo ADMIN/SUPERUSER).
+- /auth/users/{id}: cambia rol/estado de un usuario (solo ADMIN/SUPERUSER).
 """
 
 # web_app/routers/auth.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from ..db import get_db
-from ..schemas import LoginIn, Token, UserCreate, UserOut
-from ..services.auth_service import authenticate, create_user
+from ..db import get_db, get_async_db
+from ..schemas import LoginIn, Token, UserCreate, UserOut, UserUpdate
+from ..config import settings
+from ..services.auth_service import authenticate_async, get_user_by_email_async, create_user, update_user
+from ..services.user_cache import AuthUser, token_version, user_cache
 from ..models.user import Role, User
 import web_app.security as security
+from ..utils.throttle import SlidingWindowLimiter
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
 # ¡OJO! Debe ser /auth/token
 oauth2 = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
-def current_user(token: str = Depends(oauth2), db: Session = Depends(get_db)) -> User:
+# throttling de login: fallos por IP y por cuenta (los logins correctos no cuentan:
+# detrás de un NAT un cambio de turno son muchos logins legítimos desde una IP)
+_trusted_proxies = {p.strip() for p in settings.LOGIN_TRUSTED_PROXIES.split(",") if p.strip()}
+ip_limiter = SlidingWindowLimiter(settings.LOGIN_MAX_PER_IP, settings.LOGIN_WINDOW_SECONDS)
+account_limiter = SlidingWindowLimiter(settings.LOGIN_MAX_FAILS_PER_ACCOUNT, settings.LOGIN_WINDOW_SECONDS)
+
+async def current_user(token: str = Depends(oauth2), db: AsyncSession = Depends(get_async_db)) -> AuthUser:
     payload = security.decode_token(token)
     if not payload or "sub" not in payload:
         raise HTTPException(status_code=401, detail="Token inválido")
-    u = db.query(User).filter(User.email == payload["sub"]).first()
-    if not u:
-        raise HTTPException(status_code=401, detail="Usuario no encontrado")
+    sub, ver = payload["sub"], token_version(payload)
+    # caso común: sin tocar la BD (la sesión async no toma conexión hasta la primera consulta)
+    u = user_cache.get(sub, ver)
+    if u is None:
+        gen = user_cache.generation(sub)
+        row = await get_user_by_email_async(db, sub)
+        if not row:
+            raise HTTPException(status_code=401, detail="Usuario no encontrado")
+        u = user_cache.put(AuthUser.from_model(row), gen)
+    if not u.is_active:
+        raise HTTPException(status_code=401, detail="Usuario inactivo")
+    if not u.accepts(ver):
+        raise HTTPException(status_code=401, detail="Token revocado")
     return u
 
 def require_roles(*roles: Role):
-    def inner(u: User = Depends(current_user)):
+    async def inner(u: AuthUser = Depends(current_user)):  # async: sin salto al threadpool
         if u.role not in roles:
             raise HTTPException(status_code=403, detail="Permisos insuficientes")
         return u
     return inner
 
-@router.post("/token", response_model=Token)
-def token(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    result = authenticate(db, form.username, form.password)  # username = email
+def client_ip(request: Request) -> str:
+    """IP del cliente; si el par es un proxy confiable, la primera IP no confiable de X-Forwarded-For."""
+    ip = request.client.host if request.client else "?"
+    if ip in _trusted_proxies:
+        hops = [h.strip() for h in request.headers.get("x-forwarded-for", "").split(",") if h.strip()]
+        for hop in reversed(hops):
+            if hop not in _trusted_proxies:
+                return hop
+    return ip
+
+def _hash_busy() -> HTTPException:
+    return HTTPException(status_code=503, detail="Servicio de login saturado, reintenta",
+                         headers={"Retry-After": "1"})
+
+async def _login(request: Request, email: str, password: str, db: AsyncSession) -> dict:
+    ip = client_ip(request)
+    account = email.strip().lower()
+    wait = max(ip_limiter.retry_after(ip), account_limiter.retry_after(account))
+    if wait:
+        raise HTTPException(status_code=429, detail="Demasiados intentos de login",
+                            headers={"Retry-After": str(int(wait) + 1)})
+    try:
+        result = await authenticate_async(db, email, password)
+    except security.PasswordQueueFull:
+        raise _hash_busy()
     if not result:
+        ip_limiter.hit(ip)
+        account_limiter.hit(account)
         raise HTTPException(status_code=400, detail="Credenciales inválidas")
+    account_limiter.reset(account)
     tok, _ = result
     return {"access_token": tok}
 
+@router.post("/token", response_model=Token)
+async def token(request: Request, form: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    return await _login(request, form.username, form.password, db)  # username = email
+
 @router.post("/login", response_model=Token)
-def login(payload: LoginIn, db: Session = Depends(get_db)):
-    result = authenticate(db, payload.email, payload.password)
-    if not result:
-        raise HTTPException(status_code=400, detail="Credenciales inválidas")
-    tok, _ = result
-    return {"access_token": tok}
+async def login(request: Request, payload: LoginIn, db: AsyncSession = Depends(get_async_db)):
+    return await _login(request, payload.email, payload.password, db)
+
+@router.get("/stats")
+def login_stats(_: User = Depends(require_roles(Role.ADMIN, Role.SUPERUSER))):
+    return {"password_hash": security.hash_stats.snapshot(),
+            "tracked_keys": {"ip": len(ip_limiter), "account": len(account_limiter)},
+            "throttled_keys": {"ip": ip_limiter.throttled(), "account": account_limiter.throttled()}}
 
 @router.post("/register", response_model=UserOut)
 def register(payload: UserCreate, db: Session = Depends(get_db),
              _: User = Depends(require_roles(Role.ADMIN, Role.SUPERUSER))):
-    return create_user(db, payload.email, payload.password, payload.role, payload.full_name)
+    try:
+        return create_user(db, payload.email, payload.password, payload.role, payload.full_name)
+    except security.PasswordQueueFull:  # el hash comparte el pool acotado con el login
+        raise _hash_busy()
+
+@router.patch("/users/{user_id}", response_model=UserOut)
+def update(user_id: int, payload: UserUpdate, db: Session = Depends(get_db),
+           _: User = Depends(require_roles(Role.ADMIN, Role.SUPERUSER))):
+    u = update_user(db, user_id, payload.role, payload.is_active, payload.full_name)
+    if not u:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    return u
@@ -2,33 +2,67 @@
 Módulo 4: Microservicio predictivo.
 - Lista modelos .pkl cargados desde /modelos
 - Genera predicciones y las guarda en la tabla predictions
+- Con periods <= FORECAST_HORIZON sirve el pronóstico precalculado (si está al día)
+- /predict/models/reload: recarga los .pkl (re-entrenamiento) y recalcula lo que cambió
+- /predict/stockout: probabilidad de quiebre de stock por mes (Monte Carlo), uno o todo el catálogo
+- /predict/planning: cobertura, punto de pedido y pedido sugerido de todo el catálogo (una tabla)
+- /predict/hierarchy: pronóstico medicamento -> forma farmacéutica -> total, reconciliado
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import Response
 from sqlalchemy.orm import Session
 from pathlib import Path
-import pandas as pd
 
 from ..db import get_db
 from .auth import require_roles
 from ..models.user import Role, User
 from ..schemas import PredictByAttrs, PredictResponse, ForecastPoint
 from ..models_loader import ModelRegistry, build_model_basename
+from ..config import settings
 from ..services.prediction_service import ensure_medicine, predict_and_persist
+from ..services.forecast_store import forecast_scheduler, get_stored, store_stats
+from ..services import stockout_service, planning_service, hierarchy_service
+from ..models.medicine import Medicine
+from ..schema_setup import drop_partitions_before
+from ..utils.encoders import columns_response, dumps, negotiate
 
 router = APIRouter(prefix="/predict", tags=["Predict"])
 
-MODELOS_DIR = Path(__file__).resolve().parents[1].parent / "modelos"
-registry = ModelRegistry(MODELOS_DIR); registry.load_all()
+MODELOS_DIR = Path(settings.MODELOS_DIR)
+# la carga de .pkl se hace en segundo plano desde el lifespan de main.py
+registry = ModelRegistry(MODELOS_DIR)
 
 @router.get("/models")
 def list_models():
-    return {"loaded": registry.keys()}
+    return {"ready": registry.ready, "loaded": registry.keys()}
+
+@router.post("/models/reload")
+def reload_models(_: User = Depends(require_roles(Role.ADMIN, Role.SUPERUSER))):
+    n = registry.load_all()
+    forecast_scheduler.request(None)  # solo se recalculan los modelos cuya versión cambió
+    return {"loaded": n}
+
+@router.get("/store")
+def forecast_store_status(db: Session = Depends(get_db),
+                          _: User = Depends(require_roles(Role.ADMIN, Role.SUPERUSER))):
+    return {**store_stats(db), "last_run": forecast_scheduler.last_run}
+
+@router.post("/store/refresh", status_code=202)
+def refresh_store(force: bool = False,
+                  _: User = Depends(require_roles(Role.ADMIN, Role.SUPERUSER))):
+    # encola el catálogo completo en el scheduler; el avance se ve en GET /predict/store (last_run)
+    if not forecast_scheduler.request(None, force=force):
+        raise HTTPException(status_code=503, detail="Scheduler de pronósticos no disponible (desactivado o iniciando)")
+    return {"queued": True, "force": force}
 
 @router.post("", response_model=PredictResponse)
 def predict(req: PredictByAttrs,
             db: Session = Depends(get_db),
             user: User = Depends(require_roles(Role.ADMIN, Role.SUPERUSER, Role.OPERATOR))):
+    if not registry.ready:
+        raise HTTPException(status_code=503, detail="Modelos cargando, reintenta en unos segundos",
+                            headers={"Retry-After": "2"})
     key = build_model_basename(req.name, req.concentration, req.dosage_form, req.unit_measure)
     got = registry.get_by_attrs(req.name, req.concentration, req.dosage_form, req.unit_measure)
     if not got:
@@ -37,6 +71,83 @@ def predict(req: PredictByAttrs,
 
     med = ensure_medicine(db, req.name, req.concentration, req.dosage_form, req.unit_measure)
 
-    result = predict_and_persist(db, model_key, model, med, req.periods, user.id)
-    points = [ForecastPoint(date=pd.to_datetime(d).date(), yhat=float(y)) for d, y in result]
+    precomputed = None
+    if req.periods <= settings.FORECAST_HORIZON:
+        stored = get_stored(db, med.id, registry.version(model_key))
+        # FORECAST_HORIZON pudo subir después del último cálculo: si no alcanza, en vivo
+        if stored is not None and stored.horizon >= req.periods:
+            precomputed = (stored.dates[:req.periods], stored.mean[:req.periods])
+
+    result = predict_and_persist(db, model_key, model, med, req.periods, user.id, precomputed)
+    points = [ForecastPoint(date=d, yhat=float(y)) for d, y in result]
     return {"modelo": model_key + ".pkl", "points": points}
+
+@router.delete("/partitions")
+def drop_old_predictions(before_year: int,
+                         db: Session = Depends(get_db),
+                         _: User = Depends(require_roles(Role.ADMIN, Role.SUPERUSER))):
+    # solo aplica con DB_PARTITIONING: borra años completos de predicciones con DROP de partición
+    return {"dropped": drop_partitions_before(db, "predicciones", before_year)}
+
+_MED_COLS = (Medicine.id, Medicine.name, Medicine.concentration, Medicine.dosage_form, Medicine.unit_measure)
+
+@router.get("/stockout")
+def stockout(name: str, concentration: str, dosage_form: str, unit_measure: str,
+             horizon: int | None = Query(None, ge=1, le=36),
+             paths: int | None = Query(None, ge=100, le=100_000),
+             seed: int | None = None,
+             db: Session = Depends(get_db),
+             _: User = Depends(require_roles(Role.ADMIN, Role.SUPERUSER, Role.OPERATOR, Role.CONSULTANT))):
+    if not registry.ready:
+        raise HTTPException(status_code=503, detail="Modelos cargando, reintenta en unos segundos",
+                            headers={"Retry-After": "2"})
+    meds = db.query(*_MED_COLS).filter(
+        Medicine.name == name, Medicine.concentration == concentration,
+        Medicine.dosage_form == dosage_form, Medicine.unit_measure == unit_measure).all()
+    out = stockout_service.simulate(db, registry, meds, horizon, paths, seed)
+    if not out["results"]:
+        detail = out["skipped"][0]["reason"] if out["skipped"] else "Medicamento o modelo no encontrado"
+        raise HTTPException(status_code=404, detail=detail)
+    return Response(dumps(out), media_type="application/json")
+
+@router.get("/stockout/catalog")
+def stockout_catalog(horizon: int | None = Query(None, ge=1, le=36),
+                     paths: int | None = Query(None, ge=100, le=100_000),
+                     min_p: float = Query(0.0, ge=0, le=1, description="solo medicamentos con algún mes >= min_p"),
+                     seed: int | None = None,
+                     db: Session = Depends(get_db),
+                     _: User = Depends(require_roles(Role.ADMIN, Role.SUPERUSER, Role.OPERATOR, Role.CONSULTANT))):
+    if not registry.ready:
+        raise HTTPException(status_code=503, detail="Modelos cargando, reintenta en unos segundos",
+                            headers={"Retry-After": "2"})
+    out = stockout_service.simulate(db, registry, db.query(*_MED_COLS).all(), horizon, paths, seed)
+    if min_p > 0:
+        out["results"] = [r for r in out["results"] if max(m["p_stockout"] for m in r["months"]) >= min_p]
+    out["results"].sort(key=lambda r: -max(m["p_stockout"] for m in r["months"]))
+    return Response(dumps(out), media_type="application/json")
+
+@router.get("/planning")
+def planning(lead_time: int = Query(1, ge=0, le=24, description="meses hasta recibir un pedido"),
+             review: int = Query(1, ge=1, le=24, description="meses entre revisiones"),
+             service_level: float = Query(0.95, gt=0.5, lt=1),
+             only_orders: bool = False,
+             format: str | None = None, accept: str | None = Header(None),
+             db: Session = Depends(get_db),
+             _: User = Depends(require_roles(Role.ADMIN, Role.SUPERUSER, Role.OPERATOR, Role.CONSULTANT))):
+    fmt = negotiate(accept, format)
+    out = planning_service.plan(db, registry, lead_time, review, service_level, only_orders)
+    return columns_response(out["columns"], fmt, out["meta"])
+
+@router.get("/hierarchy")
+def hierarchy(horizon: int | None = Query(None, ge=1, le=36),
+              method: str = Query("wls", description="wls | ols | bottom_up"),
+              medicines: bool = Query(True, description="incluir el detalle por medicamento"),
+              db: Session = Depends(get_db),
+              _: User = Depends(require_roles(Role.ADMIN, Role.SUPERUSER, Role.OPERATOR, Role.CONSULTANT))):
+    if method not in hierarchy_service.METHODS:
+        raise HTTPException(status_code=400, detail=f"method debe ser uno de {', '.join(hierarchy_service.METHODS)}")
+    if not registry.ready:
+        raise HTTPException(status_code=503, detail="Modelos cargando, reintenta en unos segundos",
+                            headers={"Retry-After": "2"})
+    out = hierarchy_service.hierarchy(db, registry, horizon, method, medicines)
+    return Response(dumps(out), media_type="application/json")
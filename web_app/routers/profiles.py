@@ -0,0 +1,29 @@
+"""
+Perfiles de requests (solo ADMIN).
+- /admin/profiles: últimos perfiles capturados (con X-Profile: 1 o ?profile=1).
+- /admin/profiles/{id}: pilas muestreadas (folded), funciones más vistas y sentencias SQL repetidas.
+- /admin/profiles/slow-queries: últimas consultas sobre SLOW_QUERY_MS.
+"""
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from .auth import require_roles
+from ..models.user import Role
+from .. import profiling
+
+router = APIRouter(prefix="/admin/profiles", tags=["Admin"])
+
+@router.get("")
+def list_profiles(_: any = Depends(require_roles(Role.ADMIN))):
+    return [p.summary() for p in reversed(profiling.profiles)]
+
+@router.get("/slow-queries")
+def slow_queries(_: any = Depends(require_roles(Role.ADMIN))):
+    return list(reversed(profiling.slow_queries))
+
+@router.get("/{profile_id}")
+def get_profile(profile_id: int, top: int = 50, _: any = Depends(require_roles(Role.ADMIN))):
+    p = profiling.get_profile(profile_id)
+    if p is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado (o ya descartado)")
+    return p.report(top)
@@ -0,0 +1,108 @@
+"""
+Módulo 5: Reportes.
+- /reports/export: exporta históricos y pronósticos y lo registra (CSV en streaming; XLSX se
+  escribe primero a disco y luego se envía).
+- /reports: lista los reportes generados.
+- /reports/{id}/download: descarga un reporte ya generado.
+- /reports/cached: reporte por (tipo, filtros, versión de datos); hit inmediato o trabajo en segundo plano.
+- /reports/jobs/{id}: estado de un trabajo de generación.
+- /reports/parquet: exporta incrementalmente a Parquet para analítica (fuera de la BD).
+"""
+
+from datetime import datetime
+from pathlib import Path
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from sqlalchemy.orm import Session
+
+from ..db import get_db
+from .auth import require_roles
+from ..models.user import Role
+from ..models.report import Report
+from ..schemas import ReportExportQuery, CachedReportQuery
+from ..services import report_service as rs
+from ..services import report_cache as rc
+from ..services import archive_service
+from ..utils.export_utils import close_quietly, iter_file
+
+router = APIRouter(prefix="/reports", tags=["Reports"])
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+def _attachment(path: Path) -> dict:
+    return {"Content-Disposition": f'attachment; filename="{path.name}"'}
+
+def _job(r: Report, cached: bool | None = None) -> dict:
+    out = {"job_id": r.id, "report_id": r.id, "status": r.status or "done", "type": r.report_type,
+           "data_version": r.data_version, "size_bytes": r.size_bytes, "error": r.error}
+    if cached is not None:
+        out["cached"] = cached
+    if out["status"] == "done":
+        out["download"] = f"/reports/{r.id}/download"
+    return out
+
+@router.post("/export")
+def export(body: ReportExportQuery,
+           _: any = Depends(require_roles(Role.ADMIN, Role.SUPERUSER, Role.OPERATOR, Role.CONSULTANT))):
+    title = body.title or f"Exportación {datetime.utcnow():%Y-%m-%d %H:%M}"
+    args = (title, body.medicine_ids, body.date_from, body.date_to, body.include)
+    if body.format == "xlsx":
+        path, report = rs.export_xlsx(*args)
+        return StreamingResponse(iter_file(path), media_type=MEDIA_TYPES["xlsx"],
+                                 headers={**_attachment(path), "X-Report-Id": str(report.id)})
+    gen, path = rs.export_csv_stream(*args)
+    # cierre al final (también si el cliente cortó): libera cursores y sesiones del export
+    return StreamingResponse(gen, media_type=MEDIA_TYPES["csv"], headers=_attachment(path),
+                             background=BackgroundTask(close_quietly, gen))
+
+@router.post("/cached")
+def cached_report(body: CachedReportQuery, db: Session = Depends(get_db),
+                  _: any = Depends(require_roles(Role.ADMIN, Role.SUPERUSER, Role.OPERATOR, Role.CONSULTANT))):
+    r, hit = rc.request_report(db, body.report_type, body.medicine_ids, body.date_from, body.date_to, body.format)
+    return _job(r, cached=hit)
+
+@router.get("/jobs/{job_id}")
+def job_status(job_id: int, db: Session = Depends(get_db),
+               _: any = Depends(require_roles(Role.ADMIN, Role.SUPERUSER, Role.OPERATOR, Role.CONSULTANT))):
+    r = db.get(Report, job_id)
+    if not r:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return _job(r)
+
+@router.post("/evict")
+def evict(db: Session = Depends(get_db),
+          _: any = Depends(require_roles(Role.ADMIN, Role.SUPERUSER))):
+    return {"evicted": rc.evict_reports(db)}
+
+@router.post("/parquet")
+def export_parquet(full: bool = False, db: Session = Depends(get_db),
+                   _: any = Depends(require_roles(Role.ADMIN, Role.SUPERUSER))):
+    try:
+        return archive_service.export_parquet(db, full=full)
+    except ImportError:
+        raise HTTPException(status_code=501, detail="Exportación Parquet no disponible (falta pyarrow)")
+    except archive_service.ArchiveBusy:
+        raise HTTPException(status_code=409, detail="Ya hay una exportación Parquet en curso")
+
+@router.get("")
+def list_reports(limit: int = 50, db: Session = Depends(get_db),
+                 _: any = Depends(require_roles(Role.ADMIN, Role.SUPERUSER, Role.OPERATOR, Role.CONSULTANT))):
+    rows = db.query(Report).order_by(Report.created_at.desc()).limit(limit).all()
+    return [{"id": r.id, "title": r.title, "file": Path(r.file_path).name, "created_at": r.created_at,
+             "type": r.report_type, "status": r.status or "done"} for r in rows]
+
+@router.get("/{report_id}/download")
+def download(report_id: int, db: Session = Depends(get_db),
+             _: any = Depends(require_roles(Role.ADMIN, Role.SUPERUSER, Role.OPERATOR, Role.CONSULTANT))):
+    r = db.get(Report, report_id)
+    if not r or (r.status or "done") != "done" or not Path(r.file_path).exists():
+        raise HTTPException(status_code=404, detail="Reporte no encontrado o aún no generado")
+    r.last_access = datetime.utcnow(); db.commit()
+    path = Path(r.file_path)
+    return StreamingResponse(iter_file(path), media_type=MEDIA_TYPES.get(path.suffix[1:], "application/octet-stream"),
+                             headers=_attachment(path))
@@ -1,48 +1,185 @@
 """
 Módulo 3: Visualización simple de históricos con paginación básica.
+Router async: usa la sesión async y reutiliza los servicios síncronos con run_sync.
+run_sync corre en el hilo del event loop: ahí solo se leen filas/columnas; la codificación
+(json/columns/arrow/csv) va al threadpool con _encode/_json.
+/visualize/forecast sirve el pronóstico precalculado con bandas; horizontes mayores
+se calculan en vivo en el threadpool (no en el event loop).
+/visualize/search: autocompletado tolerante a acentos, mayúsculas y errores de tipeo.
+/visualize/accuracy: pronóstico vs real (errores por horizonte y métricas) calculado en SQL.
 """
 
-from fastapi import APIRouter, Depends
+from datetime import date
+
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from ..db import get_db
+from ..config import settings
+from ..db import get_async_db
 from .auth import require_roles
 from ..models.user import Role
-from ..models.historical import Historical
-from ..models.medicine import Medicine
 from ..models.prediction import Prediction
+from ..schemas import SeriesBatchQuery
+from ..services.historical_service import get_monthly_series, fetch_series_batch
+from ..services.series_cache import series_cache
+from ..services.version_service import resolve_with_prediction_version, resolve_with_version
+from ..services.forecast_store import LEVELS, get_stored
+from ..services.prediction_service import forecast_with_intervals
+from ..services.search_index import search_index
+from ..services import accuracy_service
+from ..models_loader import build_model_basename
+from .predict import registry
+from ..utils.encoders import negotiate, columns_response, dumps
+from ..utils.http_cache import conditional
 
 router = APIRouter(prefix="/visualize", tags=["Visualize"])
 
+_EMPTY_HIST = {"date": [], "outflow_qty": [], "inflow_qty": [], "total_balance_qty": []}
+_EMPTY_MONTHLY = {"month": [], "outflow_qty": [], "inflow_qty": [], "closing_balance_qty": []}
+_EMPTY_PRED = {"date": [], "yhat": [], "model": []}
+_EMPTY_FC = {"date": [], "yhat": []}
+
+async def _encode(cols: dict, fmt: str, meta: dict | None = None, rows_key: str | None = "items") -> Response:
+    return await run_in_threadpool(columns_response, cols, fmt, meta, rows_key)
+
+async def _json(obj) -> Response:
+    return Response(await run_in_threadpool(dumps, obj), media_type="application/json")
+
 @router.get("/historical")
-def list_historical(name: str, concentration: str, dosage_form: str, unit_measure: str,
-                    date_from: str | None = None, date_to: str | None = None,
-                    limit: int = 200, skip: int = 0,
-                    db: Session = Depends(get_db),
-                    _: any = Depends(require_roles(Role.ADMIN, Role.SUPERUSER, Role.OPERATOR, Role.CONSULTANT))):
-    m = (db.query(Medicine)
-            .filter(Medicine.name==name, Medicine.concentration==concentration,
-                    Medicine.dosage_form==dosage_form, Medicine.unit_measure==unit_measure)
-            .first())
-    if not m: return {"total": 0, "items": []}
-    q = db.query(Historical).filter(Historical.medicine_id==m.id)
-    if date_from: q = q.filter(Historical.date >= date_from)
-    if date_to: q = q.filter(Historical.date <= date_to)
-    total = q.count()
-    rows = q.order_by(Historical.date).offset(skip).limit(limit).all()
-    return {"total": total, "items": [
-        {"date": r.date, "outflow_qty": r.outflow_qty,
-         "inflow_qty": r.inflow_qty, "total_balance_qty": r.total_balance_qty}
-        for r in rows
-    ]}
+async def list_historical(request: Request,
+                          name: str, concentration: str, dosage_form: str, unit_measure: str,
+                          date_from: date | None = None, date_to: date | None = None,
+                          limit: int = 200, skip: int = 0, format: str | None = None,
+                          accept: str | None = Header(None),
+                          db: AsyncSession = Depends(get_async_db),
+                          _: any = Depends(require_roles(Role.ADMIN, Role.SUPERUSER, Role.OPERATOR, Role.CONSULTANT))):
+    fmt = negotiate(accept, format)
+    got = await db.run_sync(resolve_with_version, name, concentration, dosage_form, unit_measure)
+    if not got: return columns_response(_EMPTY_HIST, fmt, {"total": 0})
+    mid, version, updated_at = got
+
+    def page(sdb: Session):
+        # serie completa desde la caché; rango y página se resuelven con búsqueda binaria + slicing
+        s = series_cache.get(sdb, mid, version)
+        lo, hi = s.bounds(date_from, date_to)
+        sl = slice(lo + max(skip, 0), min(hi, lo + max(skip, 0) + max(limit, 0)))
+        return {
+            "date": s.dates[sl], "outflow_qty": s.outflow[sl],
+            "inflow_qty": s.inflow[sl], "total_balance_qty": s.balance[sl],
+        }, hi - lo
+
+    async def build():
+        cols, total = await db.run_sync(page)
+        return await _encode(cols, fmt, {"total": total})
+
+    return await conditional(request, fmt, mid, version, updated_at, build)
+
+@router.post("/historical/batch")
+async def batch_historical(body: SeriesBatchQuery,
+                           db: AsyncSession = Depends(get_async_db),
+                           _: any = Depends(require_roles(Role.ADMIN, Role.SUPERUSER, Role.OPERATOR, Role.CONSULTANT))):
+    if not body.ids and not body.medicines:
+        raise HTTPException(status_code=400, detail="Indica 'ids' o 'medicines'")
+    refs = [(r.name, str(r.concentration), r.dosage_form, r.unit_measure) for r in body.medicines]
+    out = await db.run_sync(fetch_series_batch, body.ids, refs, body.date_from, body.date_to, body.bucket)
+    return await _json(out)
+
+@router.get("/monthly")
+async def list_monthly(request: Request,
+                       name: str, concentration: str, dosage_form: str, unit_measure: str,
+                       date_from: date | None = None, date_to: date | None = None,
+                       format: str | None = None, accept: str | None = Header(None),
+                       db: AsyncSession = Depends(get_async_db),
+                       _: any = Depends(require_roles(Role.ADMIN, Role.SUPERUSER, Role.OPERATOR, Role.CONSULTANT))):
+    fmt = negotiate(accept, format)
+    got = await db.run_sync(resolve_with_version, name, concentration, dosage_form, unit_measure)
+    if not got: return columns_response(_EMPTY_MONTHLY, fmt, rows_key=None)
+    mid, version, updated_at = got
+
+    async def build():
+        rows = await db.run_sync(get_monthly_series, mid, date_from, date_to)
+        return await _encode({
+            "month": [r.month for r in rows],
+            "outflow_qty": [r.outflow_qty for r in rows],
+            "inflow_qty": [r.inflow_qty for r in rows],
+            "closing_balance_qty": [r.closing_balance_qty for r in rows],
+        }, fmt, rows_key=None)
+
+    return await conditional(request, fmt, mid, version, updated_at, build)
 
 @router.get("/predictions")
-def list_predictions(name: str, concentration: str, dosage_form: str, unit_measure: str,
-                     db: Session = Depends(get_db),
-                     _: any = Depends(require_roles(Role.ADMIN, Role.SUPERUSER, Role.OPERATOR, Role.CONSULTANT))):
-    m = (db.query(Medicine)
-            .filter(Medicine.name==name, Medicine.concentration==concentration,
-                    Medicine.dosage_form==dosage_form, Medicine.unit_measure==unit_measure)
-            .first())
-    if not m: return []
-    rows = db.query(Prediction).filter(Prediction.medicine_id==m.id).order_by(Prediction.horizon_date).all()
-    return [{"date": r.horizon_date, "yhat": r.predicted_qty, "model": r.model_name} for r in rows]
+async def list_predictions(request: Request,
+                           name: str, concentration: str, dosage_form: str, unit_measure: str,
+                           format: str | None = None, accept: str | None = Header(None),
+                           db: AsyncSession = Depends(get_async_db),
+                           _: any = Depends(require_roles(Role.ADMIN, Role.SUPERUSER, Role.OPERATOR, Role.CONSULTANT))):
+    fmt = negotiate(accept, format)
+    got = await db.run_sync(resolve_with_prediction_version, name, concentration, dosage_form, unit_measure)
+    if not got: return columns_response(_EMPTY_PRED, fmt, rows_key=None)
+    mid, version, updated_at = got
+
+    async def build():
+        rows = (await db.execute(
+            select(Prediction.horizon_date, Prediction.predicted_qty, Prediction.model_name)
+            .where(Prediction.medicine_id==mid).order_by(Prediction.horizon_date))).all()
+        return await _encode({
+            "date": [r[0] for r in rows], "yhat": [r[1] for r in rows], "model": [r[2] for r in rows],
+        }, fmt, rows_key=None)
+
+    return await conditional(request, fmt, mid, version, updated_at, build)
+
+@router.get("/forecast")
+async def forecast(name: str, concentration: str, dosage_form: str, unit_measure: str,
+                   horizon: int | None = Query(None, ge=1, le=60),
+                   format: str | None = None, accept: str | None = Header(None),
+                   db: AsyncSession = Depends(get_async_db),
+                   _: any = Depends(require_roles(Role.ADMIN, Role.SUPERUSER, Role.OPERATOR, Role.CONSULTANT))):
+    fmt = negotiate(accept, format)
+    h = horizon or settings.FORECAST_HORIZON
+    got = await db.run_sync(resolve_with_version, name, concentration, dosage_form, unit_measure)
+    found = registry.get_by_attrs(name, concentration, dosage_form, unit_measure)
+    if not got or not found:
+        return columns_response(_EMPTY_FC, fmt, {"model": None, "source": None, "horizon": h}, rows_key="points")
+    mid = got[0]
+    key, model = found
+
+    stored = await db.run_sync(get_stored, mid, registry.version(key))
+    if stored is not None and h <= stored.horizon:
+        dates, mean, source = stored.dates[:h], stored.mean[:h], "store"
+        bands = {int(lv): (lo[:h], hi[:h]) for lv, (lo, hi) in (stored.bands or {}).items()}
+    else:
+        dates, mean, bands = await run_in_threadpool(forecast_with_intervals, model, h, LEVELS)
+        source = "live"
+
+    cols = {"date": dates, "yhat": mean}
+    for lv in sorted(bands):
+        cols[f"lower_{lv}"], cols[f"upper_{lv}"] = bands[lv]
+    return await _encode(cols, fmt, {"model": key + ".pkl", "source": source, "horizon": h}, rows_key="points")
+
+@router.get("/search")
+async def search_medicines(q: str = Query(..., min_length=1, max_length=200),
+                           limit: int = Query(20, ge=1, le=100),
+                           db: AsyncSession = Depends(get_async_db),
+                           _: any = Depends(require_roles(Role.ADMIN, Role.SUPERUSER, Role.OPERATOR, Role.CONSULTANT))):
+    await db.run_sync(search_index.ensure_fresh)  # normalmente sin consulta (ver SEARCH_INDEX_CHECK_SECONDS)
+    items = [{
+        "id": mid, "code": code, "name": n, "concentration": c, "dosage_form": f, "unit_measure": u,
+        "score": round(score, 3), "has_model": registry.get(build_model_basename(n, c, f, u)) is not None,
+    } for score, (mid, code, n, c, f, u) in search_index.search(q, limit)]
+    return Response(dumps({"q": q, "items": items}), media_type="application/json")
+
+@router.get("/accuracy")
+async def forecast_accuracy(name: str | None = None, concentration: str | None = None,
+                            dosage_form: str | None = None, unit_measure: str | None = None,
+                            ids: list[int] | None = Query(None),
+                            model: str | None = Query(None, description="nombre del .pkl"),
+                            date_from: date | None = None, date_to: date | None = None,
+                            by_medicine: bool = False,
+                            db: AsyncSession = Depends(get_async_db),
+                            _: any = Depends(require_roles(Role.ADMIN, Role.SUPERUSER, Role.OPERATOR, Role.CONSULTANT))):
+    out = await db.run_sync(accuracy_service.accuracy, name, concentration, dosage_form, unit_measure,
+                            ids, model, date_from, date_to, by_medicine)
+    return await _json(out)
@@ -0,0 +1,240 @@
+"""
+Creación del esquema de la app (reemplaza el Base.metadata.create_all directo).
+- Con DB_PARTITIONING=1, historicos y predicciones se crean particionadas por rango
+  de fecha (una partición por año): los índices quedan chicos por año y las
+  predicciones viejas se borran con un DROP de su partición.
+- Sin particionado se comporta igual que create_all.
+Una tabla que ya existe sin particionar no se convierte (solo se avisa).
+Columnas nuevas de los modelos se agregan a tablas existentes (ADD COLUMN IF NOT EXISTS,
+siempre nullable); los índices y restricciones UNIQUE declarados en __table_args__
+también se crean si faltan (bases creadas antes de declararlos).
+"""
+
+from datetime import date
+
+from sqlalchemy import UniqueConstraint, event, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .db import Base
+# registra todas las tablas en Base.metadata antes de crearlas
+from .models import (  # noqa: F401
+    user, medicine, historical, historical_monthly, prediction, report, data_version, forecast_store,
+)
+
+# tabla -> columna de rango
+PARTITIONED = {"historicos": "fecha", "predicciones": "fecha_objetivo"}
+
+# DDL escrita a mano: la PK debe incluir la columna de partición.
+# Mantener en sync con models/historical.py y models/prediction.py (tipos y NOT NULL).
+_DDL = {
+    "historicos": """
+        CREATE TABLE IF NOT EXISTS historicos (
+          id                              serial NOT NULL,
+          medicamento_id                  integer NOT NULL REFERENCES medicamentos(id) ON DELETE CASCADE,
+          fecha                           date NOT NULL,
+          salidas_cantidad                double precision NOT NULL,
+          saldo_gestion_anterior_cantidad double precision,
+          saldo_gestion_anterior_valor_bs double precision,
+          ingresos_cantidad               double precision,
+          ingresos_valor_bs               double precision,
+          salidas_valor_bs                double precision,
+          saldos_totales_cantidad         double precision,
+          saldos_totales_valor_bs         double precision,
+          archivo_origen                  varchar(255),
+          PRIMARY KEY (id, fecha),
+          CONSTRAINT uq_historicos_medicamento_fecha UNIQUE (medicamento_id, fecha)
+        ) PARTITION BY RANGE (fecha);
+        CREATE INDEX IF NOT EXISTS ix_historicos_medicamento_id ON historicos (medicamento_id);
+        CREATE INDEX IF NOT EXISTS ix_historicos_fecha ON historicos (fecha);
+    """,
+    "predicciones": """
+        CREATE TABLE IF NOT EXISTS predicciones (
+          id                serial NOT NULL,
+          medicamento_id    integer NOT NULL REFERENCES medicamentos(id),
+          fecha_objetivo    date NOT NULL,
+          cantidad_prevista double precision NOT NULL,
+          modelo            varchar(200) NOT NULL,
+          parametros        json,
+          creado_por        integer REFERENCES usuarios(id),
+          creado_en         timestamp without time zone,
+          paso              integer,
+          PRIMARY KEY (id, fecha_objetivo)
+        ) PARTITION BY RANGE (fecha_objetivo);
+        CREATE INDEX IF NOT EXISTS ix_predicciones_medicamento_id ON predicciones (medicamento_id);
+        CREATE INDEX IF NOT EXISTS ix_predicciones_fecha_objetivo ON predicciones (fecha_objetivo);
+        CREATE INDEX IF NOT EXISTS ix_predicciones_medicamento_fecha ON predicciones (medicamento_id, fecha_objetivo);
+    """,
+}
+
+# caché en proceso: tabla -> años con partición ya confirmada (None = tabla no particionada).
+# Solo se agregan años después del commit que creó la partición (ver _on_commit).
+_known: dict[str, set[int] | None] = {}
+_PENDING = "particiones_pendientes"  # clave en Session.info: tabla -> años creados en la transacción
+
+
+def _table_exists(conn: Connection, table: str) -> bool:
+    return conn.execute(text("SELECT to_regclass(:t) IS NOT NULL"), {"t": f"public.{table}"}).scalar()
+
+
+def _partition_years(conn: Connection, table: str) -> set[int] | None:
+    """Años con partición creada, o None si la tabla no está particionada."""
+    is_part = conn.execute(text("""
+        SELECT 1 FROM pg_partitioned_table pt
+        JOIN pg_class c ON c.oid = pt.partrelid
+        WHERE c.relname = :t
+    """), {"t": table}).first()
+    if not is_part:
+        return None
+    rows = conn.execute(text("""
+        SELECT ch.relname FROM pg_inherits i
+        JOIN pg_class ch ON ch.oid = i.inhrelid
+        JOIN pg_class p  ON p.oid  = i.inhparent
+        WHERE p.relname = :t
+    """), {"t": table})
+    prefix = f"{table}_y"
+    return {int(r[0][len(prefix):]) for r in rows if r[0].startswith(prefix) and r[0][len(prefix):].isdigit()}
+
+
+def _create_partition(conn: Connection, table: str, year: int) -> None:
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {table}_y{year} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+    ))
+
+
+def ensure_partitions(db: Session | Connection, table: str, years) -> None:
+    """
+    Crea (si faltan) las particiones anuales para `years`. No-op si la tabla no está particionada.
+    Se llama antes de insertar, dentro de la transacción del escritor: los años nuevos pasan
+    a la caché recién con el commit de la sesión (si hay rollback la partición no existe).
+    Si el INSERT igual falla, el escritor llama a forget_partitions para volver a consultar.
+    """
+    conn = db.connection() if isinstance(db, Session) else db
+    if table not in _known:
+        _known[table] = _partition_years(conn, table)
+    have = _known[table]
+    if have is None:
+        return
+    missing = sorted({int(y) for y in years} - have)
+    for y in missing:
+        _create_partition(conn, table, y)
+    if missing and isinstance(db, Session):
+        db.info.setdefault(_PENDING, {}).setdefault(table, set()).update(missing)
+
+
+def forget_partitions(table: str | None = None) -> None:
+    """Descarta la caché (p. ej. tras un INSERT fallido o un DROP hecho por otro worker)."""
+    if table is None:
+        _known.clear()
+    else:
+        _known.pop(table, None)
+
+
+@event.listens_for(Session, "after_commit")
+def _on_commit(session: Session) -> None:
+    for table, years in session.info.pop(_PENDING, {}).items():
+        have = _known.get(table)
+        if have is not None:
+            have.update(years)
+
+
+@event.listens_for(Session, "after_rollback")
+def _on_rollback(session: Session) -> None:
+    session.info.pop(_PENDING, None)
+
+
+def drop_partitions_before(db: Session, table: str, year: int) -> list[str]:
+    """Desvincula y borra las particiones anuales anteriores a `year` (barato: sin DELETE fila a fila)."""
+    conn = db.connection()
+    have = _partition_years(conn, table)
+    if have is None:
+        return []
+    dropped = []
+    for y in sorted(y for y in have if y < year):
+        name = f"{table}_y{y}"
+        conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        conn.execute(text(f"DROP TABLE {name}"))
+        dropped.append(name)
+    db.commit()
+    forget_partitions(table)
+    return dropped
+
+
+def add_missing_columns(bind: Engine) -> list[str]:
+    """Agrega (nullable) las columnas de los modelos que falten en tablas ya existentes."""
+    insp = inspect(bind)
+    added = []
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not insp.has_table(table.name):
+                continue
+            have = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in have:
+                    continue
+                ddl_type = col.type.compile(dialect=bind.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN IF NOT EXISTS "{col.name}" {ddl_type}'))
+                if col.index:
+                    conn.execute(text(f'CREATE INDEX IF NOT EXISTS ix_{table.name}_{col.name} ON {table.name} ("{col.name}")'))
+                added.append(f"{table.name}.{col.name}")
+    return added
+
+
+def add_missing_indexes(bind: Engine) -> list[str]:
+    """
+    Crea los índices y restricciones UNIQUE declarados en los modelos que falten en tablas
+    ya existentes. Uno por transacción: si uno choca con datos previos se avisa y se sigue.
+    """
+    insp = inspect(bind)
+    added = []
+    for table in Base.metadata.sorted_tables:
+        if not insp.has_table(table.name):
+            continue
+        have = {ix["name"] for ix in insp.get_indexes(table.name)}
+        have |= {uc["name"] for uc in insp.get_unique_constraints(table.name)}
+        pending = [(ix.name, ix.create) for ix in table.indexes if ix.name not in have]
+        for uc in table.constraints:
+            if isinstance(uc, UniqueConstraint) and uc.name and uc.name not in have:
+                cols = ", ".join(f'"{c.name}"' for c in uc.columns)
+                ddl = text(f'ALTER TABLE {table.name} ADD CONSTRAINT "{uc.name}" UNIQUE ({cols})')
+                pending.append((uc.name, lambda conn, ddl=ddl: conn.execute(ddl)))
+        for name, create in pending:
+            try:
+                with bind.begin() as conn:
+                    create(conn)
+                added.append(name)
+            except Exception as e:
+                print(f"[WARN] no se pudo crear el índice {name}: {e}")
+    return added
+
+
+def setup_schema(bind: Engine) -> None:
+    if not settings.DB_PARTITIONING:
+        Base.metadata.create_all(bind=bind)
+        add_missing_columns(bind)
+        add_missing_indexes(bind)
+        return
+
+    # primero el resto (medicamentos/usuarios son referenciadas por las particionadas)
+    others = [t for t in Base.metadata.sorted_tables if t.name not in PARTITIONED]
+    Base.metadata.create_all(bind=bind, tables=others)
+
+    this_year = date.today().year
+    with bind.begin() as conn:
+        for table in PARTITIONED:
+            if _table_exists(conn, table):
+                if _partition_years(conn, table) is None:
+                    print(f"[WARN] {table} ya existe sin particionar; se deja como está")
+                    continue
+            else:
+                conn.execute(text(_DDL[table]))
+            # años base: desde DB_PARTITION_FIRST_YEAR hasta el próximo
+            have = _partition_years(conn, table) or set()
+            for y in range(settings.DB_PARTITION_FIRST_YEAR, this_year + 2):
+                if y not in have:
+                    _create_partition(conn, table, y)
+    add_missing_columns(bind)
+    add_missing_indexes(bind)
+    _known.clear()
@@ -19,8 +19,11 @@ class PredictResponse(BaseModel):
     forecast: List[ForecastPoint]
 """
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from datetime import date
+from typing import Literal
+
+from .models.user import Role
 
 class LoginIn(BaseModel):
     email: EmailStr
@@ -34,7 +37,12 @@ class UserCreate(BaseModel):
     email: EmailStr
     password: str
     full_name: str | None = None
-    role: str
+    role: Role  # validado: un rol desconocido es 422, no un 500 en Role(...)
+
+class UserUpdate(BaseModel):
+    role: Role | None = None
+    is_active: bool | None = None
+    full_name: str | None = None
 
 class UserOut(BaseModel):
     id: int
@@ -62,3 +70,34 @@ class ForecastPoint(BaseModel):
 class PredictResponse(BaseModel):
     modelo: str
     points: list[ForecastPoint]
+
+# Varias series en una sola consulta (pantallas de comparación)
+class MedicineRef(BaseModel):
+    name: str
+    concentration: str | int
+    dosage_form: str
+    unit_measure: str
+
+class SeriesBatchQuery(BaseModel):
+    ids: list[int] = Field(default_factory=list, max_length=200)
+    medicines: list[MedicineRef] = Field(default_factory=list, max_length=200)
+    date_from: date | None = None
+    date_to: date | None = None
+    bucket: Literal["day", "month"] = "day"
+
+# Exportación de reportes (históricos + pronósticos)
+class ReportExportQuery(BaseModel):
+    title: str | None = None
+    medicine_ids: list[int] = Field(default_factory=list)   # vacío = todo el catálogo
+    date_from: date | None = None
+    date_to: date | None = None
+    include: list[Literal["historical", "monthly", "forecast"]] = Field(default_factory=lambda: ["historical", "forecast"])
+    format: Literal["csv", "xlsx"] = "csv"
+
+# Reporte cacheado por (tipo, filtros, versión de datos)
+class CachedReportQuery(BaseModel):
+    report_type: Literal["export", "monthly"] = "monthly"
+    medicine_ids: list[int] = Field(default_factory=list)   # vacío = todo el catálogo
+    date_from: date | None = None
+    date_to: date | None = None
+    format: Literal["csv", "xlsx"] = "xlsx"
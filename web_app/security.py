@@ -1,3 +1,7 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from jose import jwt, JWTError
 from passlib.context import CryptContext
@@ -5,11 +9,77 @@ from .config import settings
 
 pwd_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt corre en un pool propio y acotado: una ráfaga de logins no ocupa
+# el threadpool compartido del resto de endpoints.
+_hash_pool = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="pwd-hash")
+_hash_slots = threading.BoundedSemaphore(settings.PASSWORD_HASH_MAX_PENDING)
+
+class PasswordQueueFull(Exception):
+    """Hay demasiados hashes en cola; el llamador debe responder 503."""
+
+class HashStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.rejected = 0
+        self.hash_seconds = 0.0
+        self.queue_seconds = 0.0
+        self.max_hash_seconds = 0.0
+        self.max_queue_seconds = 0.0
+
+    def observe(self, queue_s: float, hash_s: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.hash_seconds += hash_s
+            self.queue_seconds += queue_s
+            self.max_hash_seconds = max(self.max_hash_seconds, hash_s)
+            self.max_queue_seconds = max(self.max_queue_seconds, queue_s)
+
+    def reject(self) -> None:
+        with self._lock:
+            self.rejected += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            n = self.count or 1
+            return {
+                "count": self.count, "rejected": self.rejected,
+                "avg_hash_ms": 1000 * self.hash_seconds / n, "max_hash_ms": 1000 * self.max_hash_seconds,
+                "avg_queue_ms": 1000 * self.queue_seconds / n, "max_queue_ms": 1000 * self.max_queue_seconds,
+                "workers": settings.PASSWORD_HASH_WORKERS, "max_pending": settings.PASSWORD_HASH_MAX_PENDING,
+            }
+
+hash_stats = HashStats()
+
+def _submit(fn, *args):
+    if not _hash_slots.acquire(blocking=False):
+        hash_stats.reject()
+        raise PasswordQueueFull()
+    t0 = time.perf_counter()
+
+    def job():
+        t1 = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            hash_stats.observe(t1 - t0, time.perf_counter() - t1)
+            _hash_slots.release()
+
+    try:
+        return _hash_pool.submit(job)
+    except Exception:
+        _hash_slots.release()
+        raise
+
 def hash_password(plain: str) -> str:
-    return pwd_ctx.hash(plain)
+    return _submit(pwd_ctx.hash, plain).result()
 
 def verify_password(plain: str, hashed: str) -> bool:
-    return pwd_ctx.verify(plain, hashed)
+    return _submit(pwd_ctx.verify, plain, hashed).result()
+
+async def verify_password_async(plain: str, hashed: str) -> bool:
+    # no bloquea el event loop ni el threadpool de FastAPI mientras espera
+    return await asyncio.wrap_future(_submit(pwd_ctx.verify, plain, hashed))
 
 def create_access_token(data: dict, minutes: int | None = None) -> str:
     to_encode = data.copy()
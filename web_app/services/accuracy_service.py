@@ -0,0 +1,106 @@
+"""
+Pronóstico vs real calculado en la BD (sin mandar filas al cliente).
+- Predicciones (predicciones) contra consumo mensual real (historicos_mensuales), mes a mes.
+- Horizonte = paso de la fila dentro de su pronóstico (predicciones.paso, 1..periods);
+  filas anteriores a esa columna quedan con horizonte nulo. Repeticiones del mismo
+  pronóstico (mismo medicamento, mes, modelo y paso) cuentan una vez: la más reciente.
+- Solo meses cerrados: se excluye el mes de la última fecha cargada.
+- Métricas por horizonte, global y (opcional) por medicamento en una sola consulta
+  con GROUPING SETS: n, sesgo, MAE, RMSE, MAPE (reales > 0) y WAPE.
+El filtro por medicamento + rango de fecha_objetivo usa ix_predicciones_medicamento_fecha.
+"""
+
+from __future__ import annotations
+
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..models.medicine import Medicine
+
+ACCURACY_SQL = """
+    WITH p0 AS (
+      SELECT medicamento_id, date_trunc('month', fecha_objetivo)::date AS mes, modelo,
+             paso AS horizonte,
+             cantidad_prevista, creado_en, id
+      FROM predicciones
+      WHERE {where}
+        AND fecha_objetivo < (SELECT date_trunc('month', MAX(ultima_fecha) + 1)::date FROM historicos_mensuales)
+    ),
+    p AS (
+      SELECT DISTINCT ON (medicamento_id, mes, modelo, horizonte) *
+      FROM p0
+      ORDER BY medicamento_id, mes, modelo, horizonte, creado_en DESC NULLS LAST, id DESC
+    ),
+    e AS (
+      SELECT p.medicamento_id, p.horizonte, p.cantidad_prevista AS prevista, hm.salidas_cantidad AS real,
+             p.cantidad_prevista - hm.salidas_cantidad AS err
+      FROM p
+      JOIN historicos_mensuales hm ON hm.medicamento_id = p.medicamento_id AND hm.mes = p.mes
+    )
+    SELECT GROUPING(medicamento_id, horizonte) AS nivel, medicamento_id, horizonte,
+           COUNT(*) AS n,
+           AVG(err) AS sesgo,
+           AVG(ABS(err)) AS mae,
+           SQRT(AVG(err * err)) AS rmse,
+           AVG(ABS(err) / real) FILTER (WHERE real > 0) AS mape,
+           SUM(ABS(err)) / NULLIF(SUM(ABS(real)), 0) AS wape,
+           SUM(prevista) AS prevista_total,
+           SUM(real) AS real_total
+    FROM e
+    GROUP BY GROUPING SETS ({sets})
+    ORDER BY nivel DESC, horizonte NULLS LAST, medicamento_id
+"""
+
+_METRICS = ("n", "bias", "mae", "rmse", "mape", "wape", "predicted_total", "actual_total")
+
+
+def _metrics(row) -> dict:
+    return dict(zip(_METRICS, row[3:]))
+
+
+def accuracy(db: Session, name: str | None = None, concentration: str | None = None,
+             dosage_form: str | None = None, unit_measure: str | None = None,
+             ids: list[int] | None = None, model: str | None = None,
+             date_from: date | None = None, date_to: date | None = None,
+             by_medicine: bool = False) -> dict:
+    """Medicamentos = los que cumplen todos los filtros dados (ninguno = todo el catálogo)."""
+    q = db.query(Medicine.id, Medicine.name, Medicine.concentration, Medicine.dosage_form, Medicine.unit_measure)
+    for col, val in ((Medicine.name, name), (Medicine.concentration, concentration),
+                     (Medicine.dosage_form, dosage_form), (Medicine.unit_measure, unit_measure)):
+        if val is not None:
+            q = q.filter(col == val)
+    if ids:
+        q = q.filter(Medicine.id.in_(ids))
+    meds = {m[0]: m for m in q.all()}
+
+    out = {"medicines": len(meds), "date_from": date_from, "date_to": date_to, "model": model,
+           "overall": None, "by_horizon": []}
+    if by_medicine:
+        out["by_medicine"] = []
+    if not meds:
+        return out
+
+    # condiciones armadas a medida: sin "(:x IS NULL OR ...)" el planificador usa el índice compuesto
+    where = ["medicamento_id = ANY(CAST(:ids AS integer[]))"]
+    params: dict = {"ids": list(meds)}
+    if date_from is not None:
+        where.append("fecha_objetivo >= :date_from"); params["date_from"] = date_from
+    if date_to is not None:
+        where.append("fecha_objetivo <= :date_to"); params["date_to"] = date_to
+    if model is not None:
+        where.append("modelo = :model"); params["model"] = model
+    sets = "(horizonte), ()" + (", (medicamento_id)" if by_medicine else "")
+    sql = ACCURACY_SQL.format(where=" AND ".join(where), sets=sets)
+
+    for r in db.execute(text(sql), params):
+        if r.nivel == 3:
+            out["overall"] = _metrics(r)
+        elif r.nivel == 2:
+            out["by_horizon"].append({"horizon": r.horizonte, **_metrics(r)})
+        elif r.nivel == 1:
+            _, n, c, f, u = meds[r.medicamento_id]
+            out["by_medicine"].append({"id": r.medicamento_id, "name": n, "concentration": c,
+                                       "dosage_form": f, "unit_measure": u, **_metrics(r)})
+    return out
@@ -0,0 +1,185 @@
+"""
+Archivo Parquet de historicos / predicciones / medicamentos para analítica.
+- Layout hive: <ARCHIVE_DIR>/<tabla>/year=YYYY/medicamento_id=N/part-*.parquet,
+  legible con pyarrow.dataset, DuckDB, Spark o pandas.
+- Incremental: solo se reescriben los medicamentos cuya versión
+  (versiones_datos: datos + predicciones) cambió desde la última
+  exportación; el estado queda en <ARCHIVE_DIR>/_state.json. full=True borra y
+  reescribe cada tabla (no quedan directorios de medicamentos eliminados).
+- Las filas salen de un cursor del servidor en lotes y se escriben como RecordBatch
+  (sin DataFrame intermedio). medicamentos es chico y se reescribe completo.
+pyarrow es opcional: se importa recién al exportar.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..config import settings
+
+BATCH_SIZE = 50_000
+# un lote puede tocar tantas particiones (año, medicamento) como filas trae; los archivos
+# abiertos sí se acotan: al pasar el límite pyarrow cierra el menos usado (filas ordenadas por medicamento)
+MAX_PARTITIONS = BATCH_SIZE
+MAX_OPEN_FILES = 512
+STATE_FILE = "_state.json"
+
+# medicamentos sin fila en versiones_datos (datos previos a la tabla) cuentan como versión 0
+VERSIONS_SQL = """
+    SELECT m.id, COALESCE(v.version, 0) + COALESCE(v.version_predicciones, 0)
+    FROM medicamentos m
+    LEFT JOIN versiones_datos v ON v.medicamento_id = m.id
+"""
+
+# (tabla, SQL, columnas con tipo arrow); year y medicamento_id son las columnas de partición
+TABLES = {
+    "historicos": ("""
+        SELECT CAST(EXTRACT(YEAR FROM fecha) AS integer), medicamento_id, fecha,
+               salidas_cantidad, ingresos_cantidad, salidas_valor_bs, ingresos_valor_bs,
+               saldo_gestion_anterior_cantidad, saldo_gestion_anterior_valor_bs,
+               saldos_totales_cantidad, saldos_totales_valor_bs, archivo_origen
+        FROM historicos
+        WHERE medicamento_id = ANY(CAST(:ids AS integer[]))
+        ORDER BY medicamento_id, fecha
+    """, [
+        ("year", "int32"), ("medicamento_id", "int32"), ("fecha", "date32"),
+        ("salidas_cantidad", "float64"), ("ingresos_cantidad", "float64"),
+        ("salidas_valor_bs", "float64"), ("ingresos_valor_bs", "float64"),
+        ("saldo_gestion_anterior_cantidad", "float64"), ("saldo_gestion_anterior_valor_bs", "float64"),
+        ("saldos_totales_cantidad", "float64"), ("saldos_totales_valor_bs", "float64"),
+        ("archivo_origen", "string"),
+    ]),
+    "predicciones": ("""
+        SELECT CAST(EXTRACT(YEAR FROM fecha_objetivo) AS integer), medicamento_id, id, fecha_objetivo,
+               cantidad_prevista, modelo
+        FROM predicciones
+        WHERE medicamento_id = ANY(CAST(:ids AS integer[]))
+        ORDER BY medicamento_id, fecha_objetivo, id
+    """, [
+        ("year", "int32"), ("medicamento_id", "int32"), ("id", "int32"), ("fecha_objetivo", "date32"),
+        ("cantidad_prevista", "float64"), ("modelo", "string"),
+    ]),
+}
+
+MEDICINES_SQL = """
+    SELECT id, codigo, nombre, concentracion, forma_farmaceutica, unidad_medida, estado
+    FROM medicamentos ORDER BY id
+"""
+MEDICINES_COLUMNS = [
+    ("id", "int32"), ("codigo", "string"), ("nombre", "string"), ("concentracion", "string"),
+    ("forma_farmaceutica", "string"), ("unidad_medida", "string"), ("estado", "bool_"),
+]
+
+_running = threading.Lock()
+
+
+class ArchiveBusy(Exception):
+    """Ya hay una exportación en curso en este proceso."""
+
+
+def _schema(pa, columns):
+    return pa.schema([(name, getattr(pa, t)()) for name, t in columns])
+
+
+def _batches(db: Session, pa, sql: str, params: dict, schema) -> Iterator:
+    conn = db.connection(execution_options={"stream_results": True, "max_row_buffer": BATCH_SIZE})
+    result = conn.execute(text(sql), params)
+    for part in result.partitions(BATCH_SIZE):
+        cols = list(zip(*part))
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(c, type=f.type) for c, f in zip(cols, schema)], schema=schema)
+
+
+def _load_state(root: Path) -> dict:
+    try:
+        return json.loads((root / STATE_FILE).read_text())
+    except (FileNotFoundError, ValueError):
+        return {"versions": {}}
+
+
+def _save_state(root: Path, state: dict) -> None:
+    tmp = root / (STATE_FILE + ".tmp")
+    tmp.write_text(json.dumps(state))
+    os.replace(tmp, root / STATE_FILE)
+
+
+def _drop_medicines(root: Path, table: str, medicine_ids) -> None:
+    for mid in medicine_ids:
+        for d in (root / table).glob(f"year=*/medicamento_id={mid}"):
+            shutil.rmtree(d, ignore_errors=True)
+
+
+def export_parquet(db: Session, full: bool = False) -> dict:
+    """Exporta a Parquet lo que cambió desde la última corrida (o todo con full=True)."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    if not _running.acquire(blocking=False):
+        raise ArchiveBusy()
+    try:
+        t0 = time.perf_counter()
+        root = Path(settings.ARCHIVE_DIR)
+        root.mkdir(parents=True, exist_ok=True)
+        state = {"versions": {}} if full else _load_state(root)
+        done = state["versions"]
+
+        current = {str(mid): int(v) for mid, v in db.execute(text(VERSIONS_SQL))}
+        changed = sorted(int(mid) for mid, v in current.items() if done.get(mid) != v)
+        removed = [int(mid) for mid in done if mid not in current]
+
+        run_id = f"{datetime.utcnow():%Y%m%d%H%M%S}"
+        rows = {}
+        part_schema = pa.schema([("year", pa.int32()), ("medicamento_id", pa.int32())])
+        for table, (sql, columns) in TABLES.items():
+            rows[table] = 0
+            if full:  # también se van los directorios de medicamentos ya borrados
+                shutil.rmtree(root / table, ignore_errors=True)
+            else:
+                _drop_medicines(root, table, changed + removed)
+            if not changed:
+                continue
+            schema = _schema(pa, columns)
+
+            def counted(it, table=table):
+                for b in it:
+                    rows[table] += b.num_rows
+                    yield b
+
+            ds.write_dataset(
+                counted(_batches(db, pa, sql, {"ids": changed}, schema)), root / table,
+                schema=schema, format="parquet",
+                partitioning=ds.partitioning(part_schema, flavor="hive"),
+                basename_template=f"part-{run_id}-{{i}}.parquet",
+                existing_data_behavior="overwrite_or_ignore",
+                max_partitions=MAX_PARTITIONS, max_open_files=MAX_OPEN_FILES,
+            )
+
+        # catálogo completo (chico): escritura atómica
+        med_schema = _schema(pa, MEDICINES_COLUMNS)
+        med_table = pa.Table.from_batches(list(_batches(db, pa, MEDICINES_SQL, {}, med_schema)), schema=med_schema)
+        (root / "medicamentos").mkdir(exist_ok=True)
+        tmp = root / "medicamentos" / "medicamentos.parquet.tmp"
+        pq.write_table(med_table, tmp)
+        os.replace(tmp, root / "medicamentos" / "medicamentos.parquet")
+
+        # el estado se guarda al final: si algo falló, la próxima corrida repite esos medicamentos
+        state = {"versions": current, "exported_at": datetime.utcnow().isoformat()}
+        _save_state(root, state)
+        return {
+            "dir": str(root), "full": full, "medicines_changed": len(changed), "medicines_removed": len(removed),
+            "rows": rows, "medicines_catalog": med_table.num_rows,
+            "seconds": round(time.perf_counter() - t0, 3),
+        }
+    finally:
+        _running.release()
@@ -3,8 +3,11 @@ Servicios (lógica) de autenticación: crear usuario y autenticar.
 """
 
 # web_app/services/auth_service.py
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from ..models.user import User, Role
+from .user_cache import user_cache
 import web_app.security as security
 
 def create_user(db: Session, email: str, password: str, role: str, full_name: str | None):
@@ -13,11 +16,39 @@ def create_user(db: Session, email: str, password: str, role: str, full_name: st
              role=Role(role),
              full_name=full_name)
     db.add(u); db.commit(); db.refresh(u)
+    user_cache.invalidate(u.email)
+    return u
+
+def update_user(db: Session, user_id: int, role: str | None = None,
+                is_active: bool | None = None, full_name: str | None = None):
+    u = db.get(User, user_id)
+    if not u:
+        return None
+    before = (u.role, u.is_active)
+    if role is not None: u.role = Role(role)
+    if is_active is not None: u.is_active = is_active
+    if full_name is not None: u.full_name = full_name
+    if (u.role, u.is_active) != before:  # revoca los tokens ya emitidos
+        u.token_version = (u.token_version or 0) + 1
+    db.commit(); db.refresh(u)
+    # rol/estado cambiaron: el próximo request vuelve a leer de la BD
+    user_cache.invalidate(u.email)
     return u
 
 def authenticate(db: Session, email: str, password: str):
     u = db.query(User).filter(User.email == email).first()
-    if not u or not security.verify_password(password, u.hashed_password):
+    if not u or not u.is_active or not security.verify_password(password, u.hashed_password):
+        return None
+    token = security.create_access_token({"sub": u.email, "role": u.role.value, "ver": u.token_version or 0})
+    return token, u
+
+async def get_user_by_email_async(db: AsyncSession, email: str) -> User | None:
+    return (await db.execute(select(User).where(User.email == email))).scalars().first()
+
+async def authenticate_async(db: AsyncSession, email: str, password: str):
+    """Igual que authenticate, con sesión async; bcrypt corre en el pool dedicado."""
+    u = await get_user_by_email_async(db, email)
+    if not u or not u.is_active or not await security.verify_password_async(password, u.hashed_password):
         return None
-    token = security.create_access_token({"sub": u.email, "role": u.role.value})
-    return token, u
\ No newline at end of file
+    token = security.create_access_token({"sub": u.email, "role": u.role.value, "ver": u.token_version or 0})
+    return token, u
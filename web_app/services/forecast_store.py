@@ -0,0 +1,200 @@
+"""
+Pronósticos precalculados (tabla pronosticos_precalculados).
+- Para cada modelo registrado se guarda el pronóstico del horizonte estándar
+  (FORECAST_HORIZON) con las bandas FORECAST_LEVELS.
+- Se recalcula si cambió la versión del modelo (.pkl re-entrenado) o la versión de datos
+  del medicamento (ingesta), y también si se calculó antes del mes en curso o hace más de
+  FORECAST_MAX_AGE_HOURS: las fechas que salen del respaldo con today() avanzan de mes.
+- ForecastScheduler: hilo propio que corre tras cargar/recargar modelos, tras cada
+  ingesta (medicamentos tocados), a pedido (/predict/store/refresh) y una vez por noche
+  (FORECAST_NIGHTLY_HOUR, UTC).
+- Cada worker de uvicorn arranca su propio scheduler; las corridas se serializan entre
+  procesos con un advisory lock de PostgreSQL, así la corrida nocturna del segundo worker
+  encuentra todo recién calculado y no repite trabajo.
+/predict y /visualize/forecast leen de acá; un horizonte mayor se calcula en vivo.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..db import SessionLocal, engine
+from ..metrics import forecast_seconds
+from ..models.forecast_store import StoredForecast
+from ..models.medicine import Medicine
+from ..models_loader import build_model_basename
+from .prediction_service import forecast_with_intervals
+from .version_service import get_versions
+
+LEVELS = tuple(int(x) for x in settings.FORECAST_LEVELS.split(",") if x.strip())
+
+# clave del advisory lock que serializa las corridas entre workers
+_LOCK_KEY = 804201
+
+
+def _stale_before() -> datetime:
+    """Filas calculadas antes de esto se rehacen aunque modelo y datos no hayan cambiado."""
+    now = datetime.utcnow()
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return max(month_start, now - timedelta(hours=settings.FORECAST_MAX_AGE_HOURS))
+
+
+def model_medicines(db: Session, registry) -> dict[int, str]:
+    """medicamento_id -> clave de modelo, para los medicamentos con .pkl cargado."""
+    keys = set(registry.keys())
+    out = {}
+    for mid, n, c, f, u in db.query(Medicine.id, Medicine.name, Medicine.concentration,
+                                    Medicine.dosage_form, Medicine.unit_measure):
+        k = build_model_basename(n, c, f, u)
+        if k in keys:
+            out[mid] = k
+    return out
+
+
+def get_stored(db: Session, medicine_id: int, model_version: str | None) -> StoredForecast | None:
+    """Pronóstico guardado si corresponde a la versión actual del modelo."""
+    row = db.get(StoredForecast, medicine_id)
+    if row is None or model_version is None or row.model_version != model_version:
+        return None
+    return row
+
+
+def precompute(registry, medicine_ids=None, force: bool = False) -> dict:
+    """Recalcula los pronósticos desactualizados (de `medicine_ids` o de todo el catálogo)."""
+    t0 = time.perf_counter()
+    done = skipped = failed = 0
+    db = SessionLocal()
+    try:
+        targets = model_medicines(db, registry)
+        if medicine_ids is not None:
+            wanted = set(medicine_ids)
+            targets = {m: k for m, k in targets.items() if m in wanted}
+        if not targets:
+            return {"computed": 0, "skipped": 0, "failed": 0, "seconds": 0.0}
+        data_versions = get_versions(db, targets)
+        stale_before = _stale_before()
+        stored = {r.medicine_id: (r.model_version, r.data_version, r.horizon)
+                  for r in db.query(StoredForecast.medicine_id, StoredForecast.model_version,
+                                    StoredForecast.data_version, StoredForecast.horizon)
+                             .filter(StoredForecast.medicine_id.in_(list(targets)),
+                                     StoredForecast.computed_at >= stale_before)}
+
+        for mid, key in targets.items():
+            model, mver, dver = registry.get(key), registry.version(key), data_versions.get(mid, 0)
+            if model is None:
+                continue
+            if not force and stored.get(mid) == (mver, dver, settings.FORECAST_HORIZON):
+                skipped += 1
+                continue
+            t1 = time.perf_counter()
+            try:
+                dates, values, bands = forecast_with_intervals(model, settings.FORECAST_HORIZON, LEVELS)
+            except Exception as e:
+                failed += 1
+                print(f"[WARN] pronóstico precalculado de {key} falló: {e}")
+                continue
+            dt = time.perf_counter() - t1
+            forecast_seconds.observe(dt, key)
+            row = {
+                "medicamento_id": mid, "modelo": key + ".pkl", "version_modelo": mver, "version_datos": dver,
+                "horizonte": settings.FORECAST_HORIZON, "fechas": dates, "media": values,
+                "bandas": {str(lv): [lo, hi] for lv, (lo, hi) in bands.items()},
+                "calculado_en": datetime.utcnow(), "calculo_ms": dt * 1000,
+            }
+            stmt = pg_insert(StoredForecast.__table__).values(row)
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=["medicamento_id"],
+                set_={k: stmt.excluded[k] for k in row if k != "medicamento_id"},
+            ))
+            db.commit()  # por medicamento: lo calculado queda visible aunque el resto tarde
+            done += 1
+        return {"computed": done, "skipped": skipped, "failed": failed,
+                "seconds": round(time.perf_counter() - t0, 3)}
+    finally:
+        db.close()
+
+
+def store_stats(db: Session) -> dict:
+    n, last = db.query(func.count(StoredForecast.medicine_id), func.max(StoredForecast.computed_at)).one()
+    return {"stored": n, "last_computed_at": last, "horizon": settings.FORECAST_HORIZON, "levels": list(LEVELS)}
+
+
+class ForecastScheduler:
+    """Un hilo; las solicitudes se acumulan (None = todo el catálogo) y se procesan en orden."""
+
+    def __init__(self):
+        self._registry = None
+        self._pending: set[int] | None = set()
+        self._all = False
+        self._force = False
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self.last_run: dict | None = None
+
+    def start(self, registry) -> None:
+        if self._registry is not None or not settings.FORECAST_SCHEDULER_ENABLED:
+            return
+        self._registry = registry
+        threading.Thread(target=self._loop, name="forecast-scheduler", daemon=True).start()
+
+    @property
+    def running(self) -> bool:
+        return self._registry is not None
+
+    def request(self, medicine_ids=None, force: bool = False) -> bool:
+        """Encola un recálculo; no-op (False) si el scheduler no arrancó (scripts, tests)."""
+        if self._registry is None:
+            return False
+        with self._lock:
+            if medicine_ids is None:
+                self._all = True
+                self._force = self._force or force
+            else:
+                self._pending.update(int(m) for m in medicine_ids)
+        self._wake.set()
+        return True
+
+    def _next_nightly(self) -> float:
+        now = datetime.utcnow()
+        at = now.replace(hour=settings.FORECAST_NIGHTLY_HOUR, minute=0, second=0, microsecond=0)
+        if at <= now:
+            at += timedelta(days=1)
+        return (at - now).total_seconds()
+
+    def _loop(self) -> None:
+        while True:
+            if not self._wake.wait(self._next_nightly()):
+                self._all = True  # corrida nocturna
+            self._wake.clear()
+            if not self._registry.ready:
+                time.sleep(1)
+                self._wake.set()
+                continue
+            with self._lock:
+                ids = None if self._all else sorted(self._pending)
+                force = self._force and ids is None
+                self._all, self._pending, self._force = False, set(), False
+            if ids == []:
+                continue
+            try:
+                with engine.connect() as conn:
+                    # otro worker corriendo: esperar sin ocupar statement_timeout
+                    while not conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": _LOCK_KEY}).scalar():
+                        time.sleep(5)
+                    try:
+                        self.last_run = {"at": datetime.utcnow().isoformat(),
+                                         **precompute(self._registry, ids, force=force)}
+                    finally:
+                        conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": _LOCK_KEY})
+            except Exception as e:
+                print(f"[WARN] scheduler de pronósticos: {e}")
+
+
+forecast_scheduler = ForecastScheduler()
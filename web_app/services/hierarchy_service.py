@@ -0,0 +1,171 @@
+"""
+Pronóstico jerárquico medicamento -> forma farmacéutica -> total de la farmacia.
+- Jerarquía armada desde medicamentos (forma_farmaceutica); meses: los H siguientes
+  al último mes de historicos_mensuales.
+- Pronósticos base de las hojas: precalculados al día (alineados por mes); sin pronóstico,
+  consumo mensual medio de los últimos PLANNING_HISTORY_MONTHS meses. Formas y total:
+  el mismo promedio sobre la serie agregada (una consulta con GROUPING SETS).
+- Reconciliación en bloque para los H meses: y~ = S (S' L S)^-1 S' L y^, con L = W^-1
+    ols          W = I
+    wls          W = diag(cantidad de hojas bajo cada nodo) (escalado estructural)
+    bottom_up    solo las hojas, sumadas hacia arriba
+  S' L S = diag(L_hojas) + U C U' con U = [1 | one-hot(forma)]: por Woodbury solo se
+  resuelve un sistema (formas + 1) x (formas + 1), sin matrices n x n.
+Las hojas negativas se recortan a 0 y se vuelve a sumar (la jerarquía queda coherente).
+"""
+
+from __future__ import annotations
+
+from datetime import date
+from typing import TYPE_CHECKING
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models.forecast_store import StoredForecast
+from ..models.medicine import Medicine
+from .forecast_store import model_medicines
+
+if TYPE_CHECKING:
+    import numpy as np
+
+METHODS = ("wls", "ols", "bottom_up")
+
+LAST_MONTH_SQL = "SELECT MAX(mes) FROM historicos_mensuales"
+
+# nivel: 1 = medicamento, 2 = forma, 3 = total (bits de GROUPING)
+BASE_SQL = """
+    WITH w AS (
+      SELECT h.medicamento_id, m.forma_farmaceutica AS forma, h.mes, h.salidas_cantidad
+      FROM historicos_mensuales h
+      JOIN medicamentos m ON m.id = h.medicamento_id
+      WHERE h.mes > CAST(:last AS date) - make_interval(months => :months)
+    )
+    SELECT GROUPING(medicamento_id, forma) AS nivel, medicamento_id, forma,
+           SUM(salidas_cantidad) / (SELECT COUNT(DISTINCT mes) FROM w) AS media
+    FROM w
+    GROUP BY GROUPING SETS ((medicamento_id), (forma), ())
+"""
+
+
+def _month_index(d: date) -> int:
+    return d.year * 12 + d.month - 1
+
+
+def reconcile(yb: "np.ndarray", yf: "np.ndarray", yt: "np.ndarray",
+              form_idx: "np.ndarray", method: str = "wls") -> tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """
+    Pronósticos base (hojas (n,H), formas (k,H), total (H,)) -> reconciliados coherentes.
+    form_idx[i] = índice de la forma de la hoja i.
+    """
+    import numpy as np
+
+    n, H = yb.shape
+    k = yf.shape[0]
+    if method == "bottom_up" or n == 0:
+        x = yb
+    else:
+        counts = np.bincount(form_idx, minlength=k).astype(float)
+        lb = np.ones(n)
+        if method == "ols":
+            lf, lt = np.ones(k), 1.0
+        else:
+            lf, lt = 1.0 / np.maximum(counts, 1.0), 1.0 / n
+        # r = S' L y^
+        r = lb[:, None] * yb + (lf[:, None] * yf)[form_idx] + lt * yt[None, :]
+        dinv = 1.0 / lb
+        dr = dinv[:, None] * r
+        # U' D^-1 r: fila 0 = total, filas 1..k = por forma
+        ut = np.zeros((k + 1, H))
+        ut[0] = dr.sum(axis=0)
+        np.add.at(ut[1:], form_idx, dr)
+        # C^-1 + U' D^-1 U
+        s = np.bincount(form_idx, weights=dinv, minlength=k)
+        m = np.zeros((k + 1, k + 1))
+        m[0, 0] = 1.0 / lt + dinv.sum()
+        m[0, 1:] = m[1:, 0] = s
+        m[1:, 1:] += np.diag(1.0 / lf + s)
+        z = np.linalg.solve(m, ut)
+        x = dr - dinv[:, None] * (z[0][None, :] + z[1:][form_idx])
+
+    x = np.maximum(x, 0.0)
+    forms = np.zeros((k, H))
+    np.add.at(forms, form_idx, x)
+    return x, forms, x.sum(axis=0)
+
+
+def hierarchy(db: Session, registry, horizon: int | None = None, method: str = "wls",
+              include_medicines: bool = True) -> dict:
+    import numpy as np
+
+    H = horizon or settings.FORECAST_HORIZON
+    last = db.execute(text(LAST_MONTH_SQL)).scalar() or date.today().replace(day=1)
+    start = _month_index(last) + 1
+    dates = [date((start + h) // 12, (start + h) % 12 + 1, 1) for h in range(H)]
+
+    meds = db.query(Medicine.id, Medicine.name, Medicine.concentration,
+                    Medicine.dosage_form, Medicine.unit_measure).order_by(Medicine.id).all()
+    n = len(meds)
+    pos = {m[0]: i for i, m in enumerate(meds)}
+    forms = sorted({m[3] for m in meds})
+    fpos = {f: j for j, f in enumerate(forms)}
+    form_idx = np.array([fpos[m[3]] for m in meds], dtype=np.int64)
+    k = len(forms)
+
+    # promedios recientes por hoja, forma y total (una sola consulta)
+    hist_b, hist_f, hist_t = np.zeros(n), np.zeros(k), 0.0
+    params = {"last": last, "months": settings.PLANNING_HISTORY_MONTHS}
+    for level, mid, form, mean in db.execute(text(BASE_SQL), params):
+        mean = float(mean or 0.0)
+        if level == 1 and mid in pos:
+            hist_b[pos[mid]] = mean
+        elif level == 2 and form in fpos:
+            hist_f[fpos[form]] = mean
+        elif level == 3:
+            hist_t = mean
+
+    yb = np.repeat(hist_b[:, None], H, axis=1)
+    from_store = np.zeros(n, dtype=bool)
+    keys = model_medicines(db, registry)
+    for r in db.query(StoredForecast.medicine_id, StoredForecast.model_version,
+                      StoredForecast.dates, StoredForecast.mean):
+        key = keys.get(r.medicine_id)
+        i = pos.get(r.medicine_id)
+        if key is None or i is None or registry.version(key) != r.model_version:
+            continue
+        # alinear por mes: los meses que el pronóstico no cubre quedan con el promedio
+        for d, v in zip(r.dates, r.mean):
+            h = _month_index(d) - start
+            if 0 <= h < H and v is not None:
+                yb[i, h] = v
+                from_store[i] = True
+
+    yf = np.repeat(hist_f[:, None], H, axis=1)
+    yt = np.full(H, hist_t)
+    xb, xf, xt = reconcile(yb, yf, yt, form_idx, method)
+    base_sum_f = np.zeros((k, H))
+    np.add.at(base_sum_f, form_idx, yb)
+
+    out = {
+        "method": method, "horizon": H, "dates": dates,
+        "history_months": settings.PLANNING_HISTORY_MONTHS,
+        "counts": {"medicines": n, "forms": k, "from_store": int(from_store.sum())},
+        "total": {"base": yt.tolist(), "bottom_up": yb.sum(axis=0).tolist(), "reconciled": xt.tolist()},
+        "forms": {
+            "dosage_form": forms,
+            "n_medicines": np.bincount(form_idx, minlength=k).tolist(),
+            "base": yf.tolist(), "bottom_up": base_sum_f.tolist(), "reconciled": xf.tolist(),
+        },
+    }
+    if include_medicines:
+        out["medicines"] = {
+            "id": [m[0] for m in meds],
+            "name": [m[1] for m in meds],
+            "concentration": [m[2] for m in meds],
+            "dosage_form": [m[3] for m in meds],
+            "unit_measure": [m[4] for m in meds],
+            "source": ["forecast" if s else "history" for s in from_store],
+            "base": yb.tolist(), "reconciled": xb.tolist(),
+        }
+    return out
@@ -1,15 +1,30 @@
 # web_app/services/historical_service.py
 from __future__ import annotations
 
+import time
 import unicodedata
-import pandas as pd
+
+from datetime import date
+from typing import TYPE_CHECKING
 
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, text
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from ..models.medicine import Medicine
 from ..models.historical import Historical
+from ..models.historical_monthly import HistoricalMonthly
+from .series_cache import series_cache
+from .version_service import bump_versions
+from .forecast_store import forecast_scheduler
+from .search_index import search_index
+from ..schema_setup import ensure_partitions, forget_partitions
+from ..metrics import ingest_batch_rows, ingest_rows, ingest_rows_per_second, ingest_seconds
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# pandas se importa dentro de cada función: importar el módulo (y la app) no lo carga
 
 
 # ---------------------------
@@ -24,6 +39,7 @@ def _strip_accents(s: str) -> str:
 
 def _norm_txt(s) -> str:
     """Normaliza texto: a string, sin acentos, sin espacios dobles."""
+    import pandas as pd
     if pd.isna(s):
         return ""
     s = str(s).strip()
@@ -73,6 +89,7 @@ def _norm_headers(df: pd.DataFrame) -> pd.DataFrame:
 # ---------------------------
 def _to_num(x):
     """Convierte '1.234,56' / '1,234.56' / 'Bs 1.234' a float o None."""
+    import pandas as pd
     if pd.isna(x):
         return None
     s = str(x).strip()
@@ -93,6 +110,8 @@ def upsert_medicines_from_df(db: Session, df: pd.DataFrame) -> int:
     Inserta/actualiza medicamentos a partir de las columnas:
     name, concentration, dosage_form, unit_measure, (opcional) code.
     """
+    import pandas as pd
+
     df = _norm_headers(df)
 
     # Normaliza los textos clave para identidad
@@ -127,6 +146,7 @@ def upsert_medicines_from_df(db: Session, df: pd.DataFrame) -> int:
     )
     res = db.execute(on_conflict)
     db.commit()
+    search_index.invalidate()
     return res.rowcount
 
 
@@ -134,6 +154,10 @@ def upsert_medicines_from_df(db: Session, df: pd.DataFrame) -> int:
 # UPSERT masivo de históricos (completo)
 # --------------------------------------
 def bulk_upsert_historical(db: Session, df_raw: pd.DataFrame, source_file: str | None = None):
+    import pandas as pd
+
+    t0 = time.perf_counter()
+
     # 1) normaliza encabezados y valida requeridos
     df = _norm_headers(df_raw)
 
@@ -190,6 +214,7 @@ def bulk_upsert_historical(db: Session, df_raw: pd.DataFrame, source_file: str |
                 status=True
             )
             db.add(m); db.commit(); db.refresh(m)
+            search_index.invalidate()
             mid = m.id
             med_map[key] = mid
 
@@ -215,6 +240,9 @@ def bulk_upsert_historical(db: Session, df_raw: pd.DataFrame, source_file: str |
     if not rows:
         return {"inserted": 0, "skipped": 0}
 
+    # particionado: crea las particiones de los años del lote (no-op si la tabla no está particionada)
+    ensure_partitions(db, "historicos", {r["fecha"].year for r in rows})
+
     stmt = pg_insert(Historical.__table__).values(rows)
 
     # No sobreescribas con NULL: COALESCE(excluded, actual)
@@ -233,6 +261,169 @@ def bulk_upsert_historical(db: Session, df_raw: pd.DataFrame, source_file: str |
         }
     )
 
-    res = db.execute(on_conflict)
+    try:
+        res = db.execute(on_conflict)
+    except Exception:
+        # p. ej. "no partition of relation found": la caché de particiones quedó vieja
+        forget_partitions("historicos")
+        raise
+
+    # 5) recalcula el resumen mensual solo de los (medicamento, mes) tocados (misma transacción)
+    refresh_monthly(db, {(r["medicamento_id"], r["fecha"].replace(day=1)) for r in rows})
+    touched = {r["medicamento_id"] for r in rows}
+    bump_versions(db, touched)
     db.commit()
+    series_cache.invalidate(touched)
+    forecast_scheduler.request(touched)  # los pronósticos precalculados de estos medicamentos se rehacen
+
+    dt = time.perf_counter() - t0
+    ingest_rows.inc(len(rows))
+    ingest_batch_rows.observe(len(rows))
+    ingest_seconds.observe(dt)
+    ingest_rows_per_second.set(len(rows) / dt if dt > 0 else 0.0)
     return {"inserted": res.rowcount, "skipped": 0}
+
+
+# -----------------------------------------------
+# Resumen mensual incremental (historicos_mensuales)
+# -----------------------------------------------
+# Recalcula desde historicos los pares (medicamento_id, mes) indicados. Cada par se
+# resuelve con un range scan sobre uq_historicos_medicamento_fecha (medicamento_id, fecha).
+# Cuerpo compartido con scripts/import_excel_staging.py: espera un CTE k(medicamento_id, mes).
+MONTHLY_UPSERT_SQL = """
+    INSERT INTO historicos_mensuales (
+      medicamento_id, mes, salidas_cantidad, ingresos_cantidad, salidas_valor_bs,
+      saldo_cierre_cantidad, saldo_cierre_valor_bs, n_registros, ultima_fecha, actualizado_en
+    )
+    SELECT
+      k.medicamento_id,
+      k.mes,
+      COALESCE(SUM(h.salidas_cantidad), 0),
+      SUM(h.ingresos_cantidad),
+      SUM(h.salidas_valor_bs),
+      (array_agg(h.saldos_totales_cantidad ORDER BY h.fecha DESC)
+         FILTER (WHERE h.saldos_totales_cantidad IS NOT NULL))[1],
+      (array_agg(h.saldos_totales_valor_bs ORDER BY h.fecha DESC)
+         FILTER (WHERE h.saldos_totales_valor_bs IS NOT NULL))[1],
+      COUNT(*),
+      MAX(h.fecha),
+      now() AT TIME ZONE 'utc'
+    FROM k
+    JOIN historicos h
+      ON h.medicamento_id = k.medicamento_id
+     AND h.fecha >= k.mes
+     AND h.fecha < (k.mes + interval '1 month')
+    GROUP BY k.medicamento_id, k.mes
+    ON CONFLICT (medicamento_id, mes) DO UPDATE SET
+      salidas_cantidad      = EXCLUDED.salidas_cantidad,
+      ingresos_cantidad     = EXCLUDED.ingresos_cantidad,
+      salidas_valor_bs      = EXCLUDED.salidas_valor_bs,
+      saldo_cierre_cantidad = EXCLUDED.saldo_cierre_cantidad,
+      saldo_cierre_valor_bs = EXCLUDED.saldo_cierre_valor_bs,
+      n_registros           = EXCLUDED.n_registros,
+      ultima_fecha          = EXCLUDED.ultima_fecha,
+      actualizado_en        = EXCLUDED.actualizado_en
+"""
+
+MONTHLY_REFRESH_SQL = """
+    WITH k AS (
+      SELECT DISTINCT t.medicamento_id, t.mes
+      FROM unnest(CAST(:mids AS integer[]), CAST(:meses AS date[])) AS t(medicamento_id, mes)
+    )
+""" + MONTHLY_UPSERT_SQL
+
+def refresh_monthly(db: Session, pairs) -> int:
+    """
+    Recalcula historicos_mensuales para los pares (medicamento_id, mes) dados.
+    No hace commit: se ejecuta dentro de la transacción de la ingesta.
+    """
+    pairs = sorted({(int(mid), d.replace(day=1)) for mid, d in pairs})
+    if not pairs:
+        return 0
+    res = db.execute(text(MONTHLY_REFRESH_SQL), {
+        "mids": [p[0] for p in pairs],
+        "meses": [p[1] for p in pairs],
+    })
+    return res.rowcount
+
+
+def get_monthly_series(db: Session, medicine_id: int,
+                       date_from: date | str | None = None,
+                       date_to: date | str | None = None) -> list[HistoricalMonthly]:
+    """Serie mensual de un medicamento en orden cronológico (range scan sobre la PK)."""
+    import pandas as pd
+
+    q = db.query(HistoricalMonthly).filter(HistoricalMonthly.medicine_id == medicine_id)
+    # los meses se guardan como día 1: trunca los límites para no perder el mes inicial
+    if date_from: q = q.filter(HistoricalMonthly.month >= pd.Timestamp(date_from).date().replace(day=1))
+    if date_to: q = q.filter(HistoricalMonthly.month <= pd.Timestamp(date_to).date())
+    return q.order_by(HistoricalMonthly.month).all()
+
+
+# ---------------------------------------------------
+# Varias series (por ids o 4 atributos) en una consulta
+# ---------------------------------------------------
+_BATCH_SOURCES = {
+    # bucket -> (tabla, columna fecha, salidas, ingresos, saldo)
+    "day": ("historicos", "fecha", "salidas_cantidad", "ingresos_cantidad", "saldos_totales_cantidad"),
+    "month": ("historicos_mensuales", "mes", "salidas_cantidad", "ingresos_cantidad", "saldo_cierre_cantidad"),
+}
+
+def fetch_series_batch(db: Session, ids: list[int], refs: list[tuple[str, str, str, str]],
+                       date_from: date | None = None, date_to: date | None = None,
+                       bucket: str = "day") -> dict:
+    """
+    Resuelve medicamentos por id o por (nombre, concentración, forma, unidad) y trae todas
+    sus series en UNA consulta ordenada por (medicamento, fecha). Devuelve columnas paralelas
+    agrupadas por medicamento y la lista de referencias no encontradas.
+    """
+    table, dcol, out_c, in_c, bal_c = _BATCH_SOURCES[bucket]
+    refs = [tuple(str(v).strip() for v in r) for r in refs]
+    if bucket == "month" and date_from is not None:
+        date_from = date_from.replace(day=1)
+
+    sql = f"""
+        WITH sel AS (
+          SELECT m.id, m.nombre, m.concentracion, m.forma_farmaceutica, m.unidad_medida
+          FROM medicamentos m
+          WHERE m.id = ANY(CAST(:ids AS integer[]))
+             OR (m.nombre, m.concentracion, m.forma_farmaceutica, m.unidad_medida) IN (
+                  SELECT * FROM unnest(CAST(:n AS text[]), CAST(:c AS text[]),
+                                       CAST(:f AS text[]), CAST(:u AS text[])))
+        )
+        SELECT sel.id, sel.nombre, sel.concentracion, sel.forma_farmaceutica, sel.unidad_medida,
+               h.{dcol}, h.{out_c}, h.{in_c}, h.{bal_c}
+        FROM sel
+        LEFT JOIN {table} h
+          ON h.medicamento_id = sel.id
+         AND (CAST(:df AS date) IS NULL OR h.{dcol} >= CAST(:df AS date))
+         AND (CAST(:dt AS date) IS NULL OR h.{dcol} <= CAST(:dt AS date))
+        ORDER BY sel.id, h.{dcol}
+    """
+    rows = db.execute(text(sql), {
+        "ids": list(ids),
+        "n": [r[0] for r in refs], "c": [r[1] for r in refs],
+        "f": [r[2] for r in refs], "u": [r[3] for r in refs],
+        "df": date_from, "dt": date_to,
+    })
+
+    series: dict[int, dict] = {}
+    for mid, n, c, f, u, d, out_q, in_q, bal in rows:
+        s = series.get(mid)
+        if s is None:
+            s = series[mid] = {
+                "id": mid, "name": n, "concentration": c, "dosage_form": f, "unit_measure": u,
+                "dates": [], "outflow_qty": [], "inflow_qty": [], "total_balance_qty": [],
+            }
+        if d is None:  # medicamento sin filas en el rango (LEFT JOIN)
+            continue
+        s["dates"].append(d.isoformat())
+        s["outflow_qty"].append(out_q)
+        s["inflow_qty"].append(in_q)
+        s["total_balance_qty"].append(bal)
+
+    found_keys = {(s["name"], s["concentration"], s["dosage_form"], s["unit_measure"]) for s in series.values()}
+    missing = [{"id": i} for i in ids if i not in series]
+    missing += [dict(zip(("name", "concentration", "dosage_form", "unit_measure"), r))
+                for r in refs if r not in found_keys]
+    return {"bucket": bucket, "series": list(series.values()), "missing": missing}
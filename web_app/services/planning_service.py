@@ -0,0 +1,169 @@
+"""
+Planificación de compras para todo el catálogo (revisión periódica R, lead time L).
+- Saldo actual: último saldo de cierre de historicos_mensuales (= último
+  saldos_totales_cantidad no nulo de historicos).
+- Meses planificados: los L+R siguientes al mes del saldo (sin saldo, desde el mes en curso).
+- Demanda: pronóstico precalculado al día, alineado por mes (media y la banda más ancha
+  disponible -> desvío por mes; sin bandas, el desvío histórico); sin pronóstico, promedio y
+  desvío de los últimos PLANNING_HISTORY_MONTHS meses. Los meses que el pronóstico guardado
+  no cubre usan ese mismo promedio histórico (o la media de lo pronosticado).
+- Sin saldo registrado no hay plan: stock_known = false, sin pedido sugerido ni cobertura
+  (no cuentan en orders; se informan en meta.no_stock).
+- Todo el cálculo va vectorizado sobre matrices (medicamentos × meses):
+    cobertura       = saldo / demanda mensual media
+    punto de pedido = demanda en L + z * desvío en L
+    nivel objetivo  = demanda en L+R + z * desvío en L+R
+    pedido sugerido = nivel objetivo - saldo, si saldo <= punto de pedido
+  El desvío acumulado supone meses independientes (sqrt de la suma de varianzas).
+"""
+
+from __future__ import annotations
+
+import warnings
+from datetime import date
+from statistics import NormalDist
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models.forecast_store import StoredForecast
+from ..models.medicine import Medicine
+from .forecast_store import model_medicines
+
+HISTORY_SQL = """
+    WITH r AS (
+      SELECT medicamento_id, mes, salidas_cantidad, saldo_cierre_cantidad, ultima_fecha,
+             ROW_NUMBER() OVER (PARTITION BY medicamento_id ORDER BY mes DESC) AS rn
+      FROM historicos_mensuales
+    )
+    SELECT medicamento_id,
+           (array_agg(saldo_cierre_cantidad ORDER BY mes DESC) FILTER (WHERE saldo_cierre_cantidad IS NOT NULL))[1],
+           (array_agg(ultima_fecha ORDER BY mes DESC) FILTER (WHERE saldo_cierre_cantidad IS NOT NULL))[1],
+           AVG(salidas_cantidad) FILTER (WHERE rn <= :months),
+           STDDEV_SAMP(salidas_cantidad) FILTER (WHERE rn <= :months)
+    FROM r
+    GROUP BY medicamento_id
+"""
+
+def _month_index(d: date) -> int:
+    return d.year * 12 + d.month - 1
+
+
+def _band_sd(np, bands: dict | None):
+    """Desvío por mes desde la banda de mayor nivel guardada, o None si no hay bandas."""
+    levels = sorted((int(lv) for lv in (bands or {}) if str(lv).isdigit()), reverse=True)
+    if not levels:
+        return None
+    lv = levels[0]
+    lo, hi = bands[str(lv)]
+    z = NormalDist().inv_cdf(0.5 + lv / 200)
+    return (np.asarray(hi, dtype=float) - np.asarray(lo, dtype=float)) / (2 * z)
+
+
+def plan(db: Session, registry, lead_time: int = 1, review: int = 1,
+         service_level: float = 0.95, only_orders: bool = False) -> dict:
+    """Columnas paralelas (arreglos NumPy / listas) con el plan de todo el catálogo."""
+    import numpy as np
+
+    meds = db.query(Medicine.id, Medicine.code, Medicine.name, Medicine.concentration,
+                    Medicine.dosage_form, Medicine.unit_measure).order_by(Medicine.id).all()
+    n = len(meds)
+    ids = np.array([m[0] for m in meds], dtype=np.int64)
+    pos = {int(mid): i for i, mid in enumerate(ids)}
+    H = max(lead_time + review, 1)
+
+    # saldo y demanda histórica (una consulta para todo el catálogo)
+    stock = np.full(n, np.nan)
+    stock_as_of = [None] * n
+    hist_mean = np.full(n, np.nan)
+    hist_sd = np.full(n, np.nan)
+    for mid, bal, as_of, avg, sd in db.execute(text(HISTORY_SQL), {"months": settings.PLANNING_HISTORY_MONTHS}):
+        i = pos.get(mid)
+        if i is None:
+            continue
+        stock[i] = np.nan if bal is None else bal
+        stock_as_of[i] = as_of
+        hist_mean[i] = np.nan if avg is None else avg
+        hist_sd[i] = np.nan if sd is None else sd
+
+    # primer mes planificado: el siguiente al del saldo (sin saldo, el mes en curso)
+    this_month = _month_index(date.today())
+    start = [this_month if d is None else _month_index(d) + 1 for d in stock_as_of]
+
+    # pronósticos precalculados vigentes -> matrices (n, H) de media y desvío, alineadas por mes
+    fc_mean = np.full((n, H), np.nan)
+    fc_sd = np.full((n, H), np.nan)
+    keys = model_medicines(db, registry)
+    for r in db.query(StoredForecast.medicine_id, StoredForecast.model_version,
+                      StoredForecast.dates, StoredForecast.mean, StoredForecast.bands):
+        key = keys.get(r.medicine_id)
+        i = pos.get(r.medicine_id)
+        if key is None or i is None or registry.version(key) != r.model_version or not r.dates:
+            continue
+        h = np.array([_month_index(d) for d in r.dates]) - start[i]
+        ok = (h >= 0) & (h < H)
+        fc_mean[i, h[ok]] = np.asarray(r.mean, dtype=float)[ok]
+        sd = _band_sd(np, r.bands)
+        if sd is not None:
+            fc_sd[i, h[ok]] = sd[ok]
+
+    has_fc = ~np.isnan(fc_mean).all(axis=1)
+    # meses que el pronóstico no cubre (pasa el horizonte o empieza tarde): media/desvío
+    # históricos, o lo pronosticado; con 0 se subestimaría la demanda del lead time
+    with np.errstate(invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # nanmean de filas sin pronóstico
+        fill_mean = np.where(np.isnan(hist_mean), np.nanmean(fc_mean, axis=1), hist_mean)
+        fill_sd = np.where(np.isnan(hist_sd), np.nanmean(fc_sd, axis=1), hist_sd)
+    fc_mean = np.where(np.isnan(fc_mean), fill_mean[:, None], fc_mean)
+    fc_sd = np.where(np.isnan(fc_sd), fill_sd[:, None], fc_sd)
+    # sin pronóstico: la media/desvío históricos se repiten en cada mes
+    mean = np.where(has_fc[:, None], fc_mean, hist_mean[:, None])
+    sd = np.where(has_fc[:, None], fc_sd, hist_sd[:, None])
+    mean = np.maximum(np.nan_to_num(mean, nan=0.0), 0.0)
+    var = np.nan_to_num(sd, nan=0.0) ** 2
+
+    z = NormalDist().inv_cdf(service_level)
+    cum_mean = np.cumsum(mean, axis=1)
+    cum_sd = np.sqrt(np.cumsum(var, axis=1))
+    L = max(lead_time, 1) - 1
+    lt_demand = cum_mean[:, L] if lead_time > 0 else np.zeros(n)
+    safety = z * cum_sd[:, L] if lead_time > 0 else np.zeros(n)
+    reorder_point = lt_demand + safety
+    order_up_to = cum_mean[:, H - 1] + z * cum_sd[:, H - 1]
+
+    avg_demand = mean.mean(axis=1)
+    # sin saldo no se sabe cuánto pedir: con 0 todos saldrían a pedir el nivel objetivo completo
+    known = ~np.isnan(stock)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cover = np.where(known & (avg_demand > 0), stock / avg_demand, np.nan)
+        needs = known & (stock <= reorder_point) & (avg_demand > 0)
+        qty = np.where(needs, np.ceil(np.maximum(order_up_to - stock, 0.0)),
+                       np.where(known, 0.0, np.nan))
+    source = np.where(has_fc, "forecast", np.where(np.isnan(hist_mean), "none", "history"))
+
+    sel = np.flatnonzero(needs) if only_orders else np.arange(n)
+    cols = {
+        "id": ids[sel],
+        "code": [meds[i][1] for i in sel],
+        "name": [meds[i][2] for i in sel],
+        "concentration": [meds[i][3] for i in sel],
+        "dosage_form": [meds[i][4] for i in sel],
+        "unit_measure": [meds[i][5] for i in sel],
+        "stock": stock[sel],
+        "stock_known": known[sel],
+        "stock_as_of": [stock_as_of[i] for i in sel],
+        "avg_monthly_demand": avg_demand[sel],
+        "months_of_cover": cover[sel],
+        "lead_time_demand": lt_demand[sel],
+        "safety_stock": safety[sel],
+        "reorder_point": reorder_point[sel],
+        "order_up_to": order_up_to[sel],
+        "suggested_qty": qty[sel],
+        "needs_order": needs[sel],
+        "demand_source": source[sel].tolist(),
+    }
+    meta = {"lead_time": lead_time, "review": review, "service_level": service_level,
+            "as_of": date.today(), "items_count": len(sel), "orders": int(needs.sum()),
+            "no_stock": int((~known).sum())}
+    return {"columns": cols, "meta": meta}
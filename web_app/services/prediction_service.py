@@ -1,14 +1,22 @@
-import pandas as pd
-import numpy as np
+import time
+
 from sqlalchemy.orm import Session
 from ..models.medicine import Medicine
 from ..models.prediction import Prediction
+from .version_service import bump_prediction_versions
+from .search_index import search_index
+from ..schema_setup import ensure_partitions, forget_partitions
+from ..metrics import forecast_seconds
+
+def _extract_forecast(model, steps: int, fc=None):
+    import numpy as np
+    import pandas as pd  # import diferido: no se paga en el arranque
 
-def _extract_forecast(model, steps: int):
     dates, values = None, None
 
     if hasattr(model, "get_forecast"):
-        fc = model.get_forecast(steps=steps)
+        if fc is None:
+            fc = model.get_forecast(steps=steps)
         mean = getattr(fc, "predicted_mean", None)
         if mean is not None:
             values = np.asarray(mean)
@@ -40,6 +48,22 @@ def _extract_forecast(model, steps: int):
 
     return [pd.to_datetime(d).date() for d in dates], [float(v) for v in values]
 
+def forecast_with_intervals(model, steps: int, levels=(80, 95)):
+    """
+    Pronóstico puntual + bandas de confianza {nivel: (inferiores, superiores)}.
+    Las bandas salen de get_forecast().conf_int (statsmodels); otros modelos devuelven {}.
+    """
+    import numpy as np
+
+    fc = model.get_forecast(steps=steps) if hasattr(model, "get_forecast") else None
+    dates, values = _extract_forecast(model, steps, fc=fc)
+    bands = {}
+    if fc is not None and hasattr(fc, "conf_int"):
+        for lv in levels:
+            ci = np.asarray(fc.conf_int(alpha=1 - lv / 100), dtype=float)
+            bands[int(lv)] = (ci[:, 0].tolist(), ci[:, 1].tolist())
+    return dates, values, bands
+
 def ensure_medicine(db: Session, name: str, concentration: str | int, dosage_form: str, unit_measure: str, code: str | None = None) -> Medicine:
     conc = str(concentration)
     m = (db.query(Medicine)
@@ -53,20 +77,36 @@ def ensure_medicine(db: Session, name: str, concentration: str | int, dosage_for
                      dosage_form=dosage_form, unit_measure=unit_measure,
                      code=code)
         db.add(m); db.commit(); db.refresh(m)
+        search_index.invalidate()
     return m
 
-def predict_and_persist(db: Session, model_key: str, model, medicine: Medicine, periods: int, user_id: int | None):
-    dates, values = _extract_forecast(model, periods)
+def predict_and_persist(db: Session, model_key: str, model, medicine: Medicine, periods: int, user_id: int | None,
+                        precomputed: tuple[list, list] | None = None):
+    # precomputed: (fechas, valores) ya calculados (pronósticos precalculados); si no, en vivo
+    if precomputed is not None:
+        dates, values = precomputed
+    else:
+        t0 = time.perf_counter()
+        dates, values = _extract_forecast(model, periods)
+        forecast_seconds.observe(time.perf_counter() - t0, model_key)
+    ensure_partitions(db, "predicciones", {d.year for d in dates})
     out = []
-    for d, y in zip(dates, values):
+    for step, (d, y) in enumerate(zip(dates, values), start=1):
         p = Prediction(
             medicine_id=medicine.id,
             horizon_date=d,
             predicted_qty=y,
             model_name=model_key + ".pkl",
-            params={"source": "pkl"},
+            params={"source": "precalculado" if precomputed is not None else "pkl"},
             created_by=user_id,
+            step=step,
         )
         db.add(p); out.append((d, y))
-    db.commit()
+    # versión propia de predicciones: la de datos invalidaría los pronósticos precalculados
+    bump_prediction_versions(db, [medicine.id])
+    try:
+        db.commit()
+    except Exception:
+        forget_partitions("predicciones")  # la próxima escritura vuelve a consultar las particiones
+        raise
     return out
@@ -0,0 +1,240 @@
+"""
+Reportes cacheados por (tipo, filtros, versión de datos).
+- Hit: se devuelve el reporte ya generado (tabla reportes) sin recalcular.
+- Miss: se crea el registro en estado 'pending' y se genera en un pool en segundo plano;
+  el id del reporte es el id del trabajo.
+- Desalojo por antigüedad y por presupuesto de disco; al terminar una versión nueva,
+  las versiones anteriores del mismo (tipo, filtros) se desalojan.
+- Latido: el proceso que tiene trabajos encolados o en curso renueva latido_en cada
+  REPORT_HEARTBEAT_SECONDS. Los pending/running sin latido hace más de REPORT_STALE_MINUTES
+  (worker reiniciado o caído) pasan a 'error': no cuentan como hit y el próximo pedido los
+  regenera. Sus archivos no se tocan (los borra el desalojo por antigüedad); si el trabajo
+  igual termina, ve que ya no está 'running' y descarta lo suyo.
+- Un solo trabajo activo por clave entre procesos: índice único parcial en reportes
+  (uq_reportes_clave_activa); quien pierde la carrera del INSERT devuelve el del otro.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import func, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..db import SessionLocal
+from ..models.report import Report
+from . import report_service as rs
+
+# tipo de reporte -> secciones incluidas
+REPORT_TYPES = {
+    "export": ["historical", "forecast"],
+    "monthly": ["monthly", "forecast"],
+}
+ACTIVE = ("pending", "running", "done")
+
+_executor = ThreadPoolExecutor(max_workers=settings.REPORT_WORKERS, thread_name_prefix="report")
+_lock = threading.Lock()
+
+# trabajos encolados o en curso en este proceso (a los que este proceso les da latido)
+_owned: set[int] = set()
+_owned_lock = threading.Lock()
+_heartbeat: threading.Thread | None = None
+
+HEARTBEAT_SQL = """
+    UPDATE reportes SET latido_en = :now
+    WHERE id = ANY(CAST(:ids AS integer[])) AND estado IN ('pending', 'running')
+"""
+
+DATA_VERSION_SQL = """
+    SELECT COALESCE(SUM(version), 0), COALESCE(SUM(version_predicciones), 0), COUNT(*)
+    FROM versiones_datos
+    WHERE cardinality(CAST(:ids AS integer[])) = 0 OR medicamento_id = ANY(CAST(:ids AS integer[]))
+"""
+
+
+def _params(report_type: str, medicine_ids: list[int], date_from: date | None, date_to: date | None, fmt: str) -> dict:
+    return {
+        "type": report_type, "ids": sorted(set(medicine_ids)), "format": fmt,
+        "date_from": date_from.isoformat() if date_from else None,
+        "date_to": date_to.isoformat() if date_to else None,
+    }
+
+
+def _hash(obj) -> str:
+    return hashlib.sha256(json.dumps(obj, sort_keys=True).encode()).hexdigest()
+
+
+def data_version(db: Session, medicine_ids: list[int]) -> str:
+    """Versión agregada de los datos del filtro: cambia con cualquier ingesta o predicción."""
+    total, preds, n = db.execute(text(DATA_VERSION_SQL), {"ids": sorted(set(medicine_ids))}).one()
+    return f"{total}:{preds}:{n}"
+
+
+def _heartbeat_loop() -> None:
+    while True:
+        time.sleep(settings.REPORT_HEARTBEAT_SECONDS)
+        with _owned_lock:
+            ids = sorted(_owned)
+        if not ids:
+            continue
+        db = SessionLocal()
+        try:
+            db.execute(text(HEARTBEAT_SQL), {"now": datetime.utcnow(), "ids": ids})
+            db.commit()
+        except Exception as e:
+            print(f"[WARN] latido de reportes falló: {e}")
+        finally:
+            db.close()
+
+
+def _own(report_id: int) -> None:
+    global _heartbeat
+    with _owned_lock:
+        _owned.add(report_id)
+        if _heartbeat is None:
+            _heartbeat = threading.Thread(target=_heartbeat_loop, name="report-heartbeat", daemon=True)
+            _heartbeat.start()
+
+
+def expire_stale_jobs(db: Session) -> int:
+    """Marca como error los trabajos pending/running sin latido (worker reiniciado o caído)."""
+    cutoff = datetime.utcnow() - timedelta(minutes=settings.REPORT_STALE_MINUTES)
+    with _owned_lock:
+        mine = sorted(_owned)
+    q = (db.query(Report)
+           .filter(Report.cache_key.isnot(None), Report.status.in_(("pending", "running")),
+                   func.coalesce(Report.heartbeat_at, Report.created_at) < cutoff))
+    if mine:  # los de este proceso siguen vivos aunque el latido se haya atrasado
+        q = q.filter(Report.id.notin_(mine))
+    stale = q.all()
+    for r in stale:
+        r.status, r.error = "error", "trabajo abandonado (sin latido tras el límite de tiempo)"
+    if stale:
+        db.commit()
+    return len(stale)
+
+
+def request_report(db: Session, report_type: str, medicine_ids: list[int],
+                   date_from: date | None, date_to: date | None, fmt: str) -> tuple[Report, bool]:
+    """Devuelve (reporte, hit). En un miss encola la generación."""
+    params = _params(report_type, medicine_ids, date_from, date_to, fmt)
+    filters_hash = _hash(params)
+    version = data_version(db, medicine_ids)
+    key = _hash([filters_hash, version])
+
+    with _lock:
+        expire_stale_jobs(db)
+        r = (db.query(Report)
+               .filter(Report.cache_key == key, Report.status.in_(ACTIVE))
+               .order_by(Report.id.desc()).first())
+        if r is not None and r.status == "done" and not Path(r.file_path).exists():
+            r.status = "evicted"; db.commit()
+            r = None
+        if r is not None:
+            r.last_access = datetime.utcnow(); db.commit()
+            return r, True
+
+        r = Report(
+            title=f"{report_type} {version}", file_path=str(rs._new_path(fmt, f"cache_{report_type}")),
+            report_type=report_type, params=params, filters_hash=filters_hash, cache_key=key,
+            data_version=version, status="pending", heartbeat_at=datetime.utcnow(),
+        )
+        db.add(r)
+        try:
+            db.commit()
+        except IntegrityError:  # otro proceso encoló la misma clave entre la consulta y el INSERT
+            db.rollback()
+            r = db.query(Report).filter(Report.cache_key == key, Report.status.in_(ACTIVE)).first()
+            if r is None:
+                raise
+            return r, True
+        db.refresh(r)
+        _own(r.id)
+
+    _executor.submit(_run_job, r.id)
+    return r, False
+
+
+def _evict(db: Session, r: Report) -> None:
+    Path(r.file_path).unlink(missing_ok=True)
+    r.status = "evicted"
+
+
+def _transition(db: Session, report_id: int, src: str, **values) -> bool:
+    """Cambia de estado solo si sigue en `src` (pudo darse por abandonado mientras tanto)."""
+    n = (db.query(Report).filter(Report.id == report_id, Report.status == src)
+           .update(values, synchronize_session=False))
+    db.commit()
+    return n > 0
+
+
+def _run_job(report_id: int) -> None:
+    db = SessionLocal()
+    try:
+        if not _transition(db, report_id, "pending", status="running", heartbeat_at=datetime.utcnow()):
+            return
+        r = db.get(Report, report_id)
+        path, p = Path(r.file_path), r.params
+        try:
+            size = rs.write_report_file(
+                path, p["format"], p["ids"],
+                date.fromisoformat(p["date_from"]) if p["date_from"] else None,
+                date.fromisoformat(p["date_to"]) if p["date_to"] else None,
+                REPORT_TYPES[r.report_type],
+            )
+        except Exception as e:
+            db.rollback()
+            path.unlink(missing_ok=True)
+            _transition(db, report_id, "running", status="error", error=str(e)[:500])
+            print(f"[WARN] reporte {report_id} falló: {e}")
+            return
+
+        if not _transition(db, report_id, "running", status="done", size_bytes=size,
+                           completed_at=datetime.utcnow()):
+            path.unlink(missing_ok=True)  # dado por abandonado: el próximo pedido lo regenera
+            return
+        # versiones anteriores del mismo (tipo, filtros) quedaron obsoletas
+        for old in (db.query(Report)
+                      .filter(Report.filters_hash == r.filters_hash, Report.id != report_id, Report.status == "done")):
+            _evict(db, old)
+        db.commit()
+        evict_reports(db)
+    finally:
+        with _owned_lock:
+            _owned.discard(report_id)
+        db.close()
+
+
+def evict_reports(db: Session) -> int:
+    """Desaloja reportes cacheados por antigüedad y luego por presupuesto de disco (LRU)."""
+    expire_stale_jobs(db)
+    n = 0
+    cutoff = datetime.utcnow() - timedelta(hours=settings.REPORT_MAX_AGE_HOURS)
+    for r in (db.query(Report)
+                .filter(Report.cache_key.isnot(None), Report.status.in_(("done", "error")),
+                        Report.created_at < cutoff)):
+        _evict(db, r); n += 1
+    db.commit()
+
+    budget = settings.REPORT_DISK_BUDGET_MB * 1024 * 1024
+    used = (db.query(func.coalesce(func.sum(Report.size_bytes), 0))
+              .filter(Report.cache_key.isnot(None), Report.status == "done").scalar())
+    if used > budget:
+        lru = (db.query(Report)
+                 .filter(Report.cache_key.isnot(None), Report.status == "done")
+                 .order_by(func.coalesce(Report.last_access, Report.completed_at, Report.created_at)))
+        for r in lru:
+            if used <= budget:
+                break
+            used -= r.size_bytes or 0
+            _evict(db, r); n += 1
+        db.commit()
+    return n
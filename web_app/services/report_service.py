@@ -0,0 +1,156 @@
+"""
+Exportación de reportes (históricos + pronósticos) en streaming.
+Las filas salen de un cursor del lado del servidor (stream_results) en lotes,
+se escriben como CSV (generador) o XLSX write-only, y el archivo queda
+registrado en la tabla reportes.
+"""
+
+from __future__ import annotations
+
+from datetime import date, datetime
+from pathlib import Path
+from typing import Iterator
+
+from sqlalchemy import text
+
+from ..db import SessionLocal
+from ..models.report import Report
+from ..utils.export_utils import Section, stream_csv, write_xlsx
+
+REPORT_DIR = Path("storage/reports")
+BATCH_SIZE = 5000
+
+# mismo layout de columnas para históricos y pronósticos
+EXPORT_COLUMNS = [
+    "medicamento_id", "codigo", "nombre", "concentracion", "forma_farmaceutica", "unidad_medida",
+    "tipo", "fecha", "salidas_cantidad", "ingresos_cantidad", "saldos_totales_cantidad",
+    "cantidad_prevista", "modelo",
+]
+
+# {lo}: límite inferior (la sección mensual lo trunca al día 1 para no perder el mes inicial)
+_FILTER = """
+    (cardinality(CAST(:ids AS integer[])) = 0 OR m.id = ANY(CAST(:ids AS integer[])))
+    AND (CAST(:df AS date) IS NULL OR {d} >= {lo})
+    AND (CAST(:dt AS date) IS NULL OR {d} <= CAST(:dt AS date))
+"""
+_DF = "CAST(:df AS date)"
+_DF_MONTH = "CAST(date_trunc('month', CAST(:df AS date)) AS date)"
+
+HIST_SQL = """
+    SELECT m.id, m.codigo, m.nombre, m.concentracion, m.forma_farmaceutica, m.unidad_medida,
+           'historico', h.fecha, h.salidas_cantidad, h.ingresos_cantidad, h.saldos_totales_cantidad,
+           NULL::double precision, NULL::varchar
+    FROM historicos h
+    JOIN medicamentos m ON m.id = h.medicamento_id
+    WHERE """ + _FILTER.format(d="h.fecha", lo=_DF) + """
+    ORDER BY m.id, h.fecha
+"""
+
+FORECAST_SQL = """
+    SELECT m.id, m.codigo, m.nombre, m.concentracion, m.forma_farmaceutica, m.unidad_medida,
+           'pronostico', p.fecha_objetivo, NULL::double precision, NULL::double precision, NULL::double precision,
+           p.cantidad_prevista, p.modelo
+    FROM predicciones p
+    JOIN medicamentos m ON m.id = p.medicamento_id
+    WHERE """ + _FILTER.format(d="p.fecha_objetivo", lo=_DF) + """
+    ORDER BY m.id, p.fecha_objetivo, p.id
+"""
+
+
+# reporte mensual de consumo: sale del resumen historicos_mensuales (mes = día 1)
+MONTHLY_SQL = """
+    SELECT m.id, m.codigo, m.nombre, m.concentracion, m.forma_farmaceutica, m.unidad_medida,
+           'mensual', hm.mes, hm.salidas_cantidad, hm.ingresos_cantidad, hm.saldo_cierre_cantidad,
+           NULL::double precision, NULL::varchar
+    FROM historicos_mensuales hm
+    JOIN medicamentos m ON m.id = hm.medicamento_id
+    WHERE """ + _FILTER.format(d="hm.mes", lo=_DF_MONTH) + """
+    ORDER BY m.id, hm.mes
+"""
+
+
+def _stream_rows(sql: str, params: dict, batch_size: int = BATCH_SIZE) -> Iterator[list]:
+    """Lotes de filas desde un cursor del servidor; la sesión es propia (vive lo que dura el stream)."""
+    db = SessionLocal()
+    result = None
+    try:
+        conn = db.connection(execution_options={"stream_results": True, "max_row_buffer": batch_size})
+        result = conn.execute(text(sql), params)
+        for part in result.partitions(batch_size):
+            yield part
+    finally:
+        # corte o error a mitad del stream: cerrar el cursor del servidor antes de soltar la sesión
+        if result is not None:
+            result.close()
+        db.close()
+
+
+def build_sections(medicine_ids: list[int], date_from: date | None, date_to: date | None,
+                   include: list[str]) -> list[Section]:
+    params = {"ids": list(medicine_ids), "df": date_from, "dt": date_to}
+    sections = []
+    if "historical" in include:
+        sections.append(Section("historicos", EXPORT_COLUMNS, _stream_rows(HIST_SQL, params)))
+    if "monthly" in include:
+        sections.append(Section("mensual", EXPORT_COLUMNS, _stream_rows(MONTHLY_SQL, params)))
+    if "forecast" in include:
+        sections.append(Section("pronosticos", EXPORT_COLUMNS, _stream_rows(FORECAST_SQL, params)))
+    return sections
+
+
+def _new_path(fmt: str, prefix: str = "export") -> Path:
+    REPORT_DIR.mkdir(parents=True, exist_ok=True)
+    return REPORT_DIR / f"{prefix}_{datetime.utcnow():%Y%m%d_%H%M%S_%f}.{fmt}"
+
+
+def record_report(title: str, path: Path) -> Report:
+    db = SessionLocal()
+    try:
+        r = Report(title=title, file_path=str(path))
+        db.add(r); db.commit(); db.refresh(r)
+        return r
+    finally:
+        db.close()
+
+
+def export_csv_stream(title: str, medicine_ids: list[int], date_from: date | None, date_to: date | None,
+                      include: list[str]) -> tuple[Iterator[bytes], Path]:
+    """
+    Generador CSV que además deja copia en disco; se registra en reportes al terminar.
+    Si el cliente corta, quien lo sirve debe cerrarlo (close_quietly(gen)): así se liberan los
+    cursores de _stream_rows en el momento y se borra el archivo a medias, sin esperar al recolector.
+    """
+    path = _new_path("csv")
+
+    def gen():
+        done = False
+        try:
+            yield from stream_csv(EXPORT_COLUMNS, build_sections(medicine_ids, date_from, date_to, include), tee=path)
+            done = True
+        finally:
+            if done:
+                record_report(title, path)
+            else:  # cliente cortó: no dejar archivos a medias
+                path.unlink(missing_ok=True)
+
+    return gen(), path
+
+
+def write_report_file(path: Path, fmt: str, medicine_ids: list[int], date_from: date | None,
+                      date_to: date | None, include: list[str]) -> int:
+    """Genera el archivo completo en disco (para trabajos en segundo plano). Devuelve bytes escritos."""
+    sections = build_sections(medicine_ids, date_from, date_to, include)
+    if fmt == "xlsx":
+        write_xlsx(path, sections)
+    else:
+        for _ in stream_csv(EXPORT_COLUMNS, sections, tee=path):
+            pass
+    return path.stat().st_size
+
+
+def export_xlsx(title: str, medicine_ids: list[int], date_from: date | None, date_to: date | None,
+                include: list[str]) -> tuple[Path, Report]:
+    """XLSX escrito completo a disco (no en streaming) y registrado; luego se envía el archivo."""
+    path = _new_path("xlsx")
+    write_xlsx(path, build_sections(medicine_ids, date_from, date_to, include))
+    return path, record_report(title, path)
@@ -0,0 +1,162 @@
+"""
+Búsqueda de medicamentos (autocompletado) con un índice en memoria.
+- Texto plegado: sin acentos, minúsculas, espacios simples ("Paracetamol (Acetaminofén)"
+  -> "paracetamol (acetaminofen)").
+- Prefijos: lista ordenada de (token, fila) + bisect, un rango por token de la consulta;
+  el bonus por prefijo del nombre sale igual, de los nombres ordenados + bisect.
+- Trigramas: posting lists en arreglos NumPy; la similitud (Jaccard de trigramas) de
+  todo el catálogo sale de un np.bincount, tolera errores de tipeo.
+- Se reconstruye al cambiar el catálogo: invalidate() tras la ingesta en este proceso y,
+  para otros procesos/scripts, una firma (count, max(id), md5 de los atributos) revisada
+  cada SEARCH_INDEX_CHECK_SECONDS: detecta también ediciones y ON CONFLICT UPDATE.
+- Un solo hilo reconstruye a la vez; los demás esperan el índice nuevo (no buscan en uno vacío).
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models.medicine import Medicine
+
+SIGNATURE_SQL = """
+    SELECT COUNT(*), MAX(id),
+           md5(string_agg(concat_ws('|', id, codigo, nombre, concentracion, forma_farmaceutica, unidad_medida),
+                          E'\\n' ORDER BY id))
+    FROM medicamentos
+"""
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)?")
+
+
+def fold(s) -> str:
+    s = unicodedata.normalize("NFD", str(s or ""))
+    s = "".join(c for c in s if unicodedata.category(c) != "Mn")
+    return " ".join(s.lower().split())
+
+
+def trigrams(s: str) -> set[str]:
+    s = f"  {s} "
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+class SearchIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows: list[tuple] = []           # (id, code, name, concentration, dosage_form, unit_measure)
+        self._names: list[str] = []            # nombres plegados ordenados (bonus por prefijo del nombre)
+        self._name_rows = None                 # fila de cada nombre (np.ndarray paralelo)
+        self._tokens: list[str] = []            # tokens ordenados
+        self._token_rows = None                # fila de cada token (np.ndarray paralelo)
+        self._postings: dict = {}              # trigrama -> np.ndarray de filas
+        self._ntri = None                      # trigramas por fila (para Jaccard)
+        self._signature = None
+        self._checked = 0.0
+        self._generation = 0                   # sube con cada invalidate()
+        self._built = -1                       # generación con la que se armó el índice
+        self._build_lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        self._generation += 1
+
+    def _build(self, rows) -> None:
+        import numpy as np
+        names, tokens, post, ntri = [], [], {}, []
+        for i, (mid, code, n, c, f, u) in enumerate(rows):
+            text = fold(f"{n} {c} {f} {u} {code or ''}")
+            names.append(fold(n))
+            tokens.extend((t, i) for t in set(_TOKEN.findall(text)))
+            tri = trigrams(text)
+            ntri.append(len(tri))
+            for t in tri:
+                post.setdefault(t, []).append(i)
+        tokens.sort()
+        by_name = sorted((nm, i) for i, nm in enumerate(names))
+        postings = {t: np.asarray(v, dtype=np.int32) for t, v in post.items()}
+        with self._lock:
+            self._rows = rows
+            self._names = [nm for nm, _ in by_name]
+            self._name_rows = np.asarray([i for _, i in by_name], dtype=np.int32)
+            self._tokens = [t for t, _ in tokens]
+            self._token_rows = np.asarray([i for _, i in tokens], dtype=np.int32)
+            self._postings, self._ntri = postings, np.asarray(ntri, dtype=np.float64)
+
+    def ensure_fresh(self, db: Session) -> None:
+        if self._built == self._generation and time.monotonic() - self._checked < settings.SEARCH_INDEX_CHECK_SECONDS:
+            return
+        with self._build_lock:
+            now = time.monotonic()
+            gen = self._generation
+            if self._built == gen and now - self._checked < settings.SEARCH_INDEX_CHECK_SECONDS:
+                return  # otro hilo lo acaba de reconstruir
+            sig = tuple(db.execute(text(SIGNATURE_SQL)).one())
+            self._checked = now
+            if self._built == gen and sig == self._signature:
+                return
+            rows = db.query(Medicine.id, Medicine.code, Medicine.name, Medicine.concentration,
+                            Medicine.dosage_form, Medicine.unit_measure).order_by(Medicine.id).all()
+            self._build([tuple(r) for r in rows])
+            # recién ahora queda fresco; un invalidate() durante el armado fuerza otra vuelta
+            self._signature, self._built = sig, gen
+
+    def search(self, q: str, limit: int = 20) -> list[tuple[float, tuple]]:
+        """[(puntaje, fila)] ordenado: todos los tokens por prefijo > prefijo del nombre > trigramas."""
+        import numpy as np
+        with self._lock:
+            rows, tokens, token_rows = self._rows, self._tokens, self._token_rows
+            names, name_rows = self._names, self._name_rows
+            postings, ntri = self._postings, self._ntri
+        n = len(rows)
+        qf = fold(q)
+        if not n or not qf:
+            return []
+
+        score = np.zeros(n)
+        # 1) cada token de la consulta como prefijo de algún token de la fila
+        qtokens = _TOKEN.findall(qf)
+        matched = np.zeros(n, dtype=np.int32)
+        for t in qtokens:
+            # rango [lo, hi) de tokens que empiezan con t
+            lo, hi = bisect_left(tokens, t), bisect_left(tokens, t + "\uffff")
+            hit = np.zeros(n, dtype=bool)
+            hit[token_rows[lo:hi]] = True
+            matched += hit
+        if qtokens:
+            score += matched / len(qtokens)
+            score += (matched == len(qtokens))  # todos los tokens presentes
+
+        # 2) similitud de trigramas (errores de tipeo, palabras incompletas en el medio)
+        qtri = [t for t in trigrams(qf) if t in postings]
+        if qtri:
+            shared = np.bincount(np.concatenate([postings[t] for t in qtri]), minlength=n)
+            score += shared / (len(trigrams(qf)) + ntri - shared)
+
+        ok = score > 0.15
+        cand = np.flatnonzero(ok)
+        if not len(cand):
+            return []
+        # 3) bonus a los candidatos cuyo nombre empieza con la consulta (un rango de nombres ordenados)
+        lo, hi = bisect_left(names, qf), bisect_left(names, qf + "\uffff")
+        bonus = np.zeros(n, dtype=bool)
+        bonus[name_rows[lo:hi]] = True
+        score[bonus & ok] += 0.5
+        sc = score[cand]
+        if len(cand) > limit:  # top-k sin ordenar todo el catálogo (tokens comunes como "mg")
+            cut = np.partition(sc, len(sc) - limit)[len(sc) - limit]
+            keep = np.flatnonzero(sc >= cut)  # con empates en el corte, el mismo orden que ordenando todo
+            cand, sc = cand[keep], sc[keep]
+        top = cand[np.argsort(-sc, kind="stable")[:limit]]
+        return [(float(score[i]), rows[i]) for i in top]
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+search_index = SearchIndex()
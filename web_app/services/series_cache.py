@@ -0,0 +1,126 @@
+"""
+Caché en memoria de series históricas por medicamento.
+- Carga fecha/salidas/ingresos/saldo directo a arreglos NumPy con un cursor crudo
+  (sin crear un objeto ORM por fila).
+- Registros compactos con __slots__ y desalojo LRU por presupuesto de bytes.
+- Cada entrada se etiqueta con la versión de datos del medicamento (versiones_datos):
+  si la versión leída de la BD cambió (ingesta en cualquier proceso), se recarga.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+
+from sqlalchemy.orm import Session
+
+from ..config import settings
+
+SERIES_SQL = """
+    SELECT (fecha - DATE '1970-01-01') AS dia,
+           salidas_cantidad, ingresos_cantidad, saldos_totales_cantidad
+    FROM historicos
+    WHERE medicamento_id = %s
+    ORDER BY fecha
+"""
+
+
+class SeriesEntry:
+    """Serie de un medicamento en arreglos contiguos (dates: datetime64[D], resto float64, NaN = nulo)."""
+    __slots__ = ("medicine_id", "version", "dates", "outflow", "inflow", "balance", "nbytes")
+
+    def __init__(self, medicine_id: int, version, dates, outflow, inflow, balance):
+        self.medicine_id = medicine_id
+        self.version = version
+        self.dates = dates
+        self.outflow = outflow
+        self.inflow = inflow
+        self.balance = balance
+        self.nbytes = dates.nbytes + outflow.nbytes + inflow.nbytes + balance.nbytes
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def bounds(self, date_from=None, date_to=None) -> tuple[int, int]:
+        """Índices [lo, hi) del rango de fechas (búsqueda binaria sobre fechas ordenadas)."""
+        import numpy as np
+        lo = int(np.searchsorted(self.dates, np.datetime64(date_from, "D"), "left")) if date_from else 0
+        hi = int(np.searchsorted(self.dates, np.datetime64(date_to, "D"), "right")) if date_to else len(self.dates)
+        return lo, max(lo, hi)
+
+
+def _load(db: Session, medicine_id: int, version) -> SeriesEntry:
+    import numpy as np  # import diferido: no se paga en el arranque
+
+    cur = db.connection().connection.cursor()
+    try:
+        cur.execute(SERIES_SQL, (medicine_id,))
+        rows = cur.fetchall()
+    finally:
+        cur.close()
+
+    # una sola conversión en C: None -> NaN
+    arr = np.array(rows, dtype=np.float64).reshape(-1, 4)
+    dates = arr[:, 0].astype(np.int64).view("datetime64[D]")
+    return SeriesEntry(
+        medicine_id, version, dates,
+        np.ascontiguousarray(arr[:, 1]),
+        np.ascontiguousarray(arr[:, 2]),
+        np.ascontiguousarray(arr[:, 3]),
+    )
+
+
+class SeriesCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[int, SeriesEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self, medicine_ids=None) -> None:
+        """Desaloja entradas ya (la versión de BD las invalidaría igual en el próximo acceso)."""
+        with self._lock:
+            if medicine_ids is None:
+                self._entries.clear()
+                self._bytes = 0
+                return
+            for mid in medicine_ids:
+                e = self._entries.pop(mid, None)
+                if e is not None:
+                    self._bytes -= e.nbytes
+
+    def get(self, db: Session, medicine_id: int, version: int) -> SeriesEntry:
+        with self._lock:
+            e = self._entries.get(medicine_id)
+            if e is not None and e.version == version:
+                self._entries.move_to_end(medicine_id)
+                self.hits += 1
+                return e
+            self.misses += 1
+
+        e = _load(db, medicine_id, version)
+        with self._lock:
+            if e.nbytes > self.max_bytes:
+                return e
+            old = self._entries.get(medicine_id)
+            # no pisar una entrada más nueva cargada en paralelo
+            if old is not None and old.version > version:
+                return e
+            if old is not None:
+                del self._entries[medicine_id]
+                self._bytes -= old.nbytes
+            self._entries[medicine_id] = e
+            self._bytes += e.nbytes
+            while self._bytes > self.max_bytes and self._entries:
+                _, ev = self._entries.popitem(last=False)
+                self._bytes -= ev.nbytes
+        return e
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses}
+
+
+series_cache = SeriesCache(settings.SERIES_CACHE_MAX_BYTES)
@@ -0,0 +1,190 @@
+"""
+Probabilidad de quiebre de stock por simulación Monte Carlo.
+- De cada ARIMA/SARIMA (statsmodels) se toman los parámetros AR/MA (también estacionales),
+  la diferenciación (d, D) y sigma2, y se calculan los pesos psi de la representación MA(∞):
+  el error de pronóstico a h pasos es sum_{j<h} psi_j * e_{T+h-j}.
+- Los caminos se generan en lote: eps ~ N(0, sigma2) de forma (caminos, H) multiplicado por la
+  matriz Toeplitz triangular de psi, más la media del pronóstico (precalculado si está al día).
+- Se parte del último saldos_totales_cantidad de historicos; quiebre en el mes h si la
+  demanda acumulada supera ese saldo (no se modelan compras futuras).
+El catálogo se simula por bloques de medicamentos en hilos (NumPy suelta el GIL).
+"""
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models_loader import build_model_basename
+from .forecast_store import get_stored
+from .prediction_service import _extract_forecast
+
+if TYPE_CHECKING:
+    import numpy as np
+
+QUANTILES = (0.05, 0.5, 0.95)
+
+LAST_BALANCE_SQL = """
+    SELECT DISTINCT ON (medicamento_id) medicamento_id, fecha, saldos_totales_cantidad
+    FROM historicos
+    WHERE medicamento_id = ANY(CAST(:ids AS integer[])) AND saldos_totales_cantidad IS NOT NULL
+    ORDER BY medicamento_id, fecha DESC
+"""
+
+
+class UnsupportedModel(ValueError):
+    """El modelo no expone parámetros ARIMA (solo forecast/predict)."""
+
+
+def psi_weights(model, horizon: int) -> tuple["np.ndarray", float]:
+    """Pesos psi_0..psi_{H-1} del modelo integrado y varianza de la innovación."""
+    import numpy as np
+    from numpy.polynomial import polynomial as P
+
+    spec = getattr(model, "model", None)
+    order = getattr(spec, "order", None)
+    if order is None or not hasattr(model, "arparams"):
+        raise UnsupportedModel("el modelo no es ARIMA/SARIMA de statsmodels")
+    _, d, _ = order
+    _, D, _, s = getattr(spec, "seasonal_order", (0, 0, 0, 0)) or (0, 0, 0, 0)
+
+    def lagged(coefs, step, sign):
+        poly = np.zeros(len(coefs) * step + 1)
+        poly[0] = 1.0
+        poly[step::step] = sign * np.asarray(coefs, dtype=float)
+        return poly
+
+    ar = P.polymul(lagged(model.arparams, 1, -1), lagged(getattr(model, "seasonalarparams", []), s or 1, -1))
+    for _ in range(d):
+        ar = P.polymul(ar, [1.0, -1.0])
+    for _ in range(D):
+        ar = P.polymul(ar, lagged([1.0], s, -1))
+    ma = P.polymul(lagged(model.maparams, 1, 1), lagged(getattr(model, "seasonalmaparams", []), s or 1, 1))
+
+    psi = np.zeros(horizon)
+    psi[0] = 1.0
+    for j in range(1, horizon):
+        acc = ma[j] if j < len(ma) else 0.0
+        k = min(j, len(ar) - 1)
+        acc -= np.dot(ar[1:k + 1], psi[j - 1::-1][:k])
+        psi[j] = acc
+
+    params = dict(zip(getattr(model, "param_names", []), np.asarray(model.params, dtype=float)))
+    sigma2 = params.get("sigma2")
+    if sigma2 is None or not np.isfinite(sigma2):
+        sigma2 = float(np.nanvar(np.asarray(model.resid, dtype=float)))
+    return psi, float(sigma2)
+
+
+def _toeplitz(psi: "np.ndarray") -> "np.ndarray":
+    """T[j, h] = psi_{h-j} para j <= h: errores = eps @ T."""
+    import numpy as np
+    H = len(psi)
+    idx = np.arange(H)
+    lag = idx[None, :] - idx[:, None]
+    return np.where(lag >= 0, psi[np.clip(lag, 0, None)], 0.0)
+
+
+def simulate_block(mean: "np.ndarray", T: "np.ndarray", sigma: "np.ndarray", stock0: "np.ndarray",
+                   n_paths: int, rng) -> dict:
+    """
+    Bloque de B medicamentos a la vez. mean (B,H), T (B,H,H), sigma (B,), stock0 (B,).
+    Devuelve p_stockout (B,H) y cuantiles de demanda y saldo (Q,B,H).
+    """
+    import numpy as np
+    B, H = mean.shape
+    eps = rng.standard_normal((B, n_paths, H)) * sigma[:, None, None]
+    demand = np.maximum(mean[:, None, :] + eps @ T, 0.0)          # (B,N,H)
+    balance = stock0[:, None, None] - np.cumsum(demand, axis=2)    # (B,N,H)
+    return {
+        "p_stockout": (balance < 0).mean(axis=1),
+        "demand_q": np.quantile(demand, QUANTILES, axis=1),
+        "balance_q": np.quantile(balance, QUANTILES, axis=1),
+    }
+
+
+def _prepare(db: Session, registry, medicines, horizon: int):
+    """(medicamento, clave, fechas, media, psi, sigma2) para los que tienen modelo ARIMA."""
+    import numpy as np
+    ready, skipped = [], []
+    for mid, n, c, f, u in medicines:
+        key = build_model_basename(n, c, f, u)
+        model = registry.get(key)
+        if model is None:
+            continue
+        try:
+            psi, sigma2 = psi_weights(model, horizon)
+        except UnsupportedModel as e:
+            skipped.append({"id": mid, "model": key + ".pkl", "reason": str(e)})
+            continue
+        stored = get_stored(db, mid, registry.version(key))
+        if stored is not None and stored.horizon >= horizon:
+            dates, mean = stored.dates[:horizon], stored.mean[:horizon]
+        else:
+            dates, mean = _extract_forecast(model, horizon)
+        ready.append((mid, key, dates, np.asarray(mean, dtype=float), psi, sigma2))
+    return ready, skipped
+
+
+def simulate(db: Session, registry, medicines, horizon: int | None = None,
+             n_paths: int | None = None, seed: int | None = None) -> dict:
+    """
+    medicines: iterable de (id, nombre, concentración, forma, unidad).
+    Devuelve resultados por medicamento con probabilidad de quiebre y cuantiles por mes.
+    """
+    import numpy as np
+
+    horizon = horizon or settings.FORECAST_HORIZON
+    n_paths = n_paths or settings.STOCKOUT_PATHS
+    ready, skipped = _prepare(db, registry, list(medicines), horizon)
+    if not ready:
+        return {"horizon": horizon, "paths": n_paths, "results": [], "skipped": skipped}
+
+    ids = [r[0] for r in ready]
+    last = {mid: (d, s) for mid, d, s in db.execute(text(LAST_BALANCE_SQL), {"ids": ids})}
+    # sin saldo registrado no hay desde dónde simular: con 0 saldría p≈1 en todos los meses
+    skipped += [{"id": r[0], "model": r[1] + ".pkl", "reason": "sin saldo registrado (saldos_totales_cantidad)"}
+                for r in ready if r[0] not in last]
+    ready = [r for r in ready if r[0] in last]
+    if not ready:
+        return {"horizon": horizon, "paths": n_paths, "results": [], "skipped": skipped}
+
+    # bloques de medicamentos: el presupuesto de memoria (B*N*H floats) es por llamada,
+    # así que se reparte entre los hilos que corren a la vez
+    workers = min(len(ready), os.cpu_count() or 1)
+    block = max(1, settings.STOCKOUT_BLOCK_ELEMENTS // (workers * n_paths * horizon))
+    chunks = [ready[i:i + block] for i in range(0, len(ready), block)]
+    workers = min(workers, len(chunks))
+    rngs = [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(len(chunks))]
+
+    def run(chunk, rng):
+        mean = np.stack([r[3] for r in chunk])
+        T = np.stack([_toeplitz(r[4]) for r in chunk])
+        sigma = np.sqrt([r[5] for r in chunk])
+        stock0 = np.array([last[r[0]][1] for r in chunk], dtype=float)
+        return simulate_block(mean, T, sigma, stock0, n_paths, rng)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        outs = list(pool.map(run, chunks, rngs))
+
+    results = []
+    for chunk, out in zip(chunks, outs):
+        for b, (mid, key, dates, mean, _, _) in enumerate(chunk):
+            as_of, stock0 = last[mid]
+            p = out["p_stockout"][b]
+            first = next((dates[h] for h in range(horizon) if p[h] >= 0.5), None)
+            results.append({
+                "id": mid, "model": key + ".pkl", "stock": stock0, "stock_as_of": as_of,
+                "first_month_p50": first,
+                "months": [{
+                    "date": dates[h], "mean_demand": float(mean[h]), "p_stockout": float(p[h]),
+                    **{f"demand_q{int(q * 100):02d}": float(out["demand_q"][i, b, h]) for i, q in enumerate(QUANTILES)},
+                    **{f"balance_q{int(q * 100):02d}": float(out["balance_q"][i, b, h]) for i, q in enumerate(QUANTILES)},
+                } for h in range(horizon)],
+            })
+    return {"horizon": horizon, "paths": n_paths, "results": results, "skipped": skipped}
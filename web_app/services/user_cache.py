@@ -0,0 +1,98 @@
+"""
+Caché TTL de usuarios activos por subject del JWT (correo) y versión de token.
+Evita un SELECT de usuarios en cada request autenticado; se invalida al crear,
+desactivar o cambiar el rol de un usuario (en este proceso).
+- Versión de token: cambiar rol o estado sube usuarios.version_token y los tokens nuevos
+  llevan el claim "ver". Un token más nuevo que la copia en caché fuerza releer la BD
+  (también en otros workers); uno más viejo que el usuario queda revocado. En otros
+  workers, un token viejo sigue valiendo solo hasta que vence el TTL de su copia.
+- Generación por subject: invalidate la sube y put descarta la fila si cambió entre la
+  lectura y el put (evita volver a cachear un rol viejo leído antes de la invalidación).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+
+from ..config import settings
+from ..models.user import Role, User
+
+
+@dataclass(frozen=True, slots=True)
+class AuthUser:
+    """Copia inmutable del usuario (segura entre sesiones y threads)."""
+    id: int
+    email: str
+    full_name: str | None
+    role: Role
+    is_active: bool
+    token_version: int = 0
+
+    @classmethod
+    def from_model(cls, u: User) -> "AuthUser":
+        return cls(id=u.id, email=u.email, full_name=u.full_name, role=u.role, is_active=bool(u.is_active),
+                   token_version=u.token_version or 0)
+
+    def accepts(self, ver: int) -> bool:
+        """Usuario activo y token no revocado (emitido con la versión vigente o posterior)."""
+        return self.is_active and ver >= self.token_version
+
+
+def token_version(payload: dict) -> int:
+    """Claim "ver" del JWT (tokens previos a la columna: 0)."""
+    try:
+        return int(payload.get("ver", 0))
+    except (TypeError, ValueError):
+        return -1
+
+
+class UserCache:
+    def __init__(self, ttl_seconds: float, max_entries: int = 10_000):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._items: dict[str, tuple[float, AuthUser]] = {}
+        self._gens: dict[str, int] = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, sub: str, ver: int = 0) -> AuthUser | None:
+        item = self._items.get(sub)
+        if item is None or item[0] < time.monotonic() or item[1].token_version < ver:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return item[1]
+
+    def generation(self, sub: str) -> tuple[int, int]:
+        """Tomar antes de leer la BD y pasarla a put."""
+        return self._epoch, self._gens.get(sub, 0)
+
+    def put(self, u: AuthUser, gen: tuple[int, int] | None = None) -> AuthUser:
+        if self.ttl <= 0:
+            return u
+        with self._lock:
+            if gen is not None and gen != (self._epoch, self._gens.get(u.email, 0)):
+                return u  # invalidado mientras se leía: no cachear la copia vieja
+            if len(self._items) >= self.max_entries:
+                now = time.monotonic()
+                self._items = {k: v for k, v in self._items.items() if v[0] >= now}
+                if len(self._items) >= self.max_entries:
+                    self._items.clear()
+            self._items[u.email] = (time.monotonic() + self.ttl, u)
+        return u
+
+    def invalidate(self, sub: str | None = None) -> None:
+        with self._lock:
+            if sub is None:
+                self._items.clear()
+                self._epoch += 1
+            else:
+                self._items.pop(sub, None)
+                self._gens[sub] = self._gens.get(sub, 0) + 1
+
+
+user_cache = UserCache(settings.USER_CACHE_TTL_SECONDS)
@@ -0,0 +1,73 @@
+"""
+Versiones de datos por medicamento (tabla versiones_datos).
+"""
+
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+BUMP_SQL = """
+    INSERT INTO versiones_datos (medicamento_id, version, actualizado_en)
+    SELECT DISTINCT t.mid, 1, now() AT TIME ZONE 'utc'
+    FROM unnest(CAST(:mids AS integer[])) AS t(mid)
+    ORDER BY t.mid
+    ON CONFLICT (medicamento_id) DO UPDATE SET
+      version        = versiones_datos.version + 1,
+      actualizado_en = EXCLUDED.actualizado_en
+"""
+
+BUMP_PREDICTIONS_SQL = """
+    INSERT INTO versiones_datos (medicamento_id, version, version_predicciones, actualizado_en)
+    SELECT DISTINCT t.mid, 0, 1, now() AT TIME ZONE 'utc'
+    FROM unnest(CAST(:mids AS integer[])) AS t(mid)
+    ORDER BY t.mid
+    ON CONFLICT (medicamento_id) DO UPDATE SET
+      version_predicciones = COALESCE(versiones_datos.version_predicciones, 0) + 1,
+      actualizado_en       = EXCLUDED.actualizado_en
+"""
+
+# {col}: versión que identifica la respuesta (datos históricos o predicciones)
+RESOLVE_SQL = """
+    SELECT m.id, COALESCE({col}, 0), v.actualizado_en
+    FROM medicamentos m
+    LEFT JOIN versiones_datos v ON v.medicamento_id = m.id
+    WHERE m.nombre = :n AND m.concentracion = :c
+      AND m.forma_farmaceutica = :f AND m.unidad_medida = :u
+    LIMIT 1
+"""
+
+def bump_versions(db: Session, medicine_ids) -> None:
+    """Incrementa la versión de los medicamentos dados. No hace commit (va en la transacción del escritor)."""
+    mids = sorted({int(m) for m in medicine_ids})
+    if mids:
+        db.execute(text(BUMP_SQL), {"mids": mids})
+
+def bump_prediction_versions(db: Session, medicine_ids) -> None:
+    """Como bump_versions, pero para predicciones guardadas (no toca la versión de datos)."""
+    mids = sorted({int(m) for m in medicine_ids})
+    if mids:
+        db.execute(text(BUMP_PREDICTIONS_SQL), {"mids": mids})
+
+def _resolve(db: Session, col: str, name: str, concentration: str, dosage_form: str, unit_measure: str):
+    sql = RESOLVE_SQL.format(col=col)
+    row = db.execute(text(sql), {"n": name, "c": concentration, "f": dosage_form, "u": unit_measure}).first()
+    return tuple(row) if row else None
+
+def resolve_with_version(db: Session, name: str, concentration: str, dosage_form: str,
+                         unit_measure: str) -> tuple[int, int, datetime | None] | None:
+    """(id, versión, actualizado_en) del medicamento por sus 4 atributos, en una sola consulta."""
+    return _resolve(db, "v.version", name, concentration, dosage_form, unit_measure)
+
+def resolve_with_prediction_version(db: Session, name: str, concentration: str, dosage_form: str,
+                                    unit_measure: str) -> tuple[int, int, datetime | None] | None:
+    """Igual que resolve_with_version, con la versión de predicciones (para /visualize/predictions)."""
+    return _resolve(db, "v.version_predicciones", name, concentration, dosage_form, unit_measure)
+
+def get_versions(db: Session, medicine_ids) -> dict[int, int]:
+    mids = sorted({int(m) for m in medicine_ids})
+    if not mids:
+        return {}
+    rows = db.execute(text("SELECT medicamento_id, version FROM versiones_datos WHERE medicamento_id = ANY(CAST(:mids AS integer[]))"),
+                      {"mids": mids})
+    return {mid: 0 for mid in mids} | {mid: v for mid, v in rows}
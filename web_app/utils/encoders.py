@@ -0,0 +1,120 @@
+"""
+Codificación de series por negociación de contenido:
+- json     : filas (forma original de los endpoints)
+- columns  : JSON por columnas (arreglos paralelos)
+- arrow    : Apache Arrow IPC stream (requiere pyarrow)
+- csv      : texto CSV
+Las columnas pueden venir como listas o arreglos NumPy (fechas datetime64[D], NaN = nulo).
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+from datetime import date
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+try:  # serializador rápido opcional
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def _is_array(col) -> bool:
+    # sin importar numpy: cualquier ndarray expone dtype y tolist
+    return hasattr(col, "dtype") and hasattr(col, "tolist")
+
+FORMATS = {
+    "json": "application/json",
+    "columns": "application/vnd.columns+json",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "csv": "text/csv",
+}
+
+
+def negotiate(accept: str | None, fmt: str | None = None) -> str:
+    """El parámetro ?format= tiene prioridad; si no, se usa el header Accept (json por defecto)."""
+    if fmt:
+        if fmt not in FORMATS:
+            raise HTTPException(status_code=406, detail=f"Formato no soportado: {fmt}. Usa {list(FORMATS)}")
+        return fmt
+    for part in (accept or "").split(","):
+        mt = part.split(";")[0].strip().lower()
+        for k, v in FORMATS.items():
+            if mt == v:
+                return k
+    return "json"
+
+
+def _plain_col(col) -> list:
+    """Columna -> lista Python (fechas ISO, NaN -> None)."""
+    if not _is_array(col):
+        return col
+    if col.dtype.kind == "M":
+        return col.astype("datetime64[D]").astype(str).tolist()
+    if col.dtype.kind == "f":
+        return [None if x != x else x for x in col.tolist()]
+    return col.tolist()
+
+
+def _json_col(col):
+    # con orjson los arreglos numéricos se serializan directo desde memoria (NaN -> null)
+    if orjson is not None and _is_array(col) and col.dtype.kind in "fiu":
+        return col
+    return _plain_col(col)
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=lambda o: o.isoformat() if isinstance(o, date) else str(o)).encode()
+
+
+def _to_rows(cols: dict) -> list[dict]:
+    keys = list(cols)
+    return [dict(zip(keys, vals)) for vals in zip(*(_plain_col(c) for c in cols.values()))]
+
+
+def _arrow_bytes(cols: dict) -> bytes:
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise HTTPException(status_code=406, detail="Formato arrow no disponible (falta pyarrow)")
+    table = pa.table({k: (pa.array(v, from_pandas=True) if _is_array(v) else pa.array(v))
+                      for k, v in cols.items()})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as w:
+        w.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _csv_bytes(cols: dict) -> bytes:
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(list(cols))
+    w.writerows(["" if v is None else v for v in row] for row in zip(*(_plain_col(c) for c in cols.values())))
+    return buf.getvalue().encode()
+
+
+def columns_response(cols: dict, fmt: str, meta: dict | None = None, rows_key: str | None = "items") -> Response:
+    """
+    Codifica un conjunto de columnas paralelas según `fmt`.
+    json conserva la forma original: {**meta, rows_key: [filas]} o solo [filas] si rows_key es None.
+    En arrow/csv los metadatos viajan como headers X-<Clave>.
+    """
+    meta = meta or {}
+    if fmt == "json":
+        rows = _to_rows(cols)
+        body = {**meta, rows_key: rows} if rows_key else rows
+        return Response(dumps(body), media_type=FORMATS["json"])
+    if fmt == "columns":
+        body = {**meta, "columns": {k: _json_col(v) for k, v in cols.items()}}
+        return Response(dumps(body), media_type=FORMATS["columns"])
+
+    headers = {f"X-{k.replace('_', '-').title()}": str(v) for k, v in meta.items()}
+    if fmt == "arrow":
+        return Response(_arrow_bytes(cols), media_type=FORMATS["arrow"], headers=headers)
+    return Response(_csv_bytes(cols), media_type=FORMATS["csv"], headers=headers)
@@ -0,0 +1,118 @@
+"""
+Escritores de exportación (memoria constante):
+- stream_csv: generador de bytes que se envía mientras se lee (opcionalmente copiando a disco).
+- write_xlsx: libro openpyxl write-only, una hoja por sección (se parte si pasa el límite de filas).
+  El XLSX no se transmite en streaming: se escribe completo a un archivo y recién después se envía.
+Cada sección recibe lotes de filas (tuplas) ya ordenados desde un cursor del servidor; ambos
+escritores cierran los lotes al terminar o al cortarse, liberando el cursor y su sesión.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import time
+from datetime import date, datetime
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple, Sequence
+
+XLSX_MAX_ROWS = 1_048_576  # límite de Excel por hoja (incluye encabezado)
+
+
+class Section(NamedTuple):
+    name: str
+    header: Sequence[str]
+    batches: Iterable[Sequence[tuple]]
+
+
+def _cell(v):
+    if v is None:
+        return ""
+    if isinstance(v, (date, datetime)):
+        return v.isoformat()
+    return v
+
+
+def close_quietly(gen, wait: float = 30.0) -> None:
+    """
+    gen.close() aunque otro hilo siga dentro de next(gen) (cliente que corta mientras el
+    threadpool lee un lote): espera a que suelte en vez de fallar con "generator already executing".
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            gen.close()
+            return
+        except ValueError:
+            if time.monotonic() >= deadline:
+                print("[WARN] no se pudo cerrar el generador de exportación (sigue ocupado)")
+                return
+            time.sleep(0.05)
+
+
+def close_sections(sections: Iterable[Section]) -> None:
+    """Cierra los generadores de lotes (libera cursores aunque no se hayan consumido)."""
+    for sec in sections:
+        close = getattr(sec.batches, "close", None)
+        if close:
+            close()
+
+
+def stream_csv(header: Sequence[str], sections: Iterable[Section], tee: Path | None = None) -> Iterator[bytes]:
+    """CSV único (un encabezado) con las filas de todas las secciones, lote a lote."""
+    sections = list(sections)
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    f = tee.open("wb") if tee else None
+    try:
+        w.writerow(header)
+        for sec in sections:
+            for batch in sec.batches:
+                w.writerows([_cell(v) for v in row] for row in batch)
+                chunk = buf.getvalue().encode("utf-8")
+                buf.seek(0); buf.truncate()
+                if f: f.write(chunk)
+                yield chunk
+        chunk = buf.getvalue().encode("utf-8")
+        if chunk:
+            if f: f.write(chunk)
+            yield chunk
+    finally:
+        close_sections(sections)
+        if f: f.close()
+
+
+def write_xlsx(path: Path, sections: Iterable[Section]) -> int:
+    """
+    Escribe un XLSX write-only en `path` (las filas no quedan en memoria). Devuelve filas escritas.
+    El archivo queda completo en disco antes de poder enviarse: no hay streaming al cliente.
+    """
+    from openpyxl import Workbook  # import diferido
+
+    sections = list(sections)
+    wb = Workbook(write_only=True)
+    total = 0
+    try:
+        for sec in sections:
+            part, ws, n = 1, None, XLSX_MAX_ROWS
+            for batch in sec.batches:
+                for row in batch:
+                    if n >= XLSX_MAX_ROWS:
+                        ws = wb.create_sheet(sec.name if part == 1 else f"{sec.name}_{part}")
+                        ws.append(list(sec.header))
+                        part, n = part + 1, 1
+                    ws.append(list(row))
+                    n += 1
+                    total += 1
+            if ws is None:  # sección vacía: deja la hoja con encabezado
+                wb.create_sheet(sec.name).append(list(sec.header))
+    finally:
+        close_sections(sections)
+    wb.save(path)
+    return total
+
+
+def iter_file(path: Path, chunk_size: int = 1 << 16) -> Iterator[bytes]:
+    with path.open("rb") as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
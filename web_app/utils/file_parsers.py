@@ -1,7 +1,12 @@
-import pandas as pd
+from __future__ import annotations
 from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 def read_any_table(path: str) -> pd.DataFrame:
+    import pandas as pd  # import diferido: no se paga en el arranque
     if path.lower().endswith((".xlsx",".xls")): return pd.read_excel(path)
     if path.lower().endswith(".csv"): return pd.read_csv(path)
     raise ValueError("Formato no soportado (CSV/XLSX)")
@@ -0,0 +1,95 @@
+"""
+GET condicional para endpoints de lectura:
+- ETag derivado de (ruta, query, formato, medicamento, versión de datos)
+- Last-Modified desde versiones_datos.actualizado_en
+- 304 ante If-None-Match sin consultar filas
+- Caché de respuestas en proceso (opcional) indexada por ETag
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Awaitable, Callable
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from ..config import settings
+
+
+class ResponseCache:
+    """LRU de cuerpos ya codificados; max_entries=0 la desactiva."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._items: "OrderedDict[str, tuple[bytes, str, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        if not self.max_entries:
+            return None
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item
+
+    def put(self, key: str, body: bytes, media_type: str, headers: dict) -> None:
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._items[key] = (body, media_type, headers)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+
+response_cache = ResponseCache(settings.VISUALIZE_RESPONSE_CACHE_ENTRIES)
+
+
+def make_etag(request: Request, fmt: str, medicine_id: int, version: int) -> str:
+    q = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    raw = f"{request.url.path}?{q}|{fmt}|{medicine_id}|{version}"
+    return '"%s"' % hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+async def conditional(request: Request, fmt: str, medicine_id: int, version: int,
+                      updated_at: datetime | None, build: Callable[[], Awaitable[Response]]) -> Response:
+    """
+    Devuelve 304 si el cliente ya tiene la versión; si no, sirve desde la caché o espera build().
+    build() solo se ejecuta cuando realmente hay que leer filas.
+    """
+    etag = make_etag(request, fmt, medicine_id, version)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if updated_at is not None:
+        headers["Last-Modified"] = format_datetime(updated_at.replace(tzinfo=timezone.utc), usegmt=True)
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    cached = response_cache.get(etag)
+    if cached is not None:
+        body, media_type, extra = cached
+        return Response(body, media_type=media_type, headers={**extra, **headers})
+
+    resp = await build()
+    extra = {k: v for k, v in resp.headers.items() if k.lower().startswith("x-")}
+    response_cache.put(etag, resp.body, resp.media_type, extra)
+    resp.headers.update(headers)
+    return resp
@@ -0,0 +1,64 @@
+"""
+Limitador en memoria por ventana deslizante (por IP, por cuenta, etc.).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+
+
+class SlidingWindowLimiter:
+    def __init__(self, max_events: int, window_seconds: float, max_keys: int = 50_000):
+        self.max_events = max_events
+        self.window = window_seconds
+        self.max_keys = max_keys
+        self._events: dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def _prune(self, q: deque, now: float) -> None:
+        while q and q[0] <= now - self.window:
+            q.popleft()
+
+    def retry_after(self, key: str) -> float:
+        """Segundos a esperar si la clave excedió el límite; 0 si puede seguir."""
+        if self.max_events <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            q = self._events.get(key)
+            if not q:
+                return 0.0
+            self._prune(q, now)
+            if len(q) < self.max_events:
+                return 0.0
+            return max(0.0, q[0] + self.window - now)
+
+    def hit(self, key: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if len(self._events) >= self.max_keys:
+                self._events = {k: q for k, q in self._events.items() if q and q[-1] > now - self.window}
+            q = self._events.setdefault(key, deque())
+            self._prune(q, now)
+            q.append(now)
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            self._events.pop(key, None)
+
+    def throttled(self) -> int:
+        """Claves que hoy están bloqueadas (alcanzaron el límite dentro de la ventana)."""
+        if self.max_events <= 0:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            n = 0
+            for q in self._events.values():
+                self._prune(q, now)
+                n += len(q) >= self.max_events
+            return n
+
+    def __len__(self) -> int:
+        return len(self._events)